@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import re
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+from http_client import shared_client
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+LSJZ_URL = "http://fundf10.eastmoney.com/F10DataApi.aspx"
+
+
+# 接口单页最多返回 49 行，超过后按 49 处理
+PAGE_SIZE = 49
+
+_CONTENT_RE = re.compile(r'content:"(.*?)"', re.S)
+_PAGES_RE = re.compile(r'pages:(\d+)')
+# 每行前两个单元格依次为 净值日期、单位净值，其余列不解析
+_ROW_RE = re.compile(r'<tr[^>]*>\s*<td[^>]*>\s*(\d{4}-\d{2}-\d{2})\s*</td>\s*<td[^>]*>\s*([^<]*?)\s*</td>', re.I)
+
+
+def parse_lsjz_arrays(text):
+    """解析 F10DataApi lsjz 接口返回的 content:"..." / pages:N 内容，只提取日期和单位净值
+
+    返回 (日期数组 datetime64[D], 净值数组 float64, 总页数)；格式不符时返回 (None, None, None)，
+    content 中没有表格时返回 (None, None, 总页数)。净值无法解析的行会被丢弃。
+    """
+    content_match = _CONTENT_RE.search(text)
+    pages_match = _PAGES_RE.search(text)
+    if not content_match or not pages_match:
+        return None, None, None
+    content = content_match.group(1)
+    total_pages = int(pages_match.group(1))
+    if '<table' not in content:
+        return None, None, total_pages
+
+    rows = _ROW_RE.findall(content)
+    dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    try:
+        net_values = np.array([row[1] for row in rows], dtype=float)
+    except ValueError:
+        net_values = np.array([_to_float(row[1]) for row in rows], dtype=float)
+    valid = ~np.isnan(net_values)
+    return dates[valid], net_values[valid], total_pages
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def parse_lsjz_payload(text):
+    """解析 lsjz 接口内容，返回 (DataFrame[date, net_value], 总页数)；格式不符时返回 (None, None)"""
+    dates, net_values, total_pages = parse_lsjz_arrays(text)
+    if dates is None:
+        return None, total_pages
+    return pd.DataFrame({'date': dates.astype('datetime64[ns]'), 'net_value': net_values}), total_pages
+
+
+class AsyncNavFetcher:
+    """
+    基于 asyncio 的基金历史净值抓取后端。
+
+    - 请求经共享的 HttpClient 发出（连接池、lsjz 接口的自适应限速与熔断、重试），并按主机限制并发数；
+    - 当 pages: 显示还有后续页且需要继续翻页时，预先并发请求后面几页。
+    """
+    def __init__(self, headers=None, base_url=LSJZ_URL, per_host=8, prefetch=3, client=None, metrics=None):
+        self.headers = headers or {}
+        self.metrics = metrics or Metrics('async_fetcher')
+        self.base_url = base_url
+        self.client = client or shared_client()
+        self.per_host = per_host
+        self.prefetch = prefetch
+        self._host_limits = {}
+
+    def close(self):
+        # 客户端在进程内共享，限速与熔断状态需要跨多次抓取保留，这里不关闭
+        self._host_limits = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def _get_text(self, url, params):
+        async with self._host_limit(url):
+            response = await self.client.get_async(
+                url, endpoint='lsjz', metrics=self.metrics, params=params, headers=self.headers
+            )
+            self.metrics.inc('bytes_downloaded', len(response.content), source='lsjz')
+            return response.text
+
+    async def fetch_page(self, fund_code, page_index, per=PAGE_SIZE):
+        """获取并解析单页数据，限流、网络错误由共享客户端减速后重试"""
+        params = {'type': 'lsjz', 'code': fund_code, 'page': page_index, 'per': per}
+        logger.info("访问URL: %s?type=lsjz&code=%s&page=%d&per=%d", self.base_url, fund_code, page_index, per)
+        text = await self._get_text(self.base_url, params)
+        with self.metrics.timer('parse', source='lsjz'):
+            return parse_lsjz_payload(text)
+
+    async def fetch_new_rows(self, fund_code, latest_local_date, max_pages=5, per=PAGE_SIZE):
+        """按页抓取晚于 latest_local_date 的数据，返回每页新数据 DataFrame 的列表"""
+        pending = {}
+        all_new_data = []
+
+        def schedule(first, last):
+            for page in range(first, last + 1):
+                if page not in pending:
+                    pending[page] = asyncio.ensure_future(self.fetch_page(fund_code, page, per))
+
+        schedule(1, 1)
+        page_index = 1
+        try:
+            while page_index <= max_pages:
+                df, total_pages = await pending.pop(page_index)
+
+                if df is None:
+                    if total_pages is None:
+                        logger.error("基金 %s API返回内容格式不正确，可能已无数据或接口变更", fund_code)
+                    else:
+                        logger.warning("基金 %s 在第 %d 页未找到数据表格，爬取结束", fund_code, page_index)
+                    break
+
+                if latest_local_date:
+                    # 只保留比本地最新日期更新的数据
+                    new_df = df[df['date'].dt.date > latest_local_date]
+                    if new_df.empty:
+                        logger.info("基金 %s 第 %d 页无新数据，爬取结束", fund_code, page_index)
+                        break
+                    logger.info("第 %d 页: 发现 %d 行新数据，最新日期为 %s", page_index, len(new_df), new_df['date'].max().date())
+                else:
+                    # 如果本地没有数据，获取所有数据
+                    new_df = df
+                    logger.info("基金 %s 第 %d 页: 获取 %d 行数据", fund_code, page_index, len(df))
+                all_new_data.append(new_df)
+
+                # 以接口返回的总页数判断是否已到最后一页；接口可能把过大的 per 截断，不能用本页行数判断
+                if df.empty or page_index >= total_pages:
+                    logger.info("基金 %s 第 %d 页已是最后一页，爬取结束", fund_code, page_index)
+                    break
+
+                # 接口按日期倒序分页，本页已包含本地已有日期时无需再往后翻
+                if len(new_df) < len(df):
+                    logger.info("基金 %s 第 %d 页已衔接本地数据，爬取结束", fund_code, page_index)
+                    break
+
+                page_index += 1
+                # 还需要继续翻页，预取后续几页
+                schedule(page_index, min(page_index + self.prefetch - 1, total_pages, max_pages))
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+        return all_new_data
+
+    async def fetch_all_rows(self, fund_code, per=PAGE_SIZE):
+        """抓取基金的完整历史：先取第 1 页得到总页数，其余各页并发请求
+
+        返回每页数据 DataFrame 的列表；任一页请求失败时取消其余请求并抛出异常，
+        避免调用方写入不完整的历史。
+        """
+        df, total_pages = await self.fetch_page(fund_code, 1, per)
+        if df is None:
+            if total_pages is None:
+                logger.error("基金 %s API返回内容格式不正确，可能已无数据或接口变更", fund_code)
+            return []
+        logger.info("基金 %s 共 %d 页历史数据，开始并发抓取", fund_code, total_pages)
+        tasks = [asyncio.ensure_future(self.fetch_page(fund_code, page, per)) for page in range(2, total_pages + 1)]
+        try:
+            pages = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        frames = [df] + [page_df for page_df, _ in pages if page_df is not None]
+        return [frame for frame in frames if not frame.empty]
@@ -0,0 +1,562 @@
+"""
+离线性能基准。
+
+用法: python benchmark.py [基准名 ...] [--sizes 1000,10000,50000] [--rows 260]
+不带基准名时运行全部基准，结果以 JSON 输出到标准输出，便于不同运行之间对比。
+
+各阶段分别在仓库自带的 fund_data/、data/ CSV 以及指定规模的合成基金池上运行，
+报告耗时 (wall_s)、吞吐量 (items_per_s) 和 tracemalloc 统计的峰值内存 (peak_mb)；
+lsjz_parse 在生成的接口页面上对比网页解析方式，items 为解析出的行数；
+http_client 对本地故障注入的接口（限流 429、整体 503）测试共享请求层的吞吐与熔断。
+基准运行期间关闭 INFO/WARNING 日志，所有文件写入都在临时目录中进行。
+"""
+import argparse
+import contextlib
+import gc
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+BUNDLED_DIRS = {'fund_data': os.path.join(REPO_DIR, 'fund_data'), 'data': os.path.join(REPO_DIR, 'data')}
+DEFAULT_SIZES = (1000, 10000, 50000)
+DEFAULT_ROWS = 260
+
+# 在全新的解释器中测量：导入 fund_analyzer -> 构造 FundAnalyzer -> 用已预热的缓存评估第一个基金
+STARTUP_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import fund_analyzer
+t_import = time.perf_counter()
+analyzer = fund_analyzer.FundAnalyzer(cache_file=sys.argv[2], legacy_cache_file=None)
+t_init = time.perf_counter()
+analyzer._evaluate_fund(sys.argv[3], 'benchmark', '混合型')
+t_first = time.perf_counter()
+print(json.dumps({
+    'import_s': t_import - t0,
+    'init_s': t_init - t_import,
+    'first_fund_s': t_first - t_init,
+    'time_to_first_fund_s': t_first - t0,
+    'decision': analyzer.report_data[0]['decision'],
+    'heavy_modules_loaded': [m for m in ('pandas', 'akshare', 'bs4', 'requests', 'selenium') if m in sys.modules],
+}))
+"""
+
+
+def bench_startup(repeat=3):
+    """缓存已预热时，从进程启动到评估完第一个基金的耗时"""
+    from cache_store import KeyedCache
+
+    fund_code = '000001'
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, 'fund_cache.sqlite')
+        cache = KeyedCache(cache_path)
+        cache.set('fund', fund_code, {'latest_nav': 1.5, 'sharpe_ratio': 0.8, 'max_drawdown': 0.2})
+        cache.set('manager', fund_code, {'name': 'benchmark', 'tenure_years': 4.0, 'cumulative_return': 30.0})
+        cache.set('holdings', fund_code, [{'股票代码': '600000', '占净值比例': 5.0}] * 10)
+        cache.close()
+
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_SNIPPET, REPO_DIR, cache_path, fund_code],
+                cwd=tmp, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result['process_wall_s'] = time.perf_counter() - start
+            runs.append(result)
+
+    best = min(runs, key=lambda r: r['time_to_first_fund_s'])
+    return {'repeat': repeat, 'best': best, 'runs': runs}
+
+
+def _measure(func, items):
+    """先计时运行一次，再在 tracemalloc 下运行一次取峰值内存，避免跟踪开销计入耗时
+
+    两次运行必须做同样的工作，因此基准中的 MarketMonitor 都以 delta=False 创建，第二次不会沿用第一次的结果。
+    """
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    wall = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'items': items, 'wall_s': wall, 'items_per_s': items / wall if wall else None, 'peak_mb': peak / 2 ** 20}
+
+
+@contextlib.contextmanager
+def _workspace():
+    """在临时目录中运行，并关闭 INFO/WARNING 日志"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        logging.disable(logging.WARNING)
+        try:
+            yield tmp
+        finally:
+            logging.disable(logging.NOTSET)
+            os.chdir(cwd)
+
+
+def _bundled_frames(directory):
+    import pandas as pd
+    frames = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.csv'):
+            frames[name[:-len('.csv')]] = pd.read_csv(os.path.join(directory, name), parse_dates=['date'])
+    return frames
+
+
+def _synthetic_frames(n_funds, n_rows, seed=0):
+    """生成 n_funds 个随机游走净值序列，每个 n_rows 个交易日"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-09-30', periods=n_rows)
+    navs = np.cumprod(1 + rng.normal(0.0003, 0.01, size=(n_rows, n_funds)), axis=0)
+    return {f"{i:06d}": pd.DataFrame({'date': dates, 'net_value': navs[:, i]}) for i in range(n_funds)}
+
+
+def _universes(sizes, rows, bundled=('fund_data', 'data')):
+    """依次产出 (名称, {fund_code: DataFrame})，合成基金池按需生成，用完即释放"""
+    for name in bundled:
+        yield f"bundled_{name}", _bundled_frames(BUNDLED_DIRS[name])
+    for size in sizes:
+        yield f"synthetic_{size}", _synthetic_frames(size, rows)
+
+
+def bench_indicators(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """MarketMonitor 技术指标计算：批量矩阵计算，以及自带数据上逐个基金调用 _calculate_indicators"""
+    results = {}
+    with _workspace():
+        from market_monitor import MarketMonitor
+        monitor = MarketMonitor(delta=False)
+        for name, frames in _universes(sizes, rows):
+            tails = {fund_code: df.tail(100) for fund_code, df in frames.items()}
+            stages = {'batch': _measure(lambda: monitor._calculate_indicators_batch(tails), len(tails))}
+            if name.startswith('bundled_'):
+                stages['per_fund'] = _measure(
+                    lambda: [monitor._calculate_indicators(fund_code, df) for fund_code, df in tails.items()], len(tails)
+                )
+            results[name] = stages
+    return results
+
+
+def bench_backtest(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """MarketMonitor 回测：逐个基金调用 _backtest_strategy，以及经本地存储的 perform_backtest"""
+    results = {}
+    with _workspace() as tmp:
+        from market_monitor import MarketMonitor
+        from nav_store import NavStore
+        for name, frames in _universes(sizes, rows):
+            monitor = MarketMonitor(delta=False)
+            monitor.store = NavStore(os.path.join(tmp, name))
+            for fund_code, df in frames.items():
+                monitor.store.write(fund_code, df)
+            monitor.fund_codes = list(frames)
+            results[name] = {
+                'backtest_strategy': _measure(
+                    lambda: [monitor._backtest_strategy(fund_code, df) for fund_code, df in frames.items()], len(frames)
+                ),
+                'perform_backtest': _measure(monitor.perform_backtest, len(frames)),
+            }
+    return results
+
+
+def bench_read_local(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """MarketMonitor._read_local_data：从本地净值存储读取全部基金"""
+    results = {}
+    with _workspace() as tmp:
+        from market_monitor import MarketMonitor
+        from nav_store import NavStore, FrameCache
+        for name, frames in _universes(sizes, rows):
+            monitor = MarketMonitor(delta=False)
+            monitor.store = NavStore(os.path.join(tmp, name))
+            for fund_code, df in frames.items():
+                monitor.store.write(fund_code, df)
+            codes = list(frames)
+            del frames
+
+            def read_all():
+                # 每次都从空缓存开始，测的是读取存储而不是命中上一次运行留下的缓存
+                monitor.frame_cache = FrameCache(256 * 2 ** 20)
+                return [monitor._read_local_data(fund_code) for fund_code in codes]
+
+            results[name] = {'read_local_data': _measure(read_all, len(codes))}
+    return results
+
+
+def bench_compact_navs(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """本地最新基金的载入与指标计算：逐个读 DataFrame 取最后 100 行，对比直接载入 CompactNavs 紧凑容器"""
+    results = {}
+    with _workspace() as tmp:
+        from compact_navs import CompactNavs
+        from market_monitor import MarketMonitor
+        from nav_store import NavStore, FrameCache
+        for name, frames in _universes(sizes, rows):
+            monitor = MarketMonitor(delta=False)
+            monitor.store = NavStore(os.path.join(tmp, name))
+            for fund_code, df in frames.items():
+                monitor.store.write(fund_code, df)
+            codes = list(frames)
+            del frames
+
+            def frames_path():
+                monitor.frame_cache = FrameCache(256 * 2 ** 20)
+                tails = {fund_code: monitor._read_local_data(fund_code).tail(100) for fund_code in codes}
+                return monitor._calculate_indicators_batch(tails)
+
+            def compact_path():
+                return monitor._calculate_indicators_batch(CompactNavs.from_store(monitor.store, codes, tail=100, dtype=float))
+
+            navs = CompactNavs.from_store(monitor.store, codes, tail=100, dtype=float)
+            results[name] = {
+                'frames': _measure(frames_path, len(codes)),
+                'compact': _measure(compact_path, len(codes)),
+                'compact_nbytes_mb': navs.nbytes / 2 ** 20,
+            }
+    return results
+
+
+def _process_memory_mb():
+    """当前进程的 RSS、PSS 及其中私有/共享部分 (MB)，取自 /proc/self/smaps_rollup（仅 Linux）"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss_mb': fields['Rss'],
+        'pss_mb': fields['Pss'],
+        'private_mb': fields['Private_Clean'] + fields['Private_Dirty'],
+        'shared_mb': fields['Shared_Clean'] + fields['Shared_Dirty'],
+    }
+
+
+def _nav_load_worker(source, root, codes, barrier, queue):
+    """nav_load 的子进程：载入并持有全部基金的净值，等所有子进程都载入完后统计内存增量"""
+    import pandas as pd
+    from nav_store import NavStore
+    before = _process_memory_mb()
+    start = time.perf_counter()
+    if source == 'csv':
+        held = [pd.read_csv(os.path.join(root, f"{fund_code}.csv"), parse_dates=['date']) for fund_code in codes]
+        total = sum(float(df['net_value'].sum()) for df in held)
+    elif source == 'store_read':
+        store = NavStore(root)
+        held = [store.read(fund_code) for fund_code in codes]
+        total = sum(float(df['net_value'].sum()) for df in held)
+    else:
+        store = NavStore(root)
+        held = [store.view(fund_code) for fund_code in codes]
+        total = sum(float(records['net_value'].sum()) for records in held)
+    load_s = time.perf_counter() - start
+    barrier.wait()
+    after = _process_memory_mb()
+    # 所有子进程统计完之前保持持有，共享页面才会计入 shared/pss
+    barrier.wait()
+    queue.put({'load_s': load_s, 'net_value_sum': total, **{key: after[key] - before[key] for key in after}})
+
+
+def bench_nav_load(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS, workers=4):
+    """
+    workers 个子进程同时载入全部基金的净值历史：旧 CSV 文件、NavStore 复制读取 (read)、内存映射零复制视图 (view)。
+
+    报告各子进程的平均载入耗时，以及载入后 RSS/PSS/私有/共享内存的平均增量；
+    文件刚写入，页缓存是热的。零复制视图的净值页面属于页缓存，在子进程之间共享，PSS 按进程数分摊。
+    """
+    import multiprocessing
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with _workspace() as tmp:
+        from nav_store import NavStore
+        for name, frames in _universes(sizes, rows, bundled=('data',)):
+            csv_dir = os.path.join(tmp, f"{name}_csv")
+            store_dir = os.path.join(tmp, f"{name}_store")
+            os.makedirs(csv_dir)
+            store = NavStore(store_dir)
+            for fund_code, df in frames.items():
+                df.to_csv(os.path.join(csv_dir, f"{fund_code}.csv"), index=False)
+                store.write(fund_code, df)
+            store.close()
+            codes = list(frames)
+            del frames
+            results[name] = {}
+            for source, root in (('csv', csv_dir), ('store_read', store_dir), ('store_view', store_dir)):
+                barrier = context.Barrier(workers)
+                queue = context.Queue()
+                processes = [
+                    context.Process(target=_nav_load_worker, args=(source, root, codes, barrier, queue))
+                    for _ in range(workers)
+                ]
+                for process in processes:
+                    process.start()
+                stats = [queue.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                results[name][source] = {
+                    'items': len(codes), 'workers': workers,
+                    **{key: sum(stat[key] for stat in stats) / workers for key in stats[0] if key != 'net_value_sum'},
+                }
+    return results
+
+
+def bench_report(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """MarketMonitor.generate_report：由批量指标结果生成 Markdown 报告"""
+    results = {}
+    with _workspace() as tmp:
+        from market_monitor import MarketMonitor
+        for name, frames in _universes(sizes, rows):
+            monitor = MarketMonitor(output_file=os.path.join(tmp, f"{name}.md"), delta=False)
+            monitor.fund_codes = list(frames)
+            monitor.fund_data = monitor._calculate_indicators_batch(
+                {fund_code: df.tail(100) for fund_code, df in frames.items()}
+            )
+            del frames
+            results[name] = {'generate_report': _measure(monitor.generate_report, len(monitor.fund_codes))}
+    return results
+
+
+def bench_evaluate_fund(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """FundAnalyzer._evaluate_fund：缓存已预热时逐个评估基金（只测打分路径，不访问网络）"""
+    results = {}
+    with _workspace() as tmp:
+        from fund_analyzer import FundAnalyzer
+        pools = [('bundled_fund_data', sorted(name[:-len('.csv')] for name in os.listdir(BUNDLED_DIRS['fund_data'])
+                                              if name.endswith('.csv')))]
+        pools += [(f"synthetic_{size}", [f"{i:06d}" for i in range(size)]) for size in sizes]
+        for name, codes in pools:
+            # 通过旧版 JSON 一次性批量导入预热缓存
+            legacy_json = os.path.join(tmp, f"{name}.json")
+            with open(legacy_json, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'fund': {code: {'latest_nav': 1.5, 'sharpe_ratio': 0.8, 'max_drawdown': 0.2} for code in codes},
+                    'manager': {code: {'name': 'benchmark', 'tenure_years': 4.0, 'cumulative_return': 30.0} for code in codes},
+                    'holdings': {code: [{'股票代码': '600000', '占净值比例': 5.0}] * 10 for code in codes},
+                }, f, ensure_ascii=False)
+            analyzer = FundAnalyzer(cache_file=os.path.join(tmp, f"{name}.sqlite"), legacy_cache_file=legacy_json,
+                                    cache_max_entries=None)
+
+            def evaluate_all():
+                analyzer.report_data = []
+                for code in codes:
+                    analyzer._evaluate_fund(code, 'benchmark', '混合型')
+
+            results[name] = {'evaluate_fund': _measure(evaluate_all, len(codes))}
+            analyzer.cache.close()
+    return results
+
+
+def _risk_metrics_per_fund(series, risk_free_rate):
+    """引入风险指标引擎之前 _fetch_fund_data 中逐个基金的计算方式，作为对比基准"""
+    results = {}
+    for fund_code, nav in series.items():
+        returns = nav.pct_change().dropna()
+        annual_returns = returns.mean() * 252
+        annual_volatility = returns.std() * (252**0.5)
+        rolling_max = nav.cummax()
+        results[fund_code] = {
+            'latest_nav': float(nav.iloc[-1]),
+            'sharpe_ratio': float((annual_returns - risk_free_rate) / annual_volatility if annual_volatility != 0 else 0),
+            'max_drawdown': float(((nav - rolling_max) / rolling_max).min() * -1),
+        }
+    return results
+
+
+def bench_risk_metrics(sizes=DEFAULT_SIZES, rows=DEFAULT_ROWS):
+    """FundAnalyzer 风险指标：逐个基金的 pandas 计算与风险指标引擎的一次批量计算"""
+    from risk_metrics import fund_risk_metrics
+    results = {}
+    for name, frames in _universes(sizes, rows, bundled=('data',)):
+        series = {fund_code: df.set_index('date')['net_value'].astype(float) for fund_code, df in frames.items()}
+        del frames
+        benchmark = next(iter(series.values()))
+        results[name] = {
+            'per_fund': _measure(lambda: _risk_metrics_per_fund(series, 0.01858), len(series)),
+            'engine': _measure(lambda: fund_risk_metrics(series, 0.01858, benchmark), len(series)),
+        }
+    return results
+
+
+def _lsjz_payload(n_rows, seed=0):
+    """按 F10DataApi lsjz 接口的格式生成一页 n_rows 行的返回内容"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-09-30', periods=n_rows)[::-1]
+    rows = ''.join(
+        f"<tr><td>{d:%Y-%m-%d}</td><td class='tor bold'>{nav:.4f}</td><td class='tor bold'>{nav + 1:.4f}</td>"
+        f"<td class='tor bold red'>0.12%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr>"
+        for d, nav in zip(dates, 1 + rng.random(n_rows))
+    )
+    content = ("<table class='w782 comm lsjz'><thead><tr><th class='first'>净值日期</th><th>单位净值</th><th>累计净值</th>"
+               "<th>日增长率</th><th>申购状态</th><th>赎回状态</th><th class='tor last'>分红送配</th></tr></thead>"
+               f"<tbody>{rows}</tbody></table>")
+    return f'var apidata={{ content:"{content}",records:{n_rows * 10},pages:10,curpage:1}};'
+
+
+def _parse_lsjz_read_html(text):
+    """改用轻量解析器之前的 pd.read_html 解析方式，作为对比基准"""
+    import re
+    from io import StringIO
+    import pandas as pd
+    content_match = re.search(r'content:"(.*?)"', text, re.S)
+    pages_match = re.search(r'pages:(\d+)', text)
+    if not content_match or not pages_match:
+        return None, None
+    tables = pd.read_html(StringIO(content_match.group(1).replace('\\"', '"')))
+    if not tables:
+        return None, int(pages_match.group(1))
+    df = tables[0]
+    df.columns = ['date', 'net_value', 'cumulative_net_value', 'daily_growth_rate', 'purchase_status', 'redemption_status', 'dividend']
+    df = df[['date', 'net_value']].copy()
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df['net_value'] = pd.to_numeric(df['net_value'], errors='coerce')
+    return df.dropna(subset=['date', 'net_value']), int(pages_match.group(1))
+
+
+def bench_lsjz_parse(pages=200):
+    """lsjz 接口单页解析：pd.read_html 基准与轻量解析器，分别在 20 行和 49 行的页面上测试"""
+    from async_fetcher import PAGE_SIZE, parse_lsjz_arrays, parse_lsjz_payload
+    results = {}
+    for per in sorted({20, PAGE_SIZE}):
+        payloads = [_lsjz_payload(per, seed) for seed in range(pages)]
+        stages = {
+            'read_html': _measure(lambda: [_parse_lsjz_read_html(text) for text in payloads], pages * per),
+            'payload': _measure(lambda: [parse_lsjz_payload(text) for text in payloads], pages * per),
+            'arrays': _measure(lambda: [parse_lsjz_arrays(text) for text in payloads], pages * per),
+        }
+        for stage in stages.values():
+            stage['pages'] = pages
+        results[f"per_{per}"] = stages
+    return results
+
+
+def _throttling_stub(capacity, outage, payload):
+    """
+    本地故障注入的 lsjz 接口：每秒可持续处理 capacity 个请求（令牌桶），超出返回 429；
+    outage 为 (开始, 结束) 的 time.monotonic() 区间，区间内全部返回 503。返回 (服务器, 各状态码计数)。
+    """
+    import threading
+    from collections import Counter
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    statuses = Counter()
+    bucket = {'tokens': float(capacity), 'updated': time.monotonic()}
+    lock = threading.Lock()
+    body = payload.encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            now = time.monotonic()
+            with lock:
+                bucket['tokens'] = min(capacity, bucket['tokens'] + (now - bucket['updated']) * capacity)
+                bucket['updated'] = now
+                admitted = bucket['tokens'] >= 1
+                if admitted:
+                    bucket['tokens'] -= 1
+                status = 503 if outage[0] <= now < outage[1] else (200 if admitted else 429)
+                statuses[status] += 1
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body) if status == 200 else 0))
+            self.end_headers()
+            if status == 200:
+                self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, statuses
+
+
+def bench_http_client(funds=30, capacity=10, outage_s=3.0):
+    """
+    AsyncNavFetcher 经共享 HttpClient 对本地故障注入接口抓取 funds 个基金的完整历史（每个 10 页）。
+
+    throttled: 上游每秒只能处理 capacity 个请求，超出返回 429，考察自适应速率能否贴近上限；
+    outage: 开始 1 秒后接口整体 503 持续 outage_s 秒，考察熔断期间的请求量与恢复后的完成情况。
+    goodput_per_s 为每秒成功的请求数。
+    """
+    import asyncio
+    from async_fetcher import AsyncNavFetcher
+    from http_client import HttpClient
+
+    payload = _lsjz_payload(49)
+    results = {}
+    with _workspace():
+        for scenario in ('throttled', 'outage'):
+            start = time.monotonic()
+            outage = (start + 1, start + 1 + outage_s) if scenario == 'outage' else (0, 0)
+            server, statuses = _throttling_stub(capacity, outage, payload)
+            client = HttpClient(max_rate=capacity * 4)
+            url = f"http://127.0.0.1:{server.server_port}/F10DataApi.aspx"
+
+            async def fetch_all():
+                with AsyncNavFetcher(base_url=url, client=client) as fetcher:
+                    return await asyncio.gather(
+                        *(fetcher.fetch_all_rows(f"{i:06d}") for i in range(funds)), return_exceptions=True
+                    )
+
+            try:
+                fetched = asyncio.run(fetch_all())
+            finally:
+                server.shutdown()
+                server.server_close()
+                client.close()
+            wall = time.monotonic() - start
+            results[scenario] = {
+                'funds': funds, 'capacity_per_s': capacity, 'wall_s': wall,
+                'goodput_per_s': statuses[200] / wall,
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'failed_funds': sum(isinstance(result, Exception) for result in fetched),
+                'final_rate': client.stats()['lsjz']['rate'],
+            }
+    return results
+
+
+BENCHMARKS = {
+    'startup': lambda args: bench_startup(),
+    'indicators': lambda args: bench_indicators(args.sizes, args.rows),
+    'backtest': lambda args: bench_backtest(args.sizes, args.rows),
+    'read_local': lambda args: bench_read_local(args.sizes, args.rows),
+    'compact_navs': lambda args: bench_compact_navs(args.sizes, args.rows),
+    'nav_load': lambda args: bench_nav_load(args.sizes, args.rows),
+    'report': lambda args: bench_report(args.sizes, args.rows),
+    'evaluate_fund': lambda args: bench_evaluate_fund(args.sizes, args.rows),
+    'risk_metrics': lambda args: bench_risk_metrics(args.sizes, args.rows),
+    'lsjz_parse': lambda args: bench_lsjz_parse(),
+    'http_client': lambda args: bench_http_client(),
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="离线性能基准")
+    parser.add_argument('names', nargs='*', help=f"要运行的基准，可选: {list(BENCHMARKS)}")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        type=lambda value: [int(size) for size in value.split(',') if size],
+                        help="合成基金池的规模，逗号分隔")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="合成基金的历史交易日数")
+    args = parser.parse_args()
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"未知的基准: {unknown}，可选: {list(BENCHMARKS)}")
+    results = {name: BENCHMARKS[name](args) for name in names}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
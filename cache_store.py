@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger('FundAnalyzer')
+
+
+class KeyedCache:
+    """
+    基于 SQLite 的分命名空间键值缓存（fund / manager / holdings ...）。
+
+    每次 set 只写入一条记录并立即提交，运行中途崩溃也不会丢失已写入的条目；
+    读取按需查询数据库，不再在启动时把整个缓存文件载入内存。
+    每条记录带写入时间，供调用方判断是否过期；条目总数超过 max_entries 时
+    优先淘汰最久未更新的条目。条目数只在打开时统计一次，之后随写入和删除维护，
+    每次 set 不需要扫描全表。
+    """
+    def __init__(self, path, legacy_json=None, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries
+        is_new = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "updated_at REAL NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(cache)")]
+        if 'updated_at' not in columns:
+            # 旧版本数据库没有写入时间，视为已过期
+            self._conn.execute("ALTER TABLE cache ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_updated_at ON cache (updated_at)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] if max_entries else 0
+        if is_new and legacy_json and os.path.exists(legacy_json):
+            self.import_json(legacy_json)
+
+    def get(self, namespace, key, default=None):
+        """读取单条缓存，不存在时返回 default"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_entry(self, namespace, key):
+        """读取单条缓存及其写入时间，返回 (value, updated_at: datetime)，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, updated_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), datetime.fromtimestamp(row[1])
+
+    def contains(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return row is not None
+
+    def items(self, namespace):
+        """读取命名空间下的全部条目，返回 {key: value}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM cache WHERE namespace = ?", (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, namespace, key, value):
+        """写入单条缓存并立即提交"""
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace, entries):
+        """在同一个事务中写入多条缓存 {key: value}"""
+        now = time.time()
+        payloads = [(key, json.dumps(value, ensure_ascii=False, default=str)) for key, value in entries.items()]
+        with self._lock:
+            for key, payload in payloads:
+                self._put(namespace, key, payload, now)
+            self._evict()
+            self._conn.commit()
+
+    def _put(self, namespace, key, payload, updated_at):
+        """写入一条记录（调用方需持有锁）；先尝试更新已有条目，只有新插入的条目才增加计数"""
+        updated = self._conn.execute(
+            "UPDATE cache SET value = ?, updated_at = ? WHERE namespace = ? AND key = ?",
+            (payload, updated_at, namespace, key)
+        ).rowcount
+        if not updated:
+            self._conn.execute(
+                "INSERT INTO cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, payload, updated_at)
+            )
+            self._count += 1
+
+    def _evict(self):
+        """条目数超过上限时删除最久未更新的条目（调用方需持有锁）"""
+        if not self.max_entries or self._count <= self.max_entries:
+            return
+        excess = self._count - self.max_entries
+        deleted = self._conn.execute(
+            "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY updated_at LIMIT ?)", (excess,)
+        ).rowcount
+        self._count -= deleted
+        logger.info(f"缓存条目超过上限 {self.max_entries}，已淘汰 {deleted} 条最旧记录")
+
+    def delete(self, namespace, key):
+        self.delete_many(namespace, [key])
+
+    def delete_many(self, namespace, keys):
+        """在同一个事务中删除多条缓存"""
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                deleted += self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+                ).rowcount
+            self._count = max(0, self._count - deleted)
+            self._conn.commit()
+
+    def keys(self, namespace):
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM cache WHERE namespace = ?", (namespace,)).fetchall()
+        return [row[0] for row in rows]
+
+    def import_json(self, json_path):
+        """一次性导入旧的 fund_cache.json（{namespace: {key: value}} 结构）"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # 旧缓存没有逐条的写入时间，统一使用文件修改时间
+        updated_at = os.path.getmtime(json_path)
+        rows = [
+            (namespace, key, json.dumps(value, ensure_ascii=False, default=str), updated_at)
+            for namespace, entries in data.items()
+            for key, value in entries.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)", rows
+            )
+            # 批量导入只发生一次，直接重新统计条目数
+            if self.max_entries:
+                self._count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            self._evict()
+            self._conn.commit()
+        logger.info(f"已从 {json_path} 导入 {len(rows)} 条缓存记录")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
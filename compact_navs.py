@@ -0,0 +1,189 @@
+"""
+大规模基金池的紧凑内存表示。
+
+CompactNavs: 所有基金共享一个升序日期索引，净值首尾相接存放在一块连续缓冲区中（默认 float32，
+需要与原始净值完全一致时可选 float64），每个基金只记录起止偏移；每行的日期以其在共享索引中的位置保存
+（按索引长度选用 uint16/uint32）。相比每个基金一个 DataFrame，每行约 6 字节（float64 时约 10 字节），
+且没有逐个对象的索引开销。
+
+IndicatorResults: 以结构化 NumPy 数组保存各基金的指标结果，按基金代码读写时才转换为字典。
+"""
+import numpy as np
+import pandas as pd
+
+
+class CompactNavs:
+    """多基金净值的只读紧凑容器，由 from_arrays / from_frames / from_store 构建"""
+    __slots__ = ('dates', 'codes', 'offsets', 'date_pos', 'values', '_index')
+
+    def __init__(self, dates, codes, offsets, date_pos, values):
+        self.dates = dates
+        self.codes = codes
+        self.offsets = offsets
+        self.date_pos = date_pos
+        self.values = values
+        self._index = {fund_code: i for i, fund_code in enumerate(codes)}
+
+    @classmethod
+    def from_arrays(cls, items, dtype=np.float32):
+        """由 (fund_code, 日期数组, 净值数组) 序列构建，每个基金的日期需已升序；dtype 为净值缓冲区的类型"""
+        codes, day_parts, value_parts = [], [], []
+        for fund_code, dates, values in items:
+            codes.append(fund_code)
+            day_parts.append(np.asarray(dates).astype('datetime64[D]').astype(np.int32))
+            value_parts.append(np.asarray(values, dtype=dtype))
+        lengths = np.fromiter((len(part) for part in value_parts), dtype=np.int64, count=len(codes))
+        offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        days = np.concatenate(day_parts) if day_parts else np.empty(0, dtype=np.int32)
+        values = np.concatenate(value_parts) if value_parts else np.empty(0, dtype=dtype)
+        del day_parts, value_parts
+        unique_days = np.unique(days)
+        date_pos = np.searchsorted(unique_days, days).astype(np.min_scalar_type(max(len(unique_days) - 1, 0)))
+        return cls(unique_days.astype('datetime64[D]'), codes, offsets, date_pos, values)
+
+    @classmethod
+    def from_frames(cls, frames, dtype=np.float32):
+        """由 {fund_code: date/net_value DataFrame} 构建"""
+        def items():
+            for fund_code, df in frames.items():
+                df = df.sort_values(by='date', ascending=True)
+                yield fund_code, df['date'].to_numpy(), df['net_value'].to_numpy(dtype=float)
+        return cls.from_arrays(items(), dtype)
+
+    @classmethod
+    def from_store(cls, store, fund_codes, tail=None, dtype=np.float32):
+        """直接从 NavStore 的分区文件构建，可选每个基金只取最后 tail 行，不经过 DataFrame"""
+        return cls.from_arrays(((fund_code, *store.arrays(fund_code, tail)) for fund_code in fund_codes), dtype)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, fund_code):
+        return fund_code in self._index
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def _slice(self, fund_code):
+        i = self._index[fund_code]
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def rows(self, fund_code):
+        i = self._index[fund_code]
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def net_values(self, fund_code):
+        """基金的净值，为缓冲区上的只读视图"""
+        view = self.values[self._slice(fund_code)]
+        view.flags.writeable = False
+        return view
+
+    def fund_dates(self, fund_code):
+        """基金各行的日期 (datetime64[D])"""
+        return self.dates[self.date_pos[self._slice(fund_code)]]
+
+    def frame(self, fund_code):
+        """转成 date/net_value 两列的 DataFrame，供仍按 DataFrame 处理的代码使用"""
+        return pd.DataFrame({
+            'date': self.fund_dates(fund_code).astype('datetime64[ns]'),
+            'net_value': self.net_values(fund_code).astype(float),
+        })
+
+    def bottom_aligned(self, codes=None, tail=None):
+        """
+        按最新一行尾部对齐成 行 × 基金 的 float64 矩阵（较短的历史在顶部补 NaN），
+        返回 (矩阵, 各基金行数)；tail 限制每个基金最多取最后 tail 行。
+        """
+        codes = self.codes if codes is None else codes
+        index = np.fromiter((self._index[fund_code] for fund_code in codes), dtype=np.int64, count=len(codes))
+        ends = self.offsets[index + 1]
+        lengths = ends - self.offsets[index]
+        if tail is not None:
+            lengths = np.minimum(lengths, tail)
+        n_rows = int(lengths.max()) if len(lengths) else 0
+        # 矩阵第 r 行对应各基金的第 ends - n_rows + r 条记录，超出该基金范围的位置为 NaN
+        positions = ends[None, :] - n_rows + np.arange(n_rows)[:, None]
+        inside = positions >= (ends - lengths)[None, :]
+        matrix = np.where(inside, self.values[np.where(inside, positions, 0)], np.nan).astype(float)
+        return matrix, lengths
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.offsets.nbytes + self.date_pos.nbytes + self.values.nbytes
+
+
+# 指标结果中的文本字段取值均不超过 6 个字符
+INDICATOR_DTYPE = np.dtype([
+    ('latest_net_value', 'f8'), ('rsi', 'f8'), ('ma_ratio', 'f8'), ('macd_diff', 'f8'),
+    ('bb_upper', 'f8'), ('bb_lower', 'f8'), ('advice', 'U6'), ('action_signal', 'U6'), ('ok', '?'),
+])
+_NUMERIC_FIELDS = ('latest_net_value', 'rsi', 'ma_ratio', 'macd_diff', 'bb_upper', 'bb_lower')
+# 计算失败的基金在结果字典中的最新净值显示文本
+FAILED_NET_VALUE = "数据获取失败"
+
+
+class IndicatorResults:
+    """
+    以结构化数组保存的 {fund_code: 指标结果}，接口与字典一致（get / [] / update / items ...）。
+
+    数组按容量倍增，每个基金约 100 字节；读取单个基金时才构造结果字典。
+    latest_net_value 不是数值（计算失败）的基金记为 ok=False，读取时还原为 FAILED_NET_VALUE。
+    """
+    def __init__(self, capacity=1024):
+        self.records = np.zeros(capacity, dtype=INDICATOR_DTYPE)
+        self.codes = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, fund_code):
+        return fund_code in self._index
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __setitem__(self, fund_code, result):
+        i = self._index.get(fund_code)
+        if i is None:
+            i = len(self.codes)
+            if i == len(self.records):
+                self.records = np.resize(self.records, max(1, 2 * len(self.records)))
+            self.codes.append(fund_code)
+            self._index[fund_code] = i
+        record = self.records[i]
+        ok = isinstance(result['latest_net_value'], (float, int, np.floating, np.integer))
+        for field in _NUMERIC_FIELDS:
+            value = result[field]
+            record[field] = value if (field != 'latest_net_value' or ok) else np.nan
+        record['advice'] = result['advice']
+        record['action_signal'] = result['action_signal']
+        record['ok'] = ok
+
+    def __getitem__(self, fund_code):
+        record = self.records[self._index[fund_code]]
+        result = {'fund_code': fund_code}
+        result.update((field, record[field].item()) for field in _NUMERIC_FIELDS)
+        if not record['ok']:
+            result['latest_net_value'] = FAILED_NET_VALUE
+        result['advice'] = str(record['advice'])
+        result['action_signal'] = str(record['action_signal'])
+        return result
+
+    def get(self, fund_code, default=None):
+        return self[fund_code] if fund_code in self._index else default
+
+    def update(self, results):
+        for fund_code, result in results.items():
+            self[fund_code] = result
+
+    def keys(self):
+        return list(self.codes)
+
+    def items(self):
+        return ((fund_code, self[fund_code]) for fund_code in self.codes)
+
+    def table(self):
+        """已写入部分的结构化数组视图，行顺序与 codes 一致"""
+        return self.records[:len(self.codes)]
@@ -1,21 +1,40 @@
-import pandas as pd
-import akshare as ak
 from datetime import datetime, timedelta
 import numpy as np
 import time
-import requests
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import importlib
 import re
-import json
 import os
+import queue
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from cache_store import KeyedCache
+from metrics import Metrics
+from recommendations import RECOMMENDATION_MANIFEST, write_manifest
+from report_writer import ReportTable, write_report
+from risk_metrics import fund_risk_metrics
+
+
+class _LazyModule:
+    """
+    延迟导入的模块代理：首次访问属性时才真正导入。
+    akshare 单独导入就需要数秒，完全命中缓存的运行不应为此付出启动时间。
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = _LazyModule('pandas')
+ak = _LazyModule('akshare')
+requests = _LazyModule('requests')
+bs4 = _LazyModule('bs4')
+http_client = _LazyModule('http_client')
 
 # 配置日志记录
 logging.basicConfig(
@@ -28,11 +47,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger('FundAnalyzer')
 
+# 各命名空间缓存的日志描述
+CACHE_LABELS = {'fund': '数据', 'manager': '经理数据', 'holdings': '持仓数据'}
+# 季报在季度结束后 15 个工作日内披露，按 21 个自然日估算
+HOLDINGS_DISCLOSURE_LAG = timedelta(days=21)
+# 各数据源的并发线程数和每秒初始请求速率（之后由共享客户端按上游响应自适应调整）
+DEFAULT_MAX_WORKERS = {'fund': 8, 'manager': 4, 'holdings': 4}
+DEFAULT_RATE_LIMITS = {'fund': 5, 'manager': 3, 'holdings': 3}
+# 经理/持仓数据的获取方式：akshare（优先 akshare，失败后普通 HTTP 抓取）、http（只用 HTTP 抓取）、browser（用浏览器渲染页面抓取）
+FETCH_MODES = ('akshare', 'http', 'browser')
+# 净值指标获取失败且没有缓存时使用的默认值
+FUND_DATA_FALLBACK = {'latest_nav': np.nan, 'sharpe_ratio': np.nan, 'max_drawdown': np.nan}
+SCRAPE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def _notna(value):
+    """标量版 pd.notna，评分路径不必为此导入 pandas"""
+    return value is not None and value == value
+
+
 class SeleniumFetcher:
     """
     使用 Selenium 模拟浏览器进行数据抓取。
+    浏览器在第一次抓取时才启动，未使用浏览器的运行不会导入 selenium 或启动 Chromium。
     """
     def __init__(self):
+        self.driver = None
+        self._started = False
+
+    def _start(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        from selenium.webdriver.chrome.options import Options
+        from selenium.common.exceptions import WebDriverException
+
+        self._started = True
         chrome_options = Options()
         chrome_options.add_argument("--headless")  # 无头模式，不显示浏览器窗口
         chrome_options.add_argument("--disable-gpu")
@@ -50,8 +101,14 @@ class SeleniumFetcher:
             self.driver = None
 
     def get_page_source(self, url, wait_for_element=None, timeout=30):
+        if not self._started:
+            self._start()
         if not self.driver:
             return None
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, WebDriverException
         try:
             self.driver.get(url)
             if wait_for_element:
@@ -63,26 +120,108 @@ class SeleniumFetcher:
             logger.error(f"Selenium 抓取失败: {e}")
             return None
 
-    def __del__(self):
+    def quit(self):
         if self.driver:
             self.driver.quit()
+            self.driver = None
+
+    def __del__(self):
+        self.quit()
+
+class BrowserPool:
+    """
+    可复用的浏览器驱动池：按需创建，最多同时存在 size 个浏览器，用完归还供后续请求复用。
+    factory 返回任何带 get_page_source(url, wait_for_element, timeout) 和 quit() 方法的对象，
+    默认为 SeleniumFetcher，可替换为其他浏览器后端。
+    """
+    def __init__(self, size=2, factory=SeleniumFetcher):
+        self.size = size
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._fetchers = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._fetchers) < self.size:
+                fetcher = self.factory()
+                self._fetchers.append(fetcher)
+                return fetcher
+        return self._idle.get()
+
+    def get_page_source(self, url, wait_for_element=None, timeout=30):
+        fetcher = self._acquire()
+        try:
+            return fetcher.get_page_source(url, wait_for_element, timeout)
+        finally:
+            self._idle.put(fetcher)
+
+    def close(self):
+        with self._lock:
+            for fetcher in self._fetchers:
+                fetcher.quit()
+            self._fetchers = []
+            self._idle = queue.LifoQueue()
 
 class FundAnalyzer:
     """
     一个用于自动化分析中国公募基金的类。
     """
-    def __init__(self, risk_free_rate=0.01858, cache_file='fund_cache.json', cache_data=True):
+    def __init__(self, risk_free_rate=0.01858, cache_file='fund_cache.sqlite', cache_data=True, legacy_cache_file='fund_cache.json',
+                 manager_ttl_days=30, stale_grace=None, cache_max_entries=20000,
+                 max_workers=None, rate_limits=None, fetch_mode=None, browser_factory=SeleniumFetcher, browser_pool_size=2,
+                 metrics=None, client=None):
         self.fund_data = {}
+        # 本次运行抓取到、尚未计算指标的净值序列，由 _compute_pending_fund_data 批量计算
+        self.nav_series = {}
+        self._nav_series_lock = threading.Lock()
+        # 计算贝塔所用的基准（上证指数收盘点位），在 get_market_sentiment 中获取
+        self.benchmark_nav = None
         self.manager_data = {}
         self.holdings_data = {}
         self.market_data = {}
         self.report_data = []
         self.cache_file = cache_file
         self.cache_data = cache_data
+        self.legacy_cache_file = legacy_cache_file
+        self.cache_max_entries = cache_max_entries
         self.cache = self._load_cache()
+        # 基金经理数据的缓存周期（天），净值指标和持仓的过期时间由 _cache_cutoff 按发布节奏计算
+        self.manager_ttl = timedelta(days=manager_ttl_days)
+        # 过期后仍可先使用旧值、同时后台刷新的宽限期；净值指标默认必须当天最新
+        self.stale_grace = stale_grace if stale_grace is not None else {
+            'fund': timedelta(0),
+            'manager': timedelta(days=30),
+            'holdings': timedelta(days=30),
+        }
+        # 后台刷新交给对应数据源的线程池：run_analysis 运行期间使用流水线线程池，否则按需创建同样大小的线程池
+        self._pipeline_pools = None
+        self._revalidate_pools = {}
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        # 并发流水线：每个数据源独立的线程池；请求经共享客户端按数据源分别限速、熔断和重试
+        self.max_workers = {**DEFAULT_MAX_WORKERS, **(max_workers or {})}
+        self.rate_limits = {**DEFAULT_RATE_LIMITS, **(rate_limits or {})}
+        # 客户端首次请求时才创建，完全命中缓存的运行不导入 requests
+        self._client = client
+        self._client_ready = False
+        self._client_lock = threading.Lock()
         # 直接使用用户提供的无风险利率，不再进行抓取
         self.risk_free_rate = risk_free_rate
-        self.selenium_fetcher = SeleniumFetcher()
+        # 获取方式可通过环境变量 FUND_FETCH_MODE 设置，浏览器只在 browser 模式下首次抓取时启动
+        self.fetch_mode = fetch_mode or os.getenv('FUND_FETCH_MODE', 'akshare')
+        if self.fetch_mode not in FETCH_MODES:
+            raise ValueError(f"未知的获取方式 {self.fetch_mode}，可选: {FETCH_MODES}")
+        self.browser_factory = browser_factory
+        self.browser_pool_size = browser_pool_size
+        self._browser_pool = None
+        self._browser_lock = threading.Lock()
+        # 运行指标，设置 FUND_METRICS_DIR 环境变量时启用
+        self.metrics = metrics or Metrics.from_env('fund_analyzer')
 
     def _log(self, message, level='info'):
         """统一的日志记录方法"""
@@ -94,65 +233,242 @@ class FundAnalyzer:
             logger.error(message)
 
     def _load_cache(self):
-        """从文件加载缓存数据"""
-        if self.cache_data and os.path.exists(self.cache_file):
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
-
-    def _save_cache(self):
-        """将缓存数据保存到文件"""
+        """打开缓存数据库（首次使用时导入旧的 JSON 缓存），条目按需读取"""
         if self.cache_data:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=4)
+            return KeyedCache(self.cache_file, legacy_json=self.legacy_cache_file, max_entries=self.cache_max_entries)
+        return None
+
+    def _save_cache(self, namespace, fund_code, value):
+        """只写入单条缓存记录，不再重写整个缓存文件"""
+        if self.cache is not None:
+            self.cache.set(namespace, fund_code, value)
+
+    @staticmethod
+    def _latest_disclosure_date(now):
+        """返回不晚于 now 的最近一次季报披露日"""
+        for year in (now.year, now.year - 1):
+            for month, day in ((12, 31), (9, 30), (6, 30), (3, 31)):
+                disclosed = datetime(year, month, day) + HOLDINGS_DISCLOSURE_LAG
+                if disclosed <= now:
+                    return disclosed
+
+    def _cache_cutoff(self, namespace, now=None):
+        """返回缓存的新鲜度分界时间，早于该时间写入的条目视为过期"""
+        now = now or datetime.now()
+        if namespace == 'fund':
+            # 净值每天约 21:00 发布，净值类指标按日过期
+            cutoff = datetime.combine(now.date(), datetime.min.time()) + timedelta(hours=21)
+            return cutoff if now >= cutoff else cutoff - timedelta(days=1)
+        if namespace == 'holdings':
+            # 持仓按季度披露
+            return self._latest_disclosure_date(now)
+        return now - self.manager_ttl
+
+    def _schedule_revalidation(self, namespace, fund_code, fetch):
+        """在后台重新获取过期条目，只更新缓存，不影响本次运行已使用的旧值"""
+        with self._revalidate_lock:
+            if (namespace, fund_code) in self._revalidating:
+                return
+            self._revalidating.add((namespace, fund_code))
+            pool = (self._pipeline_pools or {}).get(namespace)
+            if pool is None:
+                pool = self._revalidate_pools.get(namespace)
+                if pool is None:
+                    pool = self._revalidate_pools[namespace] = ThreadPoolExecutor(
+                        max_workers=self.max_workers.get(namespace, 1), thread_name_prefix=f"{namespace}_revalidate"
+                    )
+
+        def revalidate():
+            try:
+                value = fetch(fund_code)
+                if value is not None:
+                    self._save_cache(namespace, fund_code, value)
+                    self._log(f"基金 {fund_code} {CACHE_LABELS[namespace]}已在后台刷新")
+            except Exception as e:
+                self._log(f"后台刷新基金 {fund_code} {CACHE_LABELS[namespace]}失败: {e}", level='warning')
+
+        pool.submit(revalidate)
+
+    def _wait_for_revalidation(self):
+        """等待流水线之外提交的后台刷新任务写完缓存"""
+        with self._revalidate_lock:
+            pools, self._revalidate_pools = self._revalidate_pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    def _get_client(self):
+        """按需取得共享请求客户端，并登记各数据源的初始速率"""
+        with self._client_lock:
+            if not self._client_ready:
+                self._client = self._client or http_client.shared_client()
+                for source, rate in self.rate_limits.items():
+                    self._client.configure(source, rate=rate)
+                    self._client.configure(f"{source}_page", rate=rate)
+                self._client_ready = True
+            return self._client
+
+    def _call_with_retry(self, source, func, *args, attempts=None, **kwargs):
+        """经共享客户端调用 func：按数据源自适应限速和熔断，失败后指数退避重试，最后一次失败时抛出异常
+
+        attempts 缺省时使用客户端的 max_attempts。
+        """
+        return self._get_client().call(source, func, *args, attempts=attempts, metrics=self.metrics, **kwargs)
+
+    def _get_browser(self):
+        """按需创建浏览器驱动池"""
+        with self._browser_lock:
+            if self._browser_pool is None:
+                self._browser_pool = BrowserPool(self.browser_pool_size, self.browser_factory)
+            return self._browser_pool
+
+    def _close_browser(self):
+        with self._browser_lock:
+            if self._browser_pool is not None:
+                self._browser_pool.close()
+                self._browser_pool = None
+
+    def _get_page_html(self, source, url, wait_for_element=None):
+        """按当前获取方式抓取网页 HTML：browser 模式使用浏览器池，其余使用普通 HTTP 请求"""
+        # 网页与 akshare 接口分别限速和熔断，akshare 熔断时仍可退回网页抓取
+        endpoint = f"{source}_page"
+        if self.fetch_mode == 'browser':
+            def render():
+                html = self._get_browser().get_page_source(url, wait_for_element)
+                if html is None:
+                    raise requests.exceptions.RequestException(f"浏览器抓取 {url} 失败")
+                return html
+            html = self._call_with_retry(endpoint, render)
+            self.metrics.inc('bytes_downloaded', len(html), source=source)
+            return html
+        response = self._get_client().get(url, endpoint=endpoint, metrics=self.metrics,
+                                          headers=SCRAPE_HEADERS, timeout=10)
+        self.metrics.inc('bytes_downloaded', len(response.content), source=source)
+        return response.text
+
+    def _parse_html(self, source, html):
+        with self.metrics.timer('parse', source=source):
+            return bs4.BeautifulSoup(html, 'html.parser')
+
+    def _get_with_cache(self, namespace, fund_code, target, fetch, fallback):
+        """
+        按命名空间的新鲜度规则读取缓存，必要时调用 fetch 获取并写入 target[fund_code]。
+        - 新鲜的缓存直接使用；
+        - 已过期但在宽限期内：先使用旧值，同时后台刷新（stale-while-revalidate）；
+        - 否则同步获取，获取失败时退回使用过期缓存，仍没有则使用 fallback。
+        """
+        used, entry = self._lookup_cache(namespace, fund_code, target, fetch)
+        if used:
+            return True
+        value = fetch(fund_code)
+        if value is not None:
+            self._save_cache(namespace, fund_code, value)
+            target[fund_code] = value
+            return True
+        return self._fall_back(namespace, fund_code, target, entry, fallback)
+
+    def _lookup_cache(self, namespace, fund_code, target, fetch):
+        """
+        按新鲜度规则查找缓存，返回 (是否已使用缓存, 缓存条目)。
+        新鲜或在宽限期内的条目写入 target[fund_code]，后者同时用 fetch 在后台刷新。
+        """
+        label = CACHE_LABELS[namespace]
+        with self.metrics.timer('cache_lookup', namespace=namespace):
+            entry = self.cache.get_entry(namespace, fund_code) if self.cache is not None else None
+        if entry is not None:
+            value, updated_at = entry
+            cutoff = self._cache_cutoff(namespace)
+            if updated_at >= cutoff:
+                self.metrics.inc('cache_lookups', namespace=namespace, result='hit')
+                target[fund_code] = value
+                self._log(f"使用缓存的基金 {fund_code} {label}")
+                return True, entry
+            if updated_at >= cutoff - self.stale_grace.get(namespace, timedelta(0)):
+                self.metrics.inc('cache_lookups', namespace=namespace, result='stale')
+                target[fund_code] = value
+                self._log(f"基金 {fund_code} 缓存的{label}已过期，先使用旧数据并在后台刷新")
+                self._schedule_revalidation(namespace, fund_code, fetch)
+                return True, entry
+
+        self.metrics.inc('cache_lookups', namespace=namespace, result='miss' if entry is None else 'expired')
+        return False, entry
+
+    def _fall_back(self, namespace, fund_code, target, entry, fallback):
+        """获取失败时退回使用过期缓存，仍没有则使用 fallback"""
+        if entry is not None:
+            self._log(f"基金 {fund_code} {CACHE_LABELS[namespace]}获取失败，使用过期缓存", level='warning')
+            target[fund_code] = entry[0]
+            return True
+        target[fund_code] = fallback
+        return False
 
     def _get_fund_data(self, fund_code: str):
         """
         获取基金的单位净值和累计净值数据，用于计算夏普比率和最大回撤。
         优先使用 akshare，失败则通过网页抓取。
         """
-        if fund_code in self.cache.get('fund', {}):
-            self.fund_data[fund_code] = self.cache['fund'][fund_code]
-            self._log(f"使用缓存的基金 {fund_code} 数据")
+        return self._get_with_cache('fund', fund_code, self.fund_data, self._fetch_fund_data, FUND_DATA_FALLBACK)
+
+    def _get_fund_nav(self, fund_code: str):
+        """
+        流水线中的净值阶段：缓存可用时直接使用缓存的指标，否则只抓取净值序列，
+        指标留待全部基金抓取完成后由 _compute_pending_fund_data 一次批量计算。
+        """
+        used, entry = self._lookup_cache('fund', fund_code, self.fund_data, self._fetch_fund_data)
+        if used:
             return True
+        nav = self._fetch_fund_nav(fund_code)
+        if nav is not None:
+            with self._nav_series_lock:
+                self.nav_series[fund_code] = nav
+            return True
+        return self._fall_back('fund', fund_code, self.fund_data, entry, FUND_DATA_FALLBACK)
 
+    def _fetch_fund_nav(self, fund_code: str):
+        """从网络获取单位净值序列（以净值日期为索引），失败或不足一年数据时返回 None"""
         self._log(f"正在获取基金 {fund_code} 的实时数据...")
-        for attempt in range(3):  # 手动重试机制，最多3次
-            try:
-                fund_data = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
-                fund_data['净值日期'] = pd.to_datetime(fund_data['净值日期'])
-                fund_data.set_index('净值日期', inplace=True)
-                
-                # 数据清洗：去除异常值和缺失值
-                fund_data = fund_data.dropna()
-                if len(fund_data) < 252:  # 至少一年数据
-                    raise ValueError("数据不足，无法计算可靠的夏普比率和回撤")
+        try:
+            # 网络请求最多3次，指数退避重试
+            fund_data = self._call_with_retry('fund', ak.fund_open_fund_info_em, symbol=fund_code, indicator="单位净值走势", attempts=3)
+            fund_data['净值日期'] = pd.to_datetime(fund_data['净值日期'])
+            fund_data.set_index('净值日期', inplace=True)
+            
+            # 数据清洗：去除异常值和缺失值
+            fund_data = fund_data.dropna()
+            if len(fund_data) < 252:  # 至少一年数据
+                raise ValueError("数据不足，无法计算可靠的夏普比率和回撤")
+            self.metrics.inc('rows_processed', len(fund_data), source='fund')
+            return fund_data['单位净值'].astype(float)
+        except Exception as e:
+            self._log(f"获取基金 {fund_code} 数据失败: {e}")
+            return None
 
-                returns = fund_data['单位净值'].pct_change().dropna()
-                
-                annual_returns = returns.mean() * 252
-                annual_volatility = returns.std() * (252**0.5)
-                sharpe_ratio = (annual_returns - self.risk_free_rate) / annual_volatility if annual_volatility != 0 else 0
-                
-                rolling_max = fund_data['单位净值'].cummax()
-                daily_drawdown = (fund_data['单位净值'] - rolling_max) / rolling_max
-                max_drawdown = daily_drawdown.min() * -1
-                
-                self.fund_data[fund_code] = {
-                    'latest_nav': float(fund_data['单位净值'].iloc[-1]),
-                    'sharpe_ratio': float(sharpe_ratio),
-                    'max_drawdown': float(max_drawdown)
-                }
-                if self.cache_data:
-                    self.cache.setdefault('fund', {})[fund_code] = self.fund_data[fund_code]
-                    self._save_cache()
-                self._log(f"基金 {fund_code} 数据已获取：{self.fund_data[fund_code]}")
-                return True
-            except Exception as e:
-                self._log(f"获取基金 {fund_code} 数据失败 (尝试 {attempt+1}/3): {e}")
-                time.sleep(2)  # 等待2秒后重试
-        self.fund_data[fund_code] = {'latest_nav': np.nan, 'sharpe_ratio': np.nan, 'max_drawdown': np.nan}
-        return False
+    def _compute_fund_metrics(self, nav_series):
+        """用风险指标引擎对 {fund_code: 净值序列} 一次批量计算全部指标，返回 {fund_code: 指标字典}"""
+        started = time.perf_counter()
+        metrics = fund_risk_metrics(nav_series, self.risk_free_rate, self.benchmark_nav)
+        self.metrics.observe('indicator', time.perf_counter() - started)
+        return metrics
+
+    def _fetch_fund_data(self, fund_code: str):
+        """从网络获取净值并计算指标，失败返回 None"""
+        nav = self._fetch_fund_nav(fund_code)
+        if nav is None:
+            return None
+        metrics = self._compute_fund_metrics({fund_code: nav})[fund_code]
+        self._log(f"基金 {fund_code} 数据已获取：{metrics}")
+        return metrics
+
+    def _compute_pending_fund_data(self):
+        """对流水线中抓取到净值序列的基金一次批量计算指标，写入 fund_data 和缓存"""
+        with self._nav_series_lock:
+            pending, self.nav_series = self.nav_series, {}
+        if not pending:
+            return
+        self._log(f"批量计算 {len(pending)} 个基金的风险指标...")
+        for fund_code, metrics in self._compute_fund_metrics(pending).items():
+            self._save_cache('fund', fund_code, metrics)
+            self.fund_data[fund_code] = metrics
+            self._log(f"基金 {fund_code} 数据已获取：{metrics}")
 
     def _scrape_manager_data_from_web(self, fund_code: str) -> dict:
         """
@@ -160,13 +476,8 @@ class FundAnalyzer:
         """
         self._log(f"尝试通过网页抓取获取基金 {fund_code} 的基金经理数据...")
         manager_url = f"http://fundf10.eastmoney.com/jjjl_{fund_code}.html"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
         try:
-            response = requests.get(manager_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = self._parse_html('manager', self._get_page_html('manager', manager_url))
 
             # 找到包含“基金经理变动一览”文本的标签
             title_label = soup.find('label', string='基金经理变动一览')
@@ -229,47 +540,38 @@ class FundAnalyzer:
         """
         获取基金经理数据（首先尝试使用 akshare，失败则通过网页抓取）
         """
-        if fund_code in self.cache.get('manager', {}):
-            self.manager_data[fund_code] = self.cache['manager'][fund_code]
-            self._log(f"使用缓存的基金 {fund_code} 经理数据")
-            return True
+        return self._get_with_cache('manager', fund_code, self.manager_data, self._fetch_fund_manager_data,
+                                    {'name': 'N/A', 'tenure_years': np.nan, 'cumulative_return': np.nan})
 
+    def _fetch_fund_manager_data(self, fund_code: str):
+        """从网络获取基金经理数据，失败返回 None"""
         self._log(f"正在获取基金 {fund_code} 的基金经理数据...")
-        try:
-            # 修复：akshare接口已变更为fund_manager_em
-            manager_info = ak.fund_manager_em(symbol=fund_code)
-            if not manager_info.empty:
-                latest_manager = manager_info.sort_values(by='上任日期', ascending=False).iloc[0]
-                name = latest_manager.get('姓名', 'N/A')
-                tenure_days = latest_manager.get('任职天数', np.nan)
-                cumulative_return = latest_manager.get('任职回报', '0%')
-                cumulative_return = float(str(cumulative_return).replace('%', '')) if isinstance(cumulative_return, str) else float(cumulative_return)
+        if self.fetch_mode == 'akshare':
+            try:
+                # 修复：akshare接口已变更为fund_manager_em
+                manager_info = self._call_with_retry('manager', ak.fund_manager_em, symbol=fund_code)
+                if not manager_info.empty:
+                    latest_manager = manager_info.sort_values(by='上任日期', ascending=False).iloc[0]
+                    name = latest_manager.get('姓名', 'N/A')
+                    tenure_days = latest_manager.get('任职天数', np.nan)
+                    cumulative_return = latest_manager.get('任职回报', '0%')
+                    cumulative_return = float(str(cumulative_return).replace('%', '')) if isinstance(cumulative_return, str) else float(cumulative_return)
                 
-                self.manager_data[fund_code] = {
-                    'name': name,
-                    'tenure_years': float(tenure_days) / 365.0 if pd.notna(tenure_days) else np.nan,
-                    'cumulative_return': cumulative_return
-                }
-                if self.cache_data:
-                    self.cache.setdefault('manager', {})[fund_code] = self.manager_data[fund_code]
-                    self._save_cache()
-                self._log(f"基金 {fund_code} 经理数据已通过akshare获取：{self.manager_data[fund_code]}")
-                return True
-        except Exception as e:
-            self._log(f"使用akshare获取基金 {fund_code} 经理数据失败: {e}")
+                    manager = {
+                        'name': name,
+                        'tenure_years': float(tenure_days) / 365.0 if pd.notna(tenure_days) else np.nan,
+                        'cumulative_return': cumulative_return
+                    }
+                    self._log(f"基金 {fund_code} 经理数据已通过akshare获取：{manager}")
+                    return manager
+            except Exception as e:
+                self._log(f"使用akshare获取基金 {fund_code} 经理数据失败: {e}")
 
         # 如果akshare失败，尝试网页抓取
         scraped_data = self._scrape_manager_data_from_web(fund_code)
         if scraped_data:
-            self.manager_data[fund_code] = scraped_data
-            self._log(f"基金 {fund_code} 经理数据已通过网页抓取获取：{self.manager_data[fund_code]}")
-            if self.cache_data:
-                self.cache.setdefault('manager', {})[fund_code] = self.manager_data[fund_code]
-                self._save_cache()
-            return True
-        else:
-            self.manager_data[fund_code] = {'name': 'N/A', 'tenure_years': np.nan, 'cumulative_return': np.nan}
-            return False
+            self._log(f"基金 {fund_code} 经理数据已通过网页抓取获取：{scraped_data}")
+        return scraped_data
 
     def get_market_sentiment(self):
         """获取市场情绪（仅调用一次，基于上证指数）"""
@@ -278,8 +580,9 @@ class FundAnalyzer:
             return True
         self._log("正在获取市场情绪数据...")
         try:
-            index_data = ak.stock_zh_index_daily_em(symbol="sh000001")
+            index_data = self._call_with_retry('index', ak.stock_zh_index_daily_em, symbol="sh000001", attempts=3)
             index_data['date'] = pd.to_datetime(index_data['date'])
+            self.benchmark_nav = index_data.set_index('date')['close'].astype(float)
             last_week_data = index_data.iloc[-7:]
             
             price_change = last_week_data['close'].iloc[-1] / last_week_data['close'].iloc[0] - 1
@@ -303,36 +606,28 @@ class FundAnalyzer:
         """
         新增方法：抓取基金的股票持仓数据。
         """
-        if fund_code in self.cache.get('holdings', {}):
-            self.holdings_data[fund_code] = self.cache['holdings'][fund_code]
-            self._log(f"使用缓存的基金 {fund_code} 持仓数据")
-            return True
+        return self._get_with_cache('holdings', fund_code, self.holdings_data, self._fetch_fund_holdings_data, [])
 
+    def _fetch_fund_holdings_data(self, fund_code: str):
+        """从网络获取持仓数据，失败返回 None"""
         self._log(f"正在获取基金 {fund_code} 的持仓数据...")
         
-        # 优先使用 akshare 接口
-        try:
-            holdings_df = ak.fund_portfolio_hold_em(symbol=fund_code)
-            if not holdings_df.empty:
-                self.holdings_data[fund_code] = holdings_df.to_dict('records')
-                self._log(f"基金 {fund_code} 持仓数据已通过akshare获取。")
-                if self.cache_data:
-                    self.cache.setdefault('holdings', {})[fund_code] = self.holdings_data[fund_code]
-                    self._save_cache()
-                return True
-        except Exception as e:
-            self._log(f"通过akshare获取基金 {fund_code} 持仓数据失败: {e}")
+        # 优先使用 akshare 接口（仅 akshare 模式）
+        if self.fetch_mode == 'akshare':
+            try:
+                holdings_df = self._call_with_retry('holdings', ak.fund_portfolio_hold_em, symbol=fund_code)
+                if not holdings_df.empty:
+                    self._log(f"基金 {fund_code} 持仓数据已通过akshare获取。")
+                    return holdings_df.to_dict('records')
+            except Exception as e:
+                self._log(f"通过akshare获取基金 {fund_code} 持仓数据失败: {e}")
 
         # 如果 akshare 失败，尝试网页抓取
         holdings_url = f"http://fundf10.eastmoney.com/ccmx_{fund_code}.html"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
         
         try:
-            response = requests.get(holdings_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # 持仓表格由页面脚本加载，浏览器模式下等待表格出现
+            soup = self._parse_html('holdings', self._get_page_html('holdings', holdings_url, wait_for_element='table'))
             
             # 修复：使用更稳健的 find_next 方法，并精确匹配h4标签
             holdings_header = soup.find('h4', string=lambda t: t and '股票投资明细' in t)
@@ -355,16 +650,11 @@ class FundAnalyzer:
                         '占净值比例': float(cols[4].text.strip().replace('%', '')),
                         '持仓市值（万元）': float(cols[6].text.strip().replace(',', '')),
                     })
-            self.holdings_data[fund_code] = holdings
             self._log(f"基金 {fund_code} 持仓数据已通过网页抓取获取。")
-            if self.cache_data:
-                self.cache.setdefault('holdings', {})[fund_code] = self.holdings_data[fund_code]
-                self._save_cache()
-            return True
+            return holdings
         except Exception as e:
             self._log(f"获取基金 {fund_code} 持仓数据失败: {e}")
-            self.holdings_data[fund_code] = []
-            return False
+            return None
             
     def _evaluate_fund(self, fund_code, fund_name, fund_type):
         """
@@ -373,16 +663,47 @@ class FundAnalyzer:
         self._log(f"--- 正在分析基金 {fund_code} ---")
         
         # 尝试获取基本信息，如果失败则跳过整个分析
-        if not self._get_fund_data(fund_code):
+        fund_ok = self._get_fund_data(fund_code)
+        if fund_ok:
+            # 获取基金经理数据
+            self.get_fund_manager_data(fund_code)
+            
+            # 获取持仓数据
+            self.get_fund_holdings_data(fund_code)
+
+        self._score_fund(fund_code, fund_name, fund_type, fund_ok)
+
+    def _submit_fund_pipeline(self, pools, fund_code):
+        """
+        提交单个基金的数据获取流水线：先获取净值（或缓存的净值指标），成功后再并行获取经理和持仓数据。
+        返回一个 Future，结果为净值数据是否获取成功。
+        """
+        done = Future()
+
+        def on_fund_done(fund_future):
+            try:
+                fund_ok = fund_future.result()
+            except Exception as e:
+                self._log(f"获取基金 {fund_code} 数据时出错: {e}", level='error')
+                fund_ok = False
+            if not fund_ok:
+                done.set_result(False)
+                return
+            manager_future = pools['manager'].submit(self.get_fund_manager_data, fund_code)
+            holdings_future = pools['holdings'].submit(self.get_fund_holdings_data, fund_code)
+            manager_future.add_done_callback(
+                lambda _: holdings_future.add_done_callback(lambda _: done.set_result(True))
+            )
+
+        pools['fund'].submit(self._get_fund_nav, fund_code).add_done_callback(on_fund_done)
+        return done
+
+    def _score_fund(self, fund_code, fund_name, fund_type, fund_ok):
+        """根据已获取的数据为基金评分并写入 report_data"""
+        if not fund_ok:
             self._log(f"基金 {fund_code} 基本信息获取失败，跳过分析。")
             self.report_data.append({'fund_code': fund_code, 'fund_name': fund_name, 'decision': 'Skip', 'score': np.nan})
             return
-            
-        # 获取基金经理数据
-        self.get_fund_manager_data(fund_code)
-        
-        # 获取持仓数据
-        self.get_fund_holdings_data(fund_code)
 
         # 评分体系 (示例)
         scores = {}
@@ -390,7 +711,7 @@ class FundAnalyzer:
         
         # 1. 夏普比率评分 (越高越好)
         sharpe_ratio = self.fund_data[fund_code].get('sharpe_ratio')
-        if pd.notna(sharpe_ratio):
+        if _notna(sharpe_ratio):
             scores['sharpe_ratio_score'] = min(10, max(0, int(sharpe_ratio * 10))) # 简单线性评分
             values['sharpe_ratio_value'] = sharpe_ratio
         else:
@@ -399,16 +720,20 @@ class FundAnalyzer:
 
         # 2. 最大回撤评分 (越小越好)
         max_drawdown = self.fund_data[fund_code].get('max_drawdown')
-        if pd.notna(max_drawdown):
+        if _notna(max_drawdown):
             scores['max_drawdown_score'] = min(10, max(0, 10 - int(max_drawdown * 10))) # 简单反向线性评分
             values['max_drawdown_value'] = max_drawdown
         else:
             scores['max_drawdown_score'] = 0
             values['max_drawdown_value'] = np.nan
+
+        # 其余风险指标只记录数值，不参与评分（旧缓存条目中可能没有）
+        for field in ('annual_volatility', 'sortino_ratio', 'calmar_ratio', 'rolling_volatility', 'beta'):
+            values[f'{field}_value'] = self.fund_data[fund_code].get(field, np.nan)
             
         # 3. 基金经理任职年限评分
         manager_years = self.manager_data[fund_code].get('tenure_years')
-        if pd.notna(manager_years) and manager_years >= 3:
+        if _notna(manager_years) and manager_years >= 3:
             scores['manager_years_score'] = 10
         else:
             scores['manager_years_score'] = 0
@@ -416,7 +741,7 @@ class FundAnalyzer:
         
         # 4. 基金经理任职回报评分
         manager_return = self.manager_data[fund_code].get('cumulative_return')
-        if pd.notna(manager_return) and manager_return > 0:
+        if _notna(manager_return) and manager_return > 0:
             scores['manager_return_score'] = 10
         else:
             scores['manager_return_score'] = 0
@@ -424,8 +749,8 @@ class FundAnalyzer:
             
         # 5. 持仓集中度评分
         if self.holdings_data[fund_code]:
-            holdings_df = pd.DataFrame(self.holdings_data[fund_code])
-            top_10_holdings_ratio = holdings_df['占净值比例'].iloc[:10].sum()
+            top_10_ratios = [holding.get('占净值比例') for holding in self.holdings_data[fund_code][:10]]
+            top_10_holdings_ratio = sum(ratio for ratio in top_10_ratios if _notna(ratio))
             if top_10_holdings_ratio < 60:
                 scores['holding_concentration_score'] = 10
             else:
@@ -455,49 +780,55 @@ class FundAnalyzer:
         self._log(f"评分详情: {scores}")
         self._log(f"基金 {fund_code} 评估完成，总分: {total_score}，决策: {decision}")
 
-    def _save_report_to_markdown(self):
-        """将分析报告保存为 Markdown 文件"""
+    @staticmethod
+    def _summary_table(title, decision):
+        """汇总结果中某一决策的基金表，按分数降序"""
+        return ReportTable(
+            f"### {title}\n\n", ['fund_code', 'fund_name', 'score'],
+            row=lambda item: [item['fund_code'], item['fund_name'], item['score']] if item['decision'] == decision else None,
+            sort_key=lambda row: -row[2],
+            formats={'score': 'g'},
+            empty_text="无\n\n",
+        )
+
+    @staticmethod
+    def _report_section(item):
+        """单个基金的详细分析段落"""
+        lines = [
+            f"### 基金 {item['fund_code']} - {item.get('fund_name', 'N/A')}\n",
+            f"- 最终决策: **{item['decision']}**\n",
+            f"- 综合分数: **{item['score']:.2f}**\n",
+        ]
+        if item['decision'] != 'Skip':
+            lines.append("- **评分细项**:\n")
+            lines.extend(f"  - {k}: {v}\n" for k, v in item.get('scores_details', {}).items())
+            lines.append("- **数据值**:\n")
+            lines.extend(f"  - {k}: {v}\n" for k, v in item.get('values_details', {}).items())
+        lines.append("\n---\n\n")
+        return ''.join(lines)
+
+    def _save_report_to_markdown(self, report_path="analysis_report.md"):
+        """将分析报告流式写入 Markdown 文件：汇总表经外部排序，详细段落按评估顺序"""
         if not self.report_data:
             return
         
-        report_path = "analysis_report.md"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write("--- 批量基金分析报告 ---\n\n")
-            f.write(f"生成日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write("--- 汇总结果 ---\n\n")
-            
-            results_df = pd.DataFrame(self.report_data)
-            valid_results = results_df[results_df['decision'] != 'Skip']
-            
-            if not valid_results.empty:
-                f.write("### 推荐基金\n\n")
-                recommended = valid_results[valid_results['decision'] == '推荐'].sort_values(by='score', ascending=False)
-                if not recommended.empty:
-                    f.write(recommended[['fund_code', 'fund_name', 'score']].to_markdown(index=False) + "\n\n")
-                else:
-                    f.write("无\n\n")
-                    
-                f.write("### 观望基金\n\n")
-                watchlist = valid_results[valid_results['decision'] == '观望'].sort_values(by='score', ascending=False)
-                if not watchlist.empty:
-                    f.write(watchlist[['fund_code', 'fund_name', 'score']].to_markdown(index=False) + "\n\n")
-                else:
-                    f.write("无\n\n")
-            
-            f.write("--- 详细分析 ---\n\n")
-            for item in self.report_data:
-                f.write(f"### 基金 {item['fund_code']} - {item.get('fund_name', 'N/A')}\n")
-                f.write(f"- 最终决策: **{item['decision']}**\n")
-                f.write(f"- 综合分数: **{item['score']:.2f}**\n")
-                
-                if item['decision'] != 'Skip':
-                    f.write("- **评分细项**:\n")
-                    for k, v in item.get('scores_details', {}).items():
-                        f.write(f"  - {k}: {v}\n")
-                    f.write("- **数据值**:\n")
-                    for k, v in item.get('values_details', {}).items():
-                        f.write(f"  - {k}: {v}\n")
-                f.write("\n---\n\n")
+        preamble = (
+            "--- 批量基金分析报告 ---\n\n"
+            f"生成日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            "--- 汇总结果 ---\n\n"
+        )
+        tables = [self._summary_table('推荐基金', '推荐'), self._summary_table('观望基金', '观望')]
+        write_report(report_path, iter(self.report_data), tables, preamble=preamble,
+                     section=self._report_section, sections_title="--- 详细分析 ---\n\n")
+
+    def _save_recommendation_manifest(self, manifest_path=RECOMMENDATION_MANIFEST):
+        """写出供 MarketMonitor 读取的推荐清单（JSON Lines，每个基金一行：代码、决策、分数）"""
+        if not self.report_data:
+            return
+        written = write_manifest(
+            manifest_path, ((item['fund_code'], item['decision'], item['score']) for item in self.report_data)
+        )
+        self._log(f"推荐清单已写入 {manifest_path}，共 {written} 个基金")
 
     def run_analysis(self, fund_codes: list, fund_info: dict):
         """
@@ -508,8 +839,25 @@ class FundAnalyzer:
         # 仅调用一次获取市场情绪
         self.get_market_sentiment()
         
-        for code in fund_codes:
-            self._evaluate_fund(code, fund_info.get(code, 'N/A'), '混合型') # 假设类型
+        # 各数据源使用独立的有界线程池并发获取，再按输入顺序依次评分，保证报告顺序确定
+        # 过期缓存的后台刷新也提交到对应数据源的线程池，关闭线程池时一并等待完成
+        pools = {source: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=source)
+                 for source, workers in self.max_workers.items()}
+        self._pipeline_pools = pools
+        try:
+            pipelines = [self._submit_fund_pipeline(pools, code) for code in fund_codes]
+            fund_oks = [pipeline.result() for pipeline in pipelines]
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+            self._pipeline_pools = None
+
+        # 全部抓取完成后一次批量计算风险指标，再按输入顺序评分
+        self._compute_pending_fund_data()
+        for code, fund_ok in zip(fund_codes, fund_oks):
+            self._log(f"--- 正在分析基金 {code} ---")
+            self._score_fund(code, fund_info.get(code, 'N/A'), '混合型', fund_ok) # 假设类型
+            self.metrics.inc('funds_scored')
         
         # 生成并保存最终报告
         results_df = pd.DataFrame(self.report_data)
@@ -519,14 +867,19 @@ class FundAnalyzer:
         else:
             self._log("\n没有基金获得有效评分。")
         
-        self._save_report_to_markdown()
+        with self.metrics.timer('report'):
+            self._save_report_to_markdown()
+            self._save_recommendation_manifest()
+        self._wait_for_revalidation()
+        self._close_browser()
+        self.metrics.dump()
         
         return results_df
 
 if __name__ == '__main__':
-    # 请确保已安装所有库，特别是 Selenium 和 ChromeDriver
-    # pip install selenium akshare pandas numpy requests beautifulsoup4 lxml
-    # 还需要手动下载与您的 Chrome 版本匹配的 ChromeDriver 并配置环境变量或修改路径
+    # 请确保已安装所有库
+    # pip install akshare pandas numpy requests beautifulsoup4 lxml tabulate
+    # 仅在 FUND_FETCH_MODE=browser 时需要 selenium 以及与 Chrome 版本匹配的 ChromeDriver
     
     funds_list_url = 'https://raw.githubusercontent.com/qjlxg/rep/main/recommended_cn_funds.csv'
     
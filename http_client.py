@@ -0,0 +1,376 @@
+"""
+东方财富 / akshare 请求共用的客户端层。
+
+每个接口 (endpoint) 有独立的 AIMD 自适应限速器和熔断器：
+- 请求成功且延迟正常时速率线性增加；被限流 (429/503 等)、超时、连接错误或延迟超过目标时速率按比例下降；
+- 近期失败（含慢请求）占比过高时熔断器打开，一段时间内直接拒绝该接口的请求，之后只放行一个探测请求决定是否恢复。
+重试也在这里统一进行（指数退避），线程和 asyncio 协程共用同一套限速与熔断状态。
+"""
+import asyncio
+import functools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+# 视为上游限流或过载的 HTTP 状态码，会触发减速并重试；其余 4xx 直接返回错误
+THROTTLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """熔断器打开期间拒绝请求，retry_after 为距下一次允许探测的秒数"""
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"接口 {endpoint} 已熔断，{retry_after:.1f} 秒后重试")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class AdaptiveRate:
+    """
+    AIMD 自适应限速器：按请求到达顺序依次分配时间片，平均每秒不超过 rate 次。
+
+    每次正常完成 rate += increase / rate（约每秒增加 increase），收到拥塞信号时 rate *= decrease；
+    同一次拥塞中并发返回的多个失败只减速一次（两次减速至少间隔 cooldown 秒）。
+    """
+    def __init__(self, rate, min_rate=0.2, max_rate=20.0, increase=1.0, decrease=0.5, cooldown=1.0):
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, self.rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._next_slot = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """预约下一个发送时间片，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        return slot - now
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_congestion(self):
+        """返回本次是否实际减速"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return False
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._last_decrease = now
+            return True
+
+
+class CircuitBreaker:
+    """
+    滑动窗口熔断器。
+
+    最近 window 次请求中失败（含慢请求）占比达到 failure_ratio 且至少有 min_calls 次时打开，
+    打开期间拒绝请求；open_seconds 秒后进入半开状态，只放行一个探测请求：成功则关闭，
+    失败则再次打开，打开时长加倍（不超过 max_open_seconds）。
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, window=20, min_calls=5, failure_ratio=0.5, open_seconds=5.0, max_open_seconds=60.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._open_for = open_seconds
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """允许请求时返回 None，否则返回距下一次允许探测的秒数"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return None
+            remaining = self._opened_at + self._open_for - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return None
+            return max(remaining, 0.1)
+
+    def release(self):
+        """请求未完成就被取消时调用，归还半开状态的探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok):
+        """记录一次请求结果，返回熔断器是否因此打开"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    self._open_for = self.open_seconds
+                    return False
+                self._open_for = min(self.max_open_seconds, self._open_for * 2)
+                return self._open()
+            if self.state == self.OPEN:
+                # 打开前已发出的请求陆续返回，不影响状态
+                return False
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_ratio * len(self._outcomes):
+                return self._open()
+            return False
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        return True
+
+
+class _Endpoint:
+    __slots__ = ('name', 'rate', 'breaker')
+
+    def __init__(self, name, rate, breaker):
+        self.name = name
+        self.rate = rate
+        self.breaker = breaker
+
+
+class HttpClient:
+    """
+    带自适应限速、熔断和重试的共享请求层。
+
+    get / get_async 通过共享的 requests.Session 发出 HTTP 请求；call / call_async 包装 akshare 等
+    自行发请求的函数，同样经过限速、熔断和重试。只有 requests 的连接错误、超时和限流状态码
+    视为拥塞并重试，函数抛出的其他异常原样立即抛出。
+    接口按名称区分（HTTP 请求默认取 主机+路径），各自的初始速率可用 configure 设置。
+    """
+    def __init__(self, rate=4.0, min_rate=0.2, max_rate=20.0, latency_target=5.0, max_attempts=5,
+                 retry_base_delay=1.0, retry_max_delay=30.0, circuit_wait=5.0, timeout=30, pool_size=16,
+                 breaker=None, metrics=None):
+        self.defaults = {'rate': rate, 'min_rate': min_rate, 'max_rate': max_rate}
+        self.breaker_options = breaker or {}
+        self.latency_target = latency_target
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # 熔断期间请求最多累计等待的秒数，熔断剩余时间更长时直接失败
+        self.circuit_wait = circuit_wait
+        self.timeout = timeout
+        self.metrics = metrics or Metrics('http_client')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size)
+        self._options = {}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def configure(self, endpoint, **options):
+        """设置接口的限速参数 (rate / min_rate / max_rate)，只影响之后首次使用的接口"""
+        with self._lock:
+            self._options.setdefault(endpoint, {}).update(options)
+
+    def endpoint(self, name):
+        with self._lock:
+            endpoint = self._endpoints.get(name)
+            if endpoint is None:
+                endpoint = _Endpoint(
+                    name, AdaptiveRate(**{**self.defaults, **self._options.get(name, {})}),
+                    CircuitBreaker(**self.breaker_options)
+                )
+                self._endpoints[name] = endpoint
+            return endpoint
+
+    def stats(self):
+        """各接口当前的速率和熔断器状态"""
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        return {endpoint.name: {'rate': endpoint.rate.rate, 'state': endpoint.breaker.state} for endpoint in endpoints}
+
+    @staticmethod
+    def _check_circuit(endpoint, metrics):
+        """熔断器打开时抛出 CircuitOpenError；被拒绝的请求不占用限速时间片"""
+        retry_after = endpoint.breaker.before_call()
+        if retry_after is not None:
+            metrics.inc('circuit_rejections', source=endpoint.name)
+            raise CircuitOpenError(endpoint.name, retry_after)
+
+    def _record(self, endpoint, started, error, metrics):
+        """根据结果和延迟更新速率与熔断器，返回该错误是否值得重试"""
+        if started is None or not isinstance(error, (Exception, type(None))):
+            # 等待发送或请求过程中被取消，不作为接口的信号
+            endpoint.breaker.release()
+            return False
+        elapsed = time.monotonic() - started
+        metrics.observe('fetch', elapsed, source=endpoint.name)
+        if error is not None and not isinstance(error, requests.exceptions.RequestException):
+            # KeyError / ValueError 等是调用方或数据解析的问题，与接口拥塞无关：不重试，也不计入熔断
+            metrics.inc('http_requests', source=endpoint.name, status=type(error).__name__)
+            endpoint.breaker.release()
+            return False
+        response = getattr(error, 'response', None)
+        status = response.status_code if response is not None else None
+        if error is None:
+            congested = self.latency_target is not None and elapsed > self.latency_target
+            retryable = False
+            outcome = 'slow' if congested else 'ok'
+        elif status is not None and status not in THROTTLE_STATUS:
+            # 普通的 4xx 说明接口本身正常，不减速也不重试
+            congested = retryable = False
+            outcome = str(status)
+        else:
+            # 连接错误、超时和限流状态码
+            congested = retryable = True
+            outcome = str(status) if status is not None else type(error).__name__
+        metrics.inc('http_requests', source=endpoint.name, status=outcome)
+
+        if congested:
+            if endpoint.rate.on_congestion():
+                metrics.inc('rate_decreases', source=endpoint.name)
+                logger.info("接口 %s 出现拥塞信号 (%s)，速率降至 %.2f 次/秒", endpoint.name, outcome, endpoint.rate.rate)
+        else:
+            endpoint.rate.on_success()
+        if endpoint.breaker.record(not congested):
+            metrics.inc('circuit_opens', source=endpoint.name)
+            logger.warning("接口 %s 近期失败过多，熔断 %.1f 秒", endpoint.name, endpoint.breaker._open_for)
+        return retryable
+
+    def _backoff(self, endpoint, error, attempt, attempts, waited, metrics):
+        """
+        失败后的等待秒数，不应再重试时返回 None。
+
+        熔断拒绝不消耗重试次数；只有能在 circuit_wait 秒的累计等待内等到熔断器放行探测时才等待，
+        否则立即失败，避免工作线程长时间阻塞在已熔断的接口上。
+        其余可重试的失败按指数退避（带随机抖动），最多 attempts 次。
+        """
+        if isinstance(error, CircuitOpenError):
+            if waited + error.retry_after > self.circuit_wait:
+                return None
+            return error.retry_after
+        if attempt + 1 >= attempts:
+            return None
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        metrics.inc('fetch_retries', source=endpoint.name)
+        logger.info("请求 %s 失败 (尝试 %d/%d)，%.1f 秒后重试: %s", endpoint.name, attempt + 1, attempts, delay, error)
+        return delay
+
+    def _send(self, url, kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _endpoint_name(url):
+        parts = urlsplit(url)
+        return parts.netloc + parts.path
+
+    def call(self, endpoint, func, *args, attempts=None, metrics=None, **kwargs):
+        """在当前线程中经限速、熔断调用 func，失败按指数退避重试，最后一次失败时抛出异常"""
+        endpoint = self.endpoint(endpoint)
+        metrics = metrics or self.metrics
+        attempts = attempts or self.max_attempts
+        attempt = 0
+        waited = 0.0
+        while True:
+            error = started = None
+            retryable = True
+            try:
+                self._check_circuit(endpoint, metrics)
+                try:
+                    time.sleep(endpoint.rate.reserve())
+                    started = time.monotonic()
+                    return func(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    retryable = self._record(endpoint, started, error, metrics)
+            except Exception as e:
+                delay = self._backoff(endpoint, e, attempt, attempts, waited, metrics) if retryable else None
+                if delay is None:
+                    metrics.inc('fetch_errors', source=endpoint.name)
+                    raise
+                if not isinstance(e, CircuitOpenError):
+                    attempt += 1
+                waited += delay
+                time.sleep(delay)
+
+    def get(self, url, endpoint=None, attempts=None, metrics=None, **kwargs):
+        """GET 请求，返回状态码正常的 Response"""
+        return self.call(endpoint or self._endpoint_name(url), self._send, url, kwargs, attempts=attempts, metrics=metrics)
+
+    async def call_async(self, endpoint, func, *args, attempts=None, metrics=None, **kwargs):
+        """call 的协程版本：等待在事件循环中进行，func 在线程池中执行"""
+        endpoint = self.endpoint(endpoint)
+        metrics = metrics or self.metrics
+        attempts = attempts or self.max_attempts
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        waited = 0.0
+        while True:
+            error = started = None
+            retryable = True
+            try:
+                self._check_circuit(endpoint, metrics)
+                try:
+                    await asyncio.sleep(endpoint.rate.reserve())
+                    started = time.monotonic()
+                    return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    retryable = self._record(endpoint, started, error, metrics)
+            except Exception as e:
+                delay = self._backoff(endpoint, e, attempt, attempts, waited, metrics) if retryable else None
+                if delay is None:
+                    metrics.inc('fetch_errors', source=endpoint.name)
+                    raise
+                if not isinstance(e, CircuitOpenError):
+                    attempt += 1
+                waited += delay
+                await asyncio.sleep(delay)
+
+    async def get_async(self, url, endpoint=None, attempts=None, metrics=None, **kwargs):
+        """get 的协程版本"""
+        return await self.call_async(
+            endpoint or self._endpoint_name(url), self._send, url, kwargs, attempts=attempts, metrics=metrics
+        )
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def shared_client():
+    """进程内共享的客户端，FundAnalyzer 和 MarketMonitor 默认都使用它，限速与熔断状态在各处一致"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
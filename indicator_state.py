@@ -0,0 +1,142 @@
+import json
+import os
+import logging
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from cache_store import KeyedCache
+
+logger = logging.getLogger(__name__)
+
+# EWM(adjust=False) 的平滑系数，与 pandas ewm(span=N) 一致
+ALPHA12 = 2 / (12 + 1)
+ALPHA26 = 2 / (26 + 1)
+ALPHA9 = 2 / (9 + 1)
+BB_WINDOW = 20
+RSI_WINDOW = 14
+MA_WINDOW = 50
+
+
+class IndicatorState:
+    """
+    单个基金的增量技术指标状态。
+
+    保存 EWM12/EWM26/MACD 信号线的累计值，以及布林带(20)、MA50 所需的最近净值、
+    RSI(14) 所需的最近涨跌幅环形缓冲区。每新增一个净值点只做常数次运算，
+    无需重新计算整段历史。
+    """
+    __slots__ = ('last_date', 'last_nav', 'count', 'ema12', 'ema26', 'signal', 'navs', 'gains', 'losses')
+
+    def __init__(self, last_date=None, last_nav=None, count=0, ema12=None, ema26=None, signal=None,
+                 navs=(), gains=(), losses=()):
+        self.last_date = pd.Timestamp(last_date) if last_date is not None else None
+        self.last_nav = last_nav
+        self.count = count
+        self.ema12 = ema12
+        self.ema26 = ema26
+        self.signal = signal
+        self.navs = deque(navs, maxlen=MA_WINDOW)
+        self.gains = deque(gains, maxlen=RSI_WINDOW)
+        self.losses = deque(losses, maxlen=RSI_WINDOW)
+
+    def update(self, date, nav):
+        """追加一个净值点"""
+        nav = float(nav)
+        if self.count == 0:
+            self.ema12 = self.ema26 = nav
+            self.signal = 0.0
+            gain = loss = 0.0
+        else:
+            self.ema12 = (1 - ALPHA12) * self.ema12 + ALPHA12 * nav
+            self.ema26 = (1 - ALPHA26) * self.ema26 + ALPHA26 * nav
+            self.signal = (1 - ALPHA9) * self.signal + ALPHA9 * (self.ema12 - self.ema26)
+            delta = nav - self.last_nav
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+        self.navs.append(nav)
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.last_date = pd.Timestamp(date)
+        self.last_nav = nav
+        self.count += 1
+
+    def latest(self):
+        """返回当前最新一行的指标原始值 (净值, RSI, 净值/MA50, MACD差值, 布林上轨, 布林下轨)"""
+        navs = np.fromiter(self.navs, dtype=float)
+        recent = navs[-BB_WINDOW:]
+        bb_mid = recent.mean()
+        bb_std = recent.std(ddof=1) if len(recent) > 1 else np.nan
+
+        avg_gain = sum(self.gains) / len(self.gains)
+        avg_loss = sum(self.losses) / len(self.losses)
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss)) if avg_loss != 0 else np.nan
+
+        ma50 = navs.mean()
+        ma_ratio = self.last_nav / ma50 if ma50 != 0 else np.nan
+        macd_diff = (self.ema12 - self.ema26) - self.signal
+        return self.last_nav, rsi, ma_ratio, macd_diff, bb_mid + bb_std * 2, bb_mid - bb_std * 2
+
+    def to_dict(self):
+        return {
+            'last_date': self.last_date.strftime('%Y-%m-%d'),
+            'last_nav': self.last_nav,
+            'count': self.count,
+            'ema12': self.ema12,
+            'ema26': self.ema26,
+            'signal': self.signal,
+            'navs': list(self.navs),
+            'gains': list(self.gains),
+            'losses': list(self.losses),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+# 指标状态在 SQLite 键值库中每个基金一条记录
+STATE_NAMESPACE = 'indicator'
+
+
+def _import_legacy(store, legacy_json):
+    """把旧版整体写入的 indicator_state.json（{fund_code: 状态}）一次性导入 SQLite"""
+    with open(legacy_json, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    store.set_many(STATE_NAMESPACE, data)
+    logger.info("已从 %s 导入 %d 个基金的指标状态", legacy_json, len(data))
+
+
+def load_states(path, legacy_json=None):
+    """读取持久化的指标状态，返回 {fund_code: IndicatorState}，读取失败时返回空字典
+
+    首次使用 SQLite 存储且存在旧的 JSON 状态文件时先导入。
+    """
+    is_new = not os.path.exists(path)
+    try:
+        store = KeyedCache(path)
+        try:
+            if is_new and legacy_json and os.path.exists(legacy_json):
+                _import_legacy(store, legacy_json)
+            data = store.items(STATE_NAMESPACE)
+        finally:
+            store.close()
+        return {fund_code: IndicatorState.from_dict(state) for fund_code, state in data.items()}
+    except Exception as e:
+        logger.warning("读取指标状态 %s 失败，将全部重新计算: %s", path, e)
+        return {}
+
+
+def save_states(path, states, fund_codes):
+    """只写入 fund_codes 中各基金的指标状态（同一事务），states 中已没有状态的基金删除其记录"""
+    fund_codes = list(fund_codes)
+    store = KeyedCache(path)
+    try:
+        store.set_many(STATE_NAMESPACE, {
+            fund_code: states[fund_code].to_dict() for fund_code in fund_codes if fund_code in states
+        })
+        removed = [fund_code for fund_code in fund_codes if fund_code not in states]
+        if removed:
+            store.delete_many(STATE_NAMESPACE, removed)
+    finally:
+        store.close()
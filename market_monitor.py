@@ -3,13 +3,21 @@ import numpy as np
 import re
 import os
 import logging
+import asyncio
+import functools
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, time
-import random
-from io import StringIO
 import requests
-import tenacity
-import concurrent.futures
-import time as time_module
+from async_fetcher import AsyncNavFetcher, LSJZ_URL
+from http_client import shared_client
+from nav_store import NavStore, FrameCache
+from compact_navs import CompactNavs, IndicatorResults
+from metrics import Metrics
+from recommendations import RECOMMENDATION_MANIFEST, read_manifest
+from report_writer import ReportTable, write_report
+from run_results import RunResults
+from indicator_state import IndicatorState, load_states, save_states, MA_WINDOW, RSI_WINDOW
 
 # 配置日志
 logging.basicConfig(
@@ -26,13 +34,268 @@ logger = logging.getLogger(__name__)
 DATA_DIR = 'fund_data'
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
+# 净值历史的列式存储目录，DATA_DIR 下旧的 {code}.csv 文件会在首次读取时导入
+STORE_DIR = os.path.join(DATA_DIR, 'store')
+# 本地历史少于该行数（回测所需的最少行数）时抓取完整历史
+BOOTSTRAP_MIN_ROWS = 100
+# 各基金技术指标的增量计算状态
+INDICATOR_STATE_FILE = os.path.join(DATA_DIR, 'indicator_state.sqlite')
+# 旧版整体写入的 JSON 状态文件，首次使用 SQLite 存储时导入
+LEGACY_INDICATOR_STATE_FILE = os.path.join(DATA_DIR, 'indicator_state.json')
+# 上次运行各基金的指标和回测结果，增量运行时净值历史未变的基金直接沿用
+RUN_RESULTS_FILE = os.path.join(DATA_DIR, 'run_results.json')
+BACKTEST_RESULTS_FILE = 'backtest_results.csv'
+
+# 行动信号阈值，回测与最新信号共用；param_sweep.py 会在此基础上替换取值做参数扫描
+DEFAULT_THRESHOLDS = {
+    'rsi_strong_buy': 35, 'ma_strong_buy': 0.9, 'macd_buy': 0.0,
+    'rsi_weak_buy': 45, 'ma_weak_buy': 1.0,
+    'ma_avoid': 0.95,
+    'rsi_strong_sell': 70, 'ma_strong_sell': 1.2, 'macd_sell': 0.0,
+    'rsi_weak_sell': 65, 'ma_weak_sell': 1.2,
+}
+
+def _backtest_indicator_series(net_value):
+    """在整段净值序列上一次性计算回测所需的 RSI、净值/MA50 与 MACD 差值
+
+    EWM(adjust=False) 与 rolling 均为因果计算，第 i 行的结果与只用前 i+1 行计算的结果一致。
+    """
+    exp12 = net_value.ewm(span=12, adjust=False).mean()
+    exp26 = net_value.ewm(span=26, adjust=False).mean()
+    macd = exp12 - exp26
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    delta = net_value.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=14, min_periods=1).mean()
+    avg_loss = loss.rolling(window=14, min_periods=1).mean()
+    rs = avg_gain / avg_loss.replace(0, np.nan)
+    rsi = 100 - (100 / (1 + rs))
+
+    ma50 = net_value.rolling(window=50, min_periods=1).mean()
+
+    return pd.DataFrame({'rsi': rsi, 'ma_ratio': net_value / ma50, 'macd_diff': macd - signal})
+
+
+def _backtest_signal_conditions(rsi, ma_ratio, macd_diff, valid, thresholds=None):
+    """回测行动信号的判断条件，顺序与原逐行 if/elif 链保持一致，依次对应 BACKTEST_CHOICES"""
+    t = thresholds or DEFAULT_THRESHOLDS
+    return [
+        valid & (rsi < t['rsi_strong_buy']) & (ma_ratio < t['ma_strong_buy']) & (macd_diff > t['macd_buy']),
+        valid & ((rsi < t['rsi_weak_buy']) | (ma_ratio < t['ma_weak_buy'])),
+        valid & (ma_ratio < t['ma_avoid']),
+        valid & (rsi > t['rsi_strong_sell']) & (ma_ratio > t['ma_strong_sell']) & (macd_diff < t['macd_sell']),
+        valid & ((rsi > t['rsi_weak_sell']) | (ma_ratio > t['ma_weak_sell'])),
+    ]
+
+
+BACKTEST_CHOICES = ["强买入", "弱买入", "强卖出/规避", "强卖出/规避", "弱卖出/规避"]
+
+
+def _backtest_signal_series(net_value, thresholds=None):
+    """根据指标序列生成每日行动信号（前26行及指标缺失的行保持 持有/观察）"""
+    ind = _backtest_indicator_series(net_value)
+    rsi = ind['rsi'].to_numpy()
+    ma_ratio = ind['ma_ratio'].to_numpy()
+    macd_diff = ind['macd_diff'].to_numpy()
+
+    valid = ~(np.isnan(rsi) | np.isnan(ma_ratio) | np.isnan(macd_diff))
+    valid[:26] = False
+
+    conditions = _backtest_signal_conditions(rsi, ma_ratio, macd_diff, valid, thresholds)
+    return pd.Series(np.select(conditions, BACKTEST_CHOICES, default="持有/观察"), index=net_value.index)
+
+
+def _simulate_trades(net_value, action_signal):
+    """无逐行循环的持仓状态机，返回 (买入行号, 卖出行号, 已平仓交易收益率)
+
+    空仓遇买入信号则买入，持仓遇卖出信号则卖出，因此每一行之后的持仓状态
+    只取决于此前最近一次出现的买入/卖出信号。
+    """
+    is_buy = np.isin(action_signal, ["强买入", "弱买入"])
+    is_sell = np.isin(action_signal, ["强卖出/规避", "弱卖出/规避"])
+    last_event = pd.Series(np.select([is_buy, is_sell], [1.0, -1.0], default=np.nan))
+    # 原状态机从第1行开始处理
+    last_event.iloc[:1] = np.nan
+    holding = last_event.ffill().fillna(-1).to_numpy() == 1
+
+    prev_holding = np.concatenate(([False], holding[:-1]))
+    entries = np.flatnonzero(holding & ~prev_holding)
+    exits = np.flatnonzero(~holding & prev_holding)
+
+    buy_prices = net_value[entries[:len(exits)]]
+    returns = (net_value[exits] - buy_prices) / buy_prices
+    return entries, exits, returns
+
+
+def _backtest_metrics(net_value, thresholds=None):
+    """对按日期升序排列的净值序列 (pd.Series) 回测，返回累计回报、最大回撤、夏普比率和胜率"""
+    # 一次性计算整段指标序列和信号，替代逐行截取前缀重算（O(n²) -> O(n)）
+    signals = _backtest_signal_series(net_value, thresholds)
+    entries, exits, returns = _simulate_trades(net_value.to_numpy(), signals.to_numpy())
+
+    if len(entries):
+        cum_return = np.prod(1 + returns) - 1 if len(returns) else 0
+        win_rate = np.count_nonzero(returns > 0) / len(returns) if len(returns) else 0
+        equity = np.cumprod(1 + net_value.pct_change().fillna(0).to_numpy())
+        drawdown = equity / np.maximum.accumulate(equity) - 1
+        max_drawdown = drawdown.min()
+        sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if len(returns) and np.std(returns) != 0 else np.nan
+    else:
+        cum_return = max_drawdown = sharpe_ratio = win_rate = np.nan
+
+    return {
+        "cum_return": cum_return,
+        "max_drawdown": max_drawdown,
+        "sharpe_ratio": sharpe_ratio,
+        "win_rate": win_rate
+    }
+
+
+def _backtest_chunk(store_root, thresholds, fund_codes):
+    """回测子进程的任务：直接从本地存储按内存映射读取净值，返回 [(fund_code, 指标字典或 None)]
+
+    只有基金代码和结果在进程间传递，净值数据由各进程共享操作系统的页缓存。
+    每个内存映射（及其文件描述符）只在回测该基金期间持有，处理完立即释放。
+    数据不足 100 行的基金返回 None。
+    """
+    store = NavStore(store_root)
+    results = []
+    for fund_code in fund_codes:
+        net_value = store.net_values(fund_code)
+        if len(net_value) < 100:
+            results.append((fund_code, None))
+        else:
+            # copy=False：序列直接引用内存映射，各子进程不再各自复制一份净值历史
+            results.append((fund_code, _backtest_metrics(pd.Series(net_value, copy=False), thresholds)))
+        del net_value
+    return results
+
+
+def _classify_indicators(latest_net_value, rsi, ma_ratio, macd_diff, bb_upper, bb_lower, thresholds=None):
+    """根据最新指标值生成 (操作建议, 行动信号) 数组，参数均为按基金排列的数组"""
+    t = thresholds or DEFAULT_THRESHOLDS
+    # NaN 参与比较恒为 False，与逐个判断 not np.isnan(...) 的写法等价
+    above_upper = latest_net_value > bb_upper
+    below_lower = latest_net_value < bb_lower
+    advice = np.select(
+        [
+            (rsi > 70) | above_upper | (ma_ratio > 1.2),
+            (rsi < 30) | below_lower | (ma_ratio < 0.8),
+            (ma_ratio > 1) & (macd_diff > 0),
+            (ma_ratio < 1) & (macd_diff < 0),
+        ],
+        ["等待回调", "可分批买入", "可分批买入", "等待回调"],
+        default="观察",
+    )
+    action_signal = np.select(
+        [
+            ma_ratio < t['ma_avoid'],
+            (rsi > t['rsi_strong_sell']) & (ma_ratio > t['ma_strong_sell']) & (macd_diff < t['macd_sell']),
+            (rsi > t['rsi_weak_sell']) | above_upper | (ma_ratio > t['ma_weak_sell']),
+            (rsi < t['rsi_strong_buy']) & (ma_ratio < t['ma_strong_buy']) & (macd_diff > t['macd_buy']),
+            (rsi < t['rsi_weak_buy']) | below_lower | (ma_ratio < t['ma_weak_buy']),
+        ],
+        ["强卖出/规避", "强卖出/规避", "弱卖出/规避", "强买入", "弱买入"],
+        default="持有/观察",
+    )
+    return advice, action_signal
+
+
+def _indicator_result(fund_code, latest_net_value, rsi, ma_ratio, macd_diff, bb_upper, bb_lower, advice, action_signal):
+    return {
+        'fund_code': fund_code,
+        'latest_net_value': latest_net_value,
+        'rsi': rsi,
+        'ma_ratio': ma_ratio,
+        'macd_diff': macd_diff,
+        'bb_upper': bb_upper,
+        'bb_lower': bb_lower,
+        'advice': str(advice),
+        'action_signal': str(action_signal)
+    }
+
+
+# analysis_report.md 中的基金代码：汇总表的行首或详细段落的标题
+REPORT_CODE_PATTERN = re.compile(r'^(?:\| +(\d{6})|### 基金 (\d{6}))')
+REPORT_COLUMNS = ["基金代码", "最新净值", "RSI", "净值/MA50", "MACD信号", "布林带位置", "投资建议", "行动信号"]
+# 报告排序：行动信号优先级 -> 投资建议优先级 -> RSI 升序
+REPORT_ACTION_ORDER = {"强买入": 1, "弱买入": 2, "持有/观察": 3, "弱卖出/规避": 4, "强卖出/规避": 5, "N/A": 6}
+REPORT_ADVICE_ORDER = {"可分批买入": 1, "观察": 2, "等待回调": 3, "N/A": 4}
+
+
+def _is_number(value):
+    return isinstance(value, (float, int)) and not np.isnan(value)
+
+
+def _report_row(fund_code, data):
+    """监控报告中单个基金的一行（数值列保留原始值，由报告写出器格式化）"""
+    if data is None:
+        return [fund_code, np.nan, np.nan, np.nan, "N/A", "N/A", "观察", "N/A"]
+    latest_net_value = data['latest_net_value'] if isinstance(data['latest_net_value'], (float, int)) else np.nan
+
+    macd_signal = "N/A"
+    if _is_number(data['macd_diff']):
+        macd_signal = "金叉" if data['macd_diff'] > 0 else "死叉"
+
+    bollinger_pos = "中轨"
+    if isinstance(data['latest_net_value'], (float, int)):
+        if _is_number(data['bb_upper']) and data['latest_net_value'] > data['bb_upper']:
+            bollinger_pos = "上轨上方"
+        elif _is_number(data['bb_lower']) and data['latest_net_value'] < data['bb_lower']:
+            bollinger_pos = "下轨下方"
+    else:
+        bollinger_pos = "N/A"
+
+    rsi = data['rsi'] if _is_number(data['rsi']) else np.nan
+    ma_ratio = data['ma_ratio'] if _is_number(data['ma_ratio']) else np.nan
+    return [fund_code, latest_net_value, rsi, ma_ratio, macd_signal, bollinger_pos, data['advice'], data['action_signal']]
+
+
+def _report_sort_key(row):
+    """RSI 按报告中显示的两位小数比较，缺失的排在同组最后"""
+    rsi = row[2]
+    rsi_missing = not _is_number(rsi)
+    return (
+        REPORT_ACTION_ORDER.get(row[7], len(REPORT_ACTION_ORDER) + 1),
+        REPORT_ADVICE_ORDER.get(row[6], len(REPORT_ADVICE_ORDER) + 1),
+        rsi_missing,
+        0.0 if rsi_missing else float(f"{rsi:.2f}"),
+    )
+
 
 class MarketMonitor:
-    def __init__(self, report_file='analysis_report.md', output_file='market_monitor_report.md'):
+    def __init__(self, report_file='analysis_report.md', output_file='market_monitor_report.md', thresholds=None,
+                 metrics=None, frame_cache_mb=256, bootstrap_min_rows=BOOTSTRAP_MIN_ROWS,
+                 manifest_file=RECOMMENDATION_MANIFEST, decisions=None, delta=None, http_client=None):
         self.report_file = report_file
+        # FundAnalyzer 写出的推荐清单；decisions 可限定只监控某些决策（如 ['推荐']）的基金，缺省为全部
+        self.manifest_file = manifest_file
+        self.decisions = set(decisions) if decisions else None
         self.output_file = output_file
+        # 可传入参数扫描得到的阈值，缺省项沿用 DEFAULT_THRESHOLDS
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        # 运行指标，设置 FUND_METRICS_DIR 环境变量时启用
+        self.metrics = metrics or Metrics.from_env('market_monitor')
         self.fund_codes = []
-        self.fund_data = {}
+        # 各基金的指标结果保存在结构化数组中，按基金代码读写时与结果字典相互转换
+        self.fund_data = IndicatorResults()
+        self.store = NavStore(STORE_DIR)
+        # 本次运行内各阶段共享的净值 DataFrame 缓存，避免同一基金被重复读取
+        self.frame_cache = FrameCache(frame_cache_mb * 2 ** 20)
+        self.bootstrap_min_rows = bootstrap_min_rows
+        self.indicator_state_file = INDICATOR_STATE_FILE
+        self.indicator_states = load_states(self.indicator_state_file, legacy_json=LEGACY_INDICATOR_STATE_FILE)
+        # 增量运行：只重新计算净值历史有变化的基金，delta=False 时全部重新计算；
+        # 缺省时由环境变量决定，设置 MONITOR_FULL_RUN=1 时忽略上次运行结果
+        self.delta = os.getenv('MONITOR_FULL_RUN') != '1' if delta is None else delta
+        self.run_results_file = RUN_RESULTS_FILE
+        self.run_results = RunResults.load(self.run_results_file, self.thresholds) if self.delta else \
+            RunResults(self.run_results_file, self.thresholds)
+        self.api_url = LSJZ_URL
+        # 与本进程其他请求共用的客户端（自适应限速、熔断、重试）
+        self.http = http_client or shared_client()
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36'
         }
@@ -49,142 +312,145 @@ class MarketMonitor:
         return expected_date
 
     def _parse_report(self):
-        """从 analysis_report.md 提取推荐基金代码"""
-        logger.info("正在解析 %s 获取推荐基金代码...", self.report_file)
-        if not os.path.exists(self.report_file):
-            logger.error("报告文件 %s 不存在", self.report_file)
-            raise FileNotFoundError(f"{self.report_file} 不存在")
-        
+        """读取推荐基金代码：优先使用 FundAnalyzer 写出的推荐清单，没有清单时逐行扫描 analysis_report.md"""
         try:
-            with open(self.report_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            pattern = re.compile(r'(?:^\| +(\d{6})|### 基金 (\d{6}))', re.M)
-            matches = pattern.findall(content)
-
-            extracted_codes = set()
-            for match in matches:
-                code = match[0] if match[0] else match[1]
-                extracted_codes.add(code)
-            
-            sorted_codes = sorted(list(extracted_codes))
-            self.fund_codes = sorted_codes[:1000]
-            
-            if not self.fund_codes:
-                logger.warning("未提取到任何有效基金代码，请检查 analysis_report.md")
+            if os.path.exists(self.manifest_file):
+                logger.info("正在读取推荐清单 %s 获取基金代码...", self.manifest_file)
+                codes = {code for code, _, _ in read_manifest(self.manifest_file, self.decisions)}
             else:
-                logger.info("提取到 %d 个基金（测试限制前1000个）: %s", len(self.fund_codes), self.fund_codes)
-            
+                codes = set(self._scan_report_codes())
+        except FileNotFoundError:
+            raise
         except Exception as e:
             logger.error("解析报告文件失败: %s", e)
             raise
 
+        self.fund_codes = sorted(codes)
+        if not self.fund_codes:
+            logger.warning("未提取到任何有效基金代码，请检查 %s 或 %s", self.manifest_file, self.report_file)
+        else:
+            logger.info("提取到 %d 个基金，前几个为: %s", len(self.fund_codes), self.fund_codes[:10])
+
+    def _scan_report_codes(self):
+        """旧版本的方式：逐行匹配 analysis_report.md 中表格行和详细段落标题里的基金代码"""
+        logger.info("推荐清单 %s 不存在，正在解析 %s 获取推荐基金代码...", self.manifest_file, self.report_file)
+        if not os.path.exists(self.report_file):
+            logger.error("报告文件 %s 不存在", self.report_file)
+            raise FileNotFoundError(f"{self.report_file} 不存在")
+        with open(self.report_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = REPORT_CODE_PATTERN.match(line)
+                if match:
+                    yield match.group(1) or match.group(2)
+
+    def _ensure_in_store(self, fund_code):
+        """确认基金已在本地存储中，必要时一次性导入旧的 CSV 文件，返回是否有数据"""
+        if self.store.exists(fund_code):
+            return True
+        csv_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
+        if not os.path.exists(csv_path):
+            return False
+        try:
+            self.store.import_csv(csv_path, fund_code)
+        except Exception as e:
+            logger.warning("导入基金 %s 的旧 CSV 数据失败: %s", fund_code, e)
+            return False
+        logger.info("基金 %s 的旧 CSV 数据已导入本地存储", fund_code)
+        return self.store.exists(fund_code)
+
     def _read_local_data(self, fund_code):
-        """读取本地文件，如果存在则返回DataFrame"""
-        file_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_csv(file_path, parse_dates=['date'])
-                if not df.empty and 'date' in df.columns and 'net_value' in df.columns:
-                    logger.info("本地已存在基金 %s 数据，共 %d 行，最新日期为: %s", fund_code, len(df), df['date'].max().date())
-                    return df
-            except Exception as e:
-                logger.warning("读取本地文件 %s 失败: %s", file_path, e)
+        """从本地存储读取基金净值，如果存在则返回DataFrame（优先使用本次运行的内存缓存）
+
+        读出的是数据副本：帧缓存在整个运行期间持有这些 DataFrame，若引用内存映射，
+        每个基金都会占用一个打开的文件描述符，基金数多时会超出进程的文件数上限。
+        """
+        df = self.frame_cache.get(fund_code)
+        if df is not None:
+            self.metrics.inc('cache_lookups', source='frame_cache', result='hit')
+            return df
+        self.metrics.inc('cache_lookups', source='frame_cache', result='miss')
+        try:
+            with self.metrics.timer('cache_lookup', source='nav_store'):
+                if not self._ensure_in_store(fund_code):
+                    self.metrics.inc('cache_lookups', source='nav_store', result='miss')
+                    return pd.DataFrame()
+                df = self.store.read(fund_code)
+            self.metrics.inc('cache_lookups', source='nav_store', result='hit')
+            self.metrics.inc('rows_read', len(df), source='nav_store')
+            if not df.empty:
+                logger.info("本地已存在基金 %s 数据，共 %d 行，最新日期为: %s", fund_code, len(df), df['date'].max().date())
+                self.frame_cache.put(fund_code, df)
+                return df
+        except Exception as e:
+            logger.warning("读取基金 %s 本地数据失败: %s", fund_code, e)
         return pd.DataFrame()
 
     def _save_to_local_file(self, fund_code, df):
-        """将DataFrame保存到本地文件，覆盖旧文件"""
-        file_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        df.to_csv(file_path, index=False)
-        logger.info("基金 %s 数据已成功保存到本地文件: %s", fund_code, file_path)
-
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(5),
-        wait=tenacity.wait_fixed(10),
-        retry=tenacity.retry_if_exception_type((requests.exceptions.RequestException, ValueError)),
-        before_sleep=lambda retry_state: logger.info(f"重试基金 {retry_state.args[0]}，第 {retry_state.attempt_number} 次")
-    )
+        """将新数据追加到本地存储，只写入晚于已存储最新日期的行，不重写历史"""
+        appended = self.store.append(fund_code, df)
+        self.frame_cache.invalidate(fund_code)
+        self.metrics.inc('rows_appended', appended, source='nav_store')
+        logger.info("基金 %s 数据已追加 %d 行到本地存储: %s", fund_code, appended, self.store.root)
+
     def _fetch_fund_data(self, fund_code):
         """从网络获取基金数据，仅下载缺失的日期数据并追加到本地"""
+        result = asyncio.run(self._fetch_funds_async([fund_code]))[fund_code]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _fetch_funds_async(self, fund_codes, bootstrap_codes=None):
+        """通过共享客户端（连接池、自适应限速与熔断）并发抓取多个基金，返回 {fund_code: DataFrame 或异常}
+
+        bootstrap_codes 为需要抓取完整历史的基金（由调用方按覆盖范围清单判断）；缺省时逐个基金按清单判断。
+        """
+        if bootstrap_codes is None:
+            coverage = self.store.coverage(fund_codes)
+            bootstrap_codes = {fund_code for fund_code in fund_codes
+                               if fund_code not in coverage or self._needs_bootstrap(coverage[fund_code])}
+        with AsyncNavFetcher(headers=self.headers, base_url=self.api_url, client=self.http, metrics=self.metrics) as fetcher:
+            results = await asyncio.gather(
+                *(self._fetch_one_async(fetcher, fund_code, fund_code in bootstrap_codes) for fund_code in fund_codes),
+                return_exceptions=True
+            )
+        return dict(zip(fund_codes, results))
+
+    async def _record_fetch(self, fund_code, fetch):
+        """等待抓取协程完成，并在覆盖范围清单中记录本次抓取是否成功"""
+        try:
+            result = await fetch
+        except requests.exceptions.RequestException as e:
+            logger.error("基金 %s API请求失败: %s", fund_code, str(e))
+            self.store.record_fetch(fund_code, ok=False)
+            raise
+        except Exception as e:
+            logger.error("基金 %s API数据解析失败: %s", fund_code, str(e))
+            self.store.record_fetch(fund_code, ok=False)
+            raise
+        self.store.record_fetch(fund_code, ok=True)
+        return result
+
+    async def _fetch_one_async(self, fetcher, fund_code, bootstrap):
+        """抓取单个基金缺失的日期数据，与本地历史合并后返回最近100行
+
+        bootstrap 为真或本地无数据时抓取完整历史；历史过短但今天已成功抓取过的基金只抓新增的日期。
+        """
         local_df = self._read_local_data(fund_code)
+        if bootstrap or local_df.empty:
+            return await self._bootstrap_one_async(fetcher, fund_code, local_df)
+
         latest_local_date = local_df['date'].max().date() if not local_df.empty else None
-        expected_latest_date = self._get_expected_latest_date()
-        
-        all_new_data = []
-        page_index = 1
         max_pages_to_check = 5  # 限制检查页面数，通常最新数据在第1-2页
-        
-        while page_index <= max_pages_to_check:
-            url = f"http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={fund_code}&page={page_index}&per=20"
-            logger.info("访问URL: %s", url)
-            
-            try:
-                response = requests.get(url, headers=self.headers, timeout=30)
-                response.raise_for_status()
-                
-                content_match = re.search(r'content:"(.*?)"', response.text, re.S)
-                pages_match = re.search(r'pages:(\d+)', response.text)
-                
-                if not content_match or not pages_match:
-                    logger.error("基金 %s API返回内容格式不正确，可能已无数据或接口变更", fund_code)
-                    break
-
-                raw_content_html = content_match.group(1).replace('\\"', '"')
-                total_pages = int(pages_match.group(1))
-                
-                tables = pd.read_html(StringIO(raw_content_html))
-                
-                if not tables:
-                    logger.warning("基金 %s 在第 %d 页未找到数据表格，爬取结束", fund_code, page_index)
-                    break
-                
-                df = tables[0]
-                df.columns = ['date', 'net_value', 'cumulative_net_value', 'daily_growth_rate', 'purchase_status', 'redemption_status', 'dividend']
-                df = df[['date', 'net_value']].copy()
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                df['net_value'] = pd.to_numeric(df['net_value'], errors='coerce')
-                df = df.dropna(subset=['date', 'net_value'])
-                
-                if latest_local_date:
-                    # 只保留比本地最新日期更新的数据
-                    new_df = df[df['date'].dt.date > latest_local_date]
-                    if not new_df.empty:
-                        all_new_data.append(new_df)
-                        logger.info("第 %d 页: 发现 %d 行新数据，最新日期为 %s", page_index, len(new_df), new_df['date'].max().date())
-                    else:
-                        logger.info("基金 %s 第 %d 页无新数据，爬取结束", fund_code, page_index)
-                        break
-                else:
-                    # 如果本地没有数据，获取所有数据
-                    all_new_data.append(df)
-                    logger.info("基金 %s 第 %d 页: 获取 %d 行数据", fund_code, page_index, len(df))
-                
-                # 如果当前页面数据量少于20条，说明已到最后，停止爬取
-                if len(df) < 20:
-                    logger.info("基金 %s 第 %d 页数据不足20条，爬取结束", fund_code, page_index)
-                    break
-                
-                # 检查是否已获取到期望的最新日期
-                if not new_df.empty and new_df['date'].max().date() >= expected_latest_date:
-                    logger.info("基金 %s 已获取到期望最新日期 %s，爬取结束", fund_code, expected_latest_date)
-                    break
-                
-                page_index += 1
-                time_module.sleep(random.uniform(1, 2))  # 随机延迟1-2秒，降低限流风险
-                
-            except requests.exceptions.RequestException as e:
-                logger.error("基金 %s API请求失败: %s", fund_code, str(e))
-                raise
-            except Exception as e:
-                logger.error("基金 %s API数据解析失败: %s", fund_code, str(e))
-                raise
+
+        all_new_data = await self._record_fetch(
+            fund_code, fetcher.fetch_new_rows(fund_code, latest_local_date, max_pages=max_pages_to_check)
+        )
 
         # 合并新数据和旧数据
         if all_new_data:
             new_combined_df = pd.concat(all_new_data, ignore_index=True)
             df_final = pd.concat([local_df, new_combined_df]).drop_duplicates(subset=['date'], keep='last').sort_values(by='date', ascending=True)
-            self._save_to_local_file(fund_code, df_final)
+            self._save_to_local_file(fund_code, new_combined_df)
             df_final = df_final.tail(100)
             logger.info("成功合并并保存基金 %s 的数据，总行数: %d, 最新日期: %s, 最新净值: %.4f", 
                         fund_code, len(df_final), df_final['date'].iloc[-1].strftime('%Y-%m-%d'), df_final['net_value'].iloc[-1])
@@ -196,199 +462,214 @@ class MarketMonitor:
             else:
                 raise ValueError("未获取到任何有效数据，且本地无缓存")
 
+    async def _bootstrap_one_async(self, fetcher, fund_code, local_df):
+        """本地无数据或历史过短时抓取完整历史，与本地数据合并后整体写入存储（一次原子替换）"""
+        logger.info("基金 %s 本地仅有 %d 行数据，抓取完整历史...", fund_code, len(local_df))
+        pages = await self._record_fetch(fund_code, fetcher.fetch_all_rows(fund_code))
+        if not pages:
+            if not local_df.empty:
+                logger.info("基金 %s 未获取到历史数据，使用本地历史数据", fund_code)
+                return local_df.tail(100)[['date', 'net_value']]
+            raise ValueError("未获取到任何有效数据，且本地无缓存")
+
+        df_final = pd.concat([local_df, *pages]).drop_duplicates(subset=['date'], keep='last').sort_values(by='date', ascending=True)
+        rows = self.store.write(fund_code, df_final)
+        self.frame_cache.invalidate(fund_code)
+        self.metrics.inc('rows_bootstrapped', rows, source='nav_store')
+        logger.info("基金 %s 完整历史已写入本地存储，共 %d 行，最早日期: %s，最新日期: %s",
+                    fund_code, rows, df_final['date'].iloc[0].strftime('%Y-%m-%d'), df_final['date'].iloc[-1].strftime('%Y-%m-%d'))
+        return df_final.tail(100)[['date', 'net_value']]
+
+    @staticmethod
+    def _failed_indicator_result(fund_code):
+        """数据获取失败或计算异常时的占位结果"""
+        return {
+            'fund_code': fund_code, 'latest_net_value': "数据获取失败", 'rsi': np.nan, 'ma_ratio': np.nan,
+            'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
+        }
+
     def _calculate_indicators(self, fund_code, df):
         """计算技术指标并生成结果字典"""
-        try:
+        return self._calculate_indicators_batch({fund_code: df})[fund_code]
+
+    def _indicator_matrix(self, frames, codes=None):
+        """
+        把输入整理成尾部对齐的 行 × 基金 净值矩阵，返回 (codes, matrix, 各基金行数, 各基金最新日期, 失败结果)。
+        frames 可以是 {fund_code: DataFrame}，也可以是 CompactNavs（codes 指定只计算其中部分基金）。
+        """
+        failed = {}
+        usable = []
+        if isinstance(frames, CompactNavs):
+            for fund_code in (frames.codes if codes is None else codes):
+                if frames.rows(fund_code) < 26:
+                    logger.warning("基金 %s 数据获取失败或数据不足，跳过计算 (数据行数: %s)", fund_code, frames.rows(fund_code))
+                    failed[fund_code] = self._failed_indicator_result(fund_code)
+                else:
+                    usable.append(fund_code)
+            if not usable:
+                return usable, None, None, {}, failed
+            matrix, lengths = frames.bottom_aligned(usable)
+            last_dates = {fund_code: pd.Timestamp(frames.fund_dates(fund_code)[-1]) for fund_code in usable}
+            return usable, matrix, lengths, last_dates, failed
+
+        series = {}
+        last_dates = {}
+        for fund_code, df in frames.items():
             if df is None or df.empty or len(df) < 26:
                 logger.warning("基金 %s 数据获取失败或数据不足，跳过计算 (数据行数: %s)", fund_code, len(df) if df is not None else 0)
-                return {
-                    'fund_code': fund_code, 'latest_net_value': "数据获取失败", 'rsi': np.nan, 'ma_ratio': np.nan,
-                    'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
-                }
-
+                failed[fund_code] = self._failed_indicator_result(fund_code)
+                continue
             df = df.sort_values(by='date', ascending=True)
-            
-            exp12 = df['net_value'].ewm(span=12, adjust=False).mean()
-            exp26 = df['net_value'].ewm(span=26, adjust=False).mean()
-            df['macd'] = exp12 - exp26
-            df['signal'] = df['macd'].ewm(span=9, adjust=False).mean()
+            series[fund_code] = df['net_value'].to_numpy(dtype=float)
+            last_dates[fund_code] = df['date'].iloc[-1]
+        if not series:
+            return [], None, None, {}, failed
+
+        lengths = np.array([len(values) for values in series.values()])
+        n_rows = int(lengths.max())
+        matrix = np.full((n_rows, len(series)), np.nan)
+        for j, values in enumerate(series.values()):
+            matrix[n_rows - len(values):, j] = values
+        return list(series), matrix, lengths, last_dates, failed
+
+    def _calculate_indicators_batch(self, frames, states=None, codes=None):
+        """批量计算技术指标：将所有基金净值排成一个 日期 × 基金 矩阵，按列一次性计算
+
+        各基金按最新一行尾部对齐（较短的历史在顶部补 NaN），而不是按日期外连接，
+        这样日期缺口不会改变单个基金的 EWM/rolling 窗口，结果与逐个基金计算一致。
+        返回 {fund_code: 结果字典}；传入 states 字典时同时写入各基金的增量指标状态。
+        """
+        codes, matrix, lengths, last_dates, results = self._indicator_matrix(frames, codes)
+        if not codes:
+            return results
+
+        try:
+            n_rows = len(matrix)
+            nav = pd.DataFrame(matrix, columns=codes)
+
+            exp12 = nav.ewm(span=12, adjust=False).mean()
+            exp26 = nav.ewm(span=26, adjust=False).mean()
+            macd = exp12 - exp26
+            signal = macd.ewm(span=9, adjust=False).mean()
 
             window = 20
-            df['bb_mid'] = df['net_value'].rolling(window=window, min_periods=1).mean()
-            df['bb_std'] = df['net_value'].rolling(window=window, min_periods=1).std()
-            df['bb_upper'] = df['bb_mid'] + (df['bb_std'] * 2)
-            df['bb_lower'] = df['bb_mid'] - (df['bb_std'] * 2)
-            
-            delta = df['net_value'].diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
+            bb_mid = nav.rolling(window=window, min_periods=1).mean()
+            bb_std = nav.rolling(window=window, min_periods=1).std()
+            bb_upper = bb_mid + (bb_std * 2)
+            bb_lower = bb_mid - (bb_std * 2)
+
+            delta = nav.diff()
+            # 补齐的 NaN 行不参与 RSI 窗口，每个基金首行的涨跌仍按 0 计入
+            gain = delta.where(delta > 0, 0).where(nav.notna())
+            loss = (-delta.where(delta < 0, 0)).where(nav.notna())
             avg_gain = gain.rolling(window=14, min_periods=1).mean()
             avg_loss = loss.rolling(window=14, min_periods=1).mean()
-            
             rs = avg_gain / avg_loss.replace(0, np.nan)
             rsi = 100 - (100 / (1 + rs))
 
-            ma50 = df['net_value'].rolling(window=min(50, len(df)), min_periods=1).mean()
-            
-            latest_data = df.iloc[-1]
-            latest_net_value = latest_data['net_value']
-            latest_rsi = rsi.iloc[-1] if not pd.isna(rsi.iloc[-1]) else np.nan
-            latest_ma50 = ma50.iloc[-1]
-            latest_ma50_ratio = latest_net_value / latest_ma50 if not pd.isna(latest_ma50) and latest_ma50 != 0 else np.nan
-            
-            latest_macd_diff = latest_data['macd'] - latest_data['signal'] if 'macd' in latest_data and 'signal' in latest_data else np.nan
-            latest_bb_upper = latest_data['bb_upper'] if 'bb_upper' in latest_data else np.nan
-            latest_bb_lower = latest_data['bb_lower'] if 'bb_lower' in latest_data else np.nan
-
-            advice = "观察"
-            if (not np.isnan(latest_rsi) and latest_rsi > 70) or \
-               (not np.isnan(latest_bb_upper) and latest_net_value > latest_bb_upper) or \
-               (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio > 1.2):
-                advice = "等待回调"
-            elif (not np.isnan(latest_rsi) and latest_rsi < 30) or \
-                 (not np.isnan(latest_bb_lower) and latest_net_value < latest_bb_lower) or \
-                 (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio < 0.8):
-                advice = "可分批买入"
-            elif (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio > 1) and \
-                 (not np.isnan(latest_macd_diff) and latest_macd_diff > 0):
-                advice = "可分批买入"
-            elif (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio < 1) and \
-                 (not np.isnan(latest_macd_diff) and latest_macd_diff < 0):
-                advice = "等待回调"
-
-            action_signal = "持有/观察"
-            if not np.isnan(latest_ma50_ratio) and latest_ma50_ratio < 0.95:
-                action_signal = "强卖出/规避"
-            elif (not np.isnan(latest_rsi) and latest_rsi > 70) and \
-               (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio > 1.2) and \
-               (not np.isnan(latest_macd_diff) and latest_macd_diff < 0):
-                action_signal = "强卖出/规避"
-            elif (not np.isnan(latest_rsi) and latest_rsi > 65) or \
-                 (not np.isnan(latest_bb_upper) and latest_net_value > latest_bb_upper) or \
-                 (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio > 1.2):
-                action_signal = "弱卖出/规避"
-            elif (not np.isnan(latest_rsi) and latest_rsi < 35) and \
-               (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio < 0.9) and \
-               (not np.isnan(latest_macd_diff) and latest_macd_diff > 0):
-                action_signal = "强买入"
-            elif (not np.isnan(latest_rsi) and latest_rsi < 45) or \
-                 (not np.isnan(latest_bb_lower) and latest_net_value < latest_bb_lower) or \
-                 (not np.isnan(latest_ma50_ratio) and latest_ma50_ratio < 1):
-                action_signal = "弱买入"
-            
-            return {
-                'fund_code': fund_code,
-                'latest_net_value': latest_net_value,
-                'rsi': latest_rsi,
-                'ma_ratio': latest_ma50_ratio,
-                'macd_diff': latest_macd_diff,
-                'bb_upper': latest_bb_upper,
-                'bb_lower': latest_bb_lower,
-                'advice': advice,
-                'action_signal': action_signal
-            }
+            ma50 = nav.rolling(window=50, min_periods=1).mean()
+
+            latest_net_value = matrix[-1]
+            latest_rsi = rsi.iloc[-1].to_numpy()
+            latest_ma50 = ma50.iloc[-1].to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                latest_ma50_ratio = np.where(latest_ma50 != 0, latest_net_value / latest_ma50, np.nan)
+            latest_macd_diff = (macd.iloc[-1] - signal.iloc[-1]).to_numpy()
+            latest_bb_upper = bb_upper.iloc[-1].to_numpy()
+            latest_bb_lower = bb_lower.iloc[-1].to_numpy()
+
+            advice, action_signal = _classify_indicators(
+                latest_net_value, latest_rsi, latest_ma50_ratio, latest_macd_diff, latest_bb_upper, latest_bb_lower,
+                self.thresholds
+            )
+            for j, fund_code in enumerate(codes):
+                results[fund_code] = _indicator_result(
+                    fund_code, latest_net_value[j], latest_rsi[j], latest_ma50_ratio[j], latest_macd_diff[j],
+                    latest_bb_upper[j], latest_bb_lower[j], advice[j], action_signal[j]
+                )
+
+            if states is not None:
+                # 记录序列末尾的累计值和窗口内容，之后的新数据可在此基础上增量更新
+                gain_matrix = gain.to_numpy()
+                loss_matrix = loss.to_numpy()
+                exp12_last = exp12.iloc[-1].to_numpy()
+                exp26_last = exp26.iloc[-1].to_numpy()
+                signal_last = signal.iloc[-1].to_numpy()
+                for j, fund_code in enumerate(codes):
+                    start = n_rows - int(lengths[j])
+                    states[fund_code] = IndicatorState(
+                        last_date=last_dates[fund_code], last_nav=float(latest_net_value[j]), count=n_rows - start,
+                        ema12=float(exp12_last[j]), ema26=float(exp26_last[j]), signal=float(signal_last[j]),
+                        navs=matrix[start:, j][-MA_WINDOW:].tolist(),
+                        gains=gain_matrix[start:, j][-RSI_WINDOW:].tolist(),
+                        losses=loss_matrix[start:, j][-RSI_WINDOW:].tolist(),
+                    )
 
         except Exception as e:
-            logger.error("处理基金 %s 时发生异常: %s", fund_code, str(e))
-            return {
-                'fund_code': fund_code,
-                'latest_net_value': "数据获取失败",
-                'rsi': np.nan,
-                'ma_ratio': np.nan,
-                'macd_diff': np.nan,
-                'bb_upper': np.nan,
-                'bb_lower': np.nan,
-                'advice': "观察",
-                'action_signal': 'N/A'
-            }
+            logger.error("批量计算 %d 个基金的技术指标时发生异常: %s", len(codes), str(e))
+            for fund_code in codes:
+                results[fund_code] = self._failed_indicator_result(fund_code)
         finally:
             for handler in logger.handlers:
                 handler.flush()
 
+        return results
+
+    def _update_indicators_incrementally(self, fund_code, dates, net_values):
+        """在已保存的指标状态上只追加新日期的净值，返回结果字典
+
+        dates/net_values 为按日期升序的数组。状态缺失，或状态记录的最新日期/净值与当前历史不一致
+        （历史被重写或修订）时返回 None，由调用方走批量全量计算并重建状态。
+        净值按 float32 精度比较，只在 float32 精度以下不同的净值视为一致。
+        布林带、RSI、MA50 与批量路径完全一致；MACD 的 EWM 起点比批量路径（最后 100 行）更早，
+        两者之差不超过 2 * (1 - 2/27) ** 99（约 1e-3）倍的净值波动幅度。
+        """
+        state = self.indicator_states.get(fund_code)
+        if state is None or not len(dates):
+            return None
+        last_date = np.datetime64(state.last_date, 'D')
+        position = np.searchsorted(dates, last_date)
+        if position >= len(dates) or dates[position] != last_date or \
+                np.float32(net_values[position]) != np.float32(state.last_nav):
+            logger.info("基金 %s 的历史数据与指标状态不一致，重新计算", fund_code)
+            del self.indicator_states[fund_code]
+            return None
+
+        for date, net_value in zip(dates[position + 1:], net_values[position + 1:]):
+            state.update(date, net_value)
+        logger.info("基金 %s 基于已保存的指标状态增量更新 %d 行", fund_code, len(dates) - position - 1)
+
+        latest = state.latest()
+        advice, action_signal = _classify_indicators(*(np.array([value]) for value in latest), self.thresholds)
+        return _indicator_result(fund_code, *latest, advice[0], action_signal[0])
+
     def _backtest_strategy(self, fund_code, df):
-        """历史回测策略性能"""
-        if df is None or df.empty or len(df) < 100:
+        """历史回测策略性能；df 也可以是按日期升序的净值数组（如 CompactNavs.net_values、NavStore.net_values）"""
+        if df is None or len(df) < 100:
             logger.warning("基金 %s 数据不足，无法回测", fund_code)
             return {"cum_return": np.nan, "max_drawdown": np.nan, "sharpe_ratio": np.nan, "win_rate": np.nan}
 
-        df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
-        df['return'] = df['net_value'].pct_change()
-        
-        df['rsi'] = pd.Series([np.nan] * len(df))
-        df['ma_ratio'] = pd.Series([np.nan] * len(df))
-        df['macd_diff'] = pd.Series([np.nan] * len(df))
-        df['action_signal'] = "持有/观察"
-
-        for i in range(26, len(df)):
-            temp_df = df.iloc[:i+1]
-            exp12 = temp_df['net_value'].ewm(span=12, adjust=False).mean()
-            exp26 = temp_df['net_value'].ewm(span=26, adjust=False).mean()
-            macd = exp12 - exp26
-            signal = macd.ewm(span=9, adjust=False).mean()
-            macd_diff = macd.iloc[-1] - signal.iloc[-1]
-
-            delta = temp_df['net_value'].diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(window=14, min_periods=1).mean()
-            avg_loss = loss.rolling(window=14, min_periods=1).mean()
-            rs = avg_gain / avg_loss.replace(0, np.nan)
-            rsi = 100 - (100 / (1 + rs))
-            ma50 = temp_df['net_value'].rolling(window=min(50, len(temp_df)), min_periods=1).mean()
-
-            df.loc[i, 'rsi'] = rsi.iloc[-1]
-            df.loc[i, 'ma_ratio'] = temp_df['net_value'].iloc[-1] / ma50.iloc[-1]
-            df.loc[i, 'macd_diff'] = macd_diff
-
-            if not np.isnan(df.loc[i, 'rsi']) and not np.isnan(df.loc[i, 'ma_ratio']) and not np.isnan(df.loc[i, 'macd_diff']):
-                if df.loc[i, 'rsi'] < 35 and df.loc[i, 'ma_ratio'] < 0.9 and df.loc[i, 'macd_diff'] > 0:
-                    df.loc[i, 'action_signal'] = "强买入"
-                elif df.loc[i, 'rsi'] < 45 or df.loc[i, 'ma_ratio'] < 1:
-                    df.loc[i, 'action_signal'] = "弱买入"
-                elif df.loc[i, 'ma_ratio'] < 0.95:
-                    df.loc[i, 'action_signal'] = "强卖出/规避"
-                elif df.loc[i, 'rsi'] > 70 and df.loc[i, 'ma_ratio'] > 1.2 and df.loc[i, 'macd_diff'] < 0:
-                    df.loc[i, 'action_signal'] = "强卖出/规避"
-                elif df.loc[i, 'rsi'] > 65 or df.loc[i, 'ma_ratio'] > 1.2:
-                    df.loc[i, 'action_signal'] = "弱卖出/规避"
-
-        position = 0
-        buy_price = 0
-        trades = []
-        for i in range(1, len(df)):
-            signal = df.loc[i, 'action_signal']
-            if signal in ["强买入", "弱买入"] and position == 0:
-                position = 1
-                buy_price = df.loc[i, 'net_value']
-                trades.append({'buy_date': df.loc[i, 'date'], 'buy_price': buy_price})
-            elif signal in ["强卖出/规避", "弱卖出/规避"] and position == 1:
-                sell_price = df.loc[i, 'net_value']
-                ret = (sell_price - buy_price) / buy_price
-                trades[-1]['sell_date'] = df.loc[i, 'date']
-                trades[-1]['sell_price'] = sell_price
-                trades[-1]['return'] = ret
-                position = 0
-
-        if trades:
-            returns = [trade['return'] for trade in trades if 'return' in trade]
-            cum_return = np.prod([1 + r for r in returns]) - 1 if returns else 0
-            win_rate = len([r for r in returns if r > 0]) / len(returns) if returns else 0
-            equity_list = np.cumprod([1 + r for r in df['return'].fillna(0)])
-            equity = pd.Series(equity_list)
-            roll_max = equity.cummax()
-            drawdown = equity / roll_max - 1
-            max_drawdown = drawdown.min()
-            sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if returns and np.std(returns) != 0 else np.nan
+        if isinstance(df, pd.DataFrame):
+            net_value = df.sort_values(by='date', ascending=True)['net_value'].astype(float).reset_index(drop=True)
         else:
-            cum_return = max_drawdown = sharpe_ratio = win_rate = np.nan
-
-        logger.info("基金 %s 回测结果: 累计回报=%.2f, 最大回撤=%.2f, 夏普比率=%.2f, 胜率=%.2f", fund_code, cum_return, max_drawdown, sharpe_ratio, win_rate)
-        return {
-            "cum_return": cum_return,
-            "max_drawdown": max_drawdown,
-            "sharpe_ratio": sharpe_ratio,
-            "win_rate": win_rate
-        }
+            net_value = pd.Series(np.asarray(df, dtype=float), copy=False)
+        result = _backtest_metrics(net_value, self.thresholds)
+        self._log_backtest_result(fund_code, result)
+        return result
+
+    @staticmethod
+    def _log_backtest_result(fund_code, result):
+        logger.info("基金 %s 回测结果: 累计回报=%.2f, 最大回撤=%.2f, 夏普比率=%.2f, 胜率=%.2f", fund_code,
+                    result['cum_return'], result['max_drawdown'], result['sharpe_ratio'], result['win_rate'])
+
+    def _needs_bootstrap(self, entry):
+        """本地历史少于回测所需行数，且今天还没有成功抓取过（避免对新成立的基金每次运行都重复抓取）"""
+        if entry['rows'] >= self.bootstrap_min_rows:
+            return False
+        fetched_at = entry['last_fetch_at']
+        fetched_today = bool(entry['last_fetch_ok']) and fetched_at is not None and \
+            datetime.fromtimestamp(fetched_at).date() == datetime.now().date()
+        return not fetched_today
 
     def get_fund_data(self):
         """主控函数：优先从本地加载，仅在数据非最新或不完整时下载"""
@@ -399,170 +680,245 @@ class MarketMonitor:
 
         logger.info("开始预加载本地缓存数据...")
         fund_codes_to_fetch = []
+        # 需要抓取完整历史的基金：本地无数据，或历史过短且今天尚未成功抓取过
+        bootstrap_codes = set()
+        fresh_codes = []
+        frames = {}
         expected_latest_date = self._get_expected_latest_date()
         min_data_points = 26
 
+        # 一次扫描覆盖范围清单得到各基金的行数和最新日期，不打开任何分区文件
+        coverage = self.store.coverage(self.fund_codes)
+        reused = 0
         for fund_code in self.fund_codes:
-            local_df = self._read_local_data(fund_code)
-            
-            if not local_df.empty:
-                latest_local_date = local_df['date'].max().date()
-                data_points = len(local_df)
-                
-                if latest_local_date >= expected_latest_date and data_points >= min_data_points:
+            entry = coverage.get(fund_code)
+            if entry is None and self._ensure_in_store(fund_code):
+                # 旧 CSV 刚导入存储
+                entry = self.store.coverage([fund_code]).get(fund_code)
+            data_points = entry['rows'] if entry else 0
+
+            if data_points:
+                latest_local_date = entry['last_date']
+
+                needs_bootstrap = self._needs_bootstrap(entry)
+                if latest_local_date >= expected_latest_date and data_points >= min_data_points and not needs_bootstrap:
+                    previous = self.run_results.indicators(fund_code, entry) if self.delta else None
+                    if previous is not None:
+                        # 净值历史自上次运行以来没有变化，沿用上次的指标结果
+                        self.fund_data[fund_code] = previous
+                        self.metrics.inc('local_data', status='unchanged')
+                        reused += 1
+                        continue
                     logger.info("基金 %s 的本地数据已是最新 (%s, 期望: %s) 且数据量足够 (%d 行)，直接加载。",
                                  fund_code, latest_local_date, expected_latest_date, data_points)
-                    self.fund_data[fund_code] = self._calculate_indicators(fund_code, local_df.tail(100))
+                    fresh_codes.append(fund_code)
+                    self.metrics.inc('local_data', status='fresh')
                     continue
                 else:
+                    self.metrics.inc('local_data', status='stale')
                     if latest_local_date < expected_latest_date:
                         logger.info("基金 %s 本地数据已过时（最新日期为 %s，期望 %s），需要从网络获取新数据。",
                                      fund_code, latest_local_date, expected_latest_date)
                     if data_points < min_data_points:
                         logger.info("基金 %s 本地数据量不足（仅 %d 行，需至少 %d 行），需要从网络获取。",
                                      fund_code, data_points, min_data_points)
+                    elif needs_bootstrap:
+                        logger.info("基金 %s 本地历史过短（仅 %d 行，回测需至少 %d 行），需要抓取完整历史。",
+                                     fund_code, data_points, self.bootstrap_min_rows)
+                    if needs_bootstrap:
+                        bootstrap_codes.add(fund_code)
             else:
+                self.metrics.inc('local_data', status='missing')
                 logger.info("基金 %s 本地数据不存在，需要从网络获取。", fund_code)
+                bootstrap_codes.add(fund_code)
             
             fund_codes_to_fetch.append(fund_code)
 
+        if reused:
+            logger.info("%d 个基金的净值历史自上次运行以来没有变化，沿用上次的指标结果", reused)
         if fund_codes_to_fetch:
-            logger.info("开始使用多线程获取 %d 个基金的新数据...", len(fund_codes_to_fetch))
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                future_to_code = {executor.submit(self._fetch_fund_data, code): code for code in fund_codes_to_fetch}
-                for future in concurrent.futures.as_completed(future_to_code):
-                    fund_code = future_to_code[future]
-                    try:
-                        df = future.result()
-                        result = self._calculate_indicators(fund_code, df)
-                        self.fund_data[fund_code] = result
-                    except Exception as e:
-                        logger.error("获取和处理基金 %s 数据时出错: %s", fund_code, str(e))
-                        self.fund_data[fund_code] = {
-                            'fund_code': fund_code, 'latest_net_value': "数据获取失败", 'rsi': np.nan,
-                            'ma_ratio': np.nan, 'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
-                        }
+            logger.info("开始异步获取 %d 个基金的新数据...", len(fund_codes_to_fetch))
+            fetched = asyncio.run(self._fetch_funds_async(fund_codes_to_fetch, bootstrap_codes))
+            for fund_code, result in fetched.items():
+                if isinstance(result, Exception):
+                    self.metrics.inc('fetch_failures', source='lsjz')
+                    logger.error("获取和处理基金 %s 数据时出错: %s", fund_code, str(result))
+                    self.fund_data[fund_code] = self._failed_indicator_result(fund_code)
+                    self.run_results.mark_changed('indicators')
+                else:
+                    frames[fund_code] = result
         else:
             logger.info("所有基金数据均来自本地缓存，无需网络下载。")
-        
+
+        # 本地最新的基金直接从分区文件取最后 100 行，与抓取到的数据一起放进紧凑容器，不逐个构造 DataFrame；
+        # 净值保留 float64，指标与逐个基金按 DataFrame 计算的结果完全一致
+        navs = CompactNavs.from_arrays(chain(
+            ((fund_code, *self.store.arrays(fund_code, tail=100)) for fund_code in fresh_codes),
+            ((fund_code, df['date'].to_numpy(), df['net_value'].to_numpy(dtype=float))
+             for fund_code, df in frames.items()),
+        ), dtype=np.float64)
+        del frames
+        if fresh_codes:
+            self.metrics.inc('rows_read', int(navs.offsets[len(fresh_codes)]), source='nav_store')
+        logger.info("%d 个基金的净值载入紧凑容器，占用 %.1f KB", len(navs), navs.nbytes / 1024)
+
+        coverage = self.store.coverage(navs.codes) if len(navs) else {}
+        codes = navs.codes
+        if self.delta:
+            # 抓取后没有新数据的基金，净值历史同样没有变化
+            unchanged = {}
+            for fund_code in codes[len(fresh_codes):]:
+                previous = self.run_results.indicators(fund_code, coverage.get(fund_code))
+                if previous is not None:
+                    unchanged[fund_code] = previous
+            if unchanged:
+                logger.info("%d 个基金抓取后没有新数据，沿用上次的指标结果", len(unchanged))
+                self.fund_data.update(unchanged)
+                self.metrics.inc('indicator_funds', len(unchanged), mode='unchanged')
+                codes = [fund_code for fund_code in codes if fund_code not in unchanged]
+
+        pending = []
+        with self.metrics.timer('indicator', mode='incremental'):
+            for fund_code in codes:
+                result = self._update_indicators_incrementally(
+                    fund_code, navs.fund_dates(fund_code), navs.net_values(fund_code)
+                )
+                if result is None:
+                    pending.append(fund_code)
+                else:
+                    self.fund_data[fund_code] = result
+        self.metrics.inc('indicator_funds', len(codes) - len(pending), mode='incremental')
+        if pending:
+            logger.info("开始批量计算 %d 个基金的技术指标...", len(pending))
+            with self.metrics.timer('indicator', mode='batch'):
+                self.fund_data.update(
+                    self._calculate_indicators_batch(navs, states=self.indicator_states, codes=pending)
+                )
+            self.metrics.inc('indicator_funds', len(pending), mode='batch')
+        if codes:
+            try:
+                # 只写入本次重新计算或增量更新过的基金，沿用上次结果的基金状态未变
+                save_states(self.indicator_state_file, self.indicator_states, codes)
+            except Exception as e:
+                logger.warning("保存指标状态失败: %s", e)
+            for fund_code in codes:
+                self.run_results.set_indicators(fund_code, coverage.get(fund_code), self.fund_data[fund_code])
+
         if len(self.fund_data) > 0:
             logger.info("所有基金数据处理完成。")
         else:
             logger.error("所有基金数据均获取失败。")
 
+    def save_run_results(self):
+        """运行结束时一次性保存本次的指标与回测结果，供下次增量运行沿用"""
+        try:
+            self.run_results.save()
+        except Exception as e:
+            logger.warning("保存运行结果失败: %s", e)
+
+    def _report_table(self):
+        """监控报告的汇总表：按基金代码取指标结果，按行动信号优先级排序"""
+        return ReportTable(
+            '', REPORT_COLUMNS,
+            row=lambda fund_code: _report_row(fund_code, self.fund_data.get(fund_code)),
+            sort_key=_report_sort_key,
+            formats={'最新净值': '.4f', 'RSI': '.2f', '净值/MA50': '.2f'},
+        )
+
     def generate_report(self):
-        """生成市场情绪与技术指标监控报告"""
+        """生成市场情绪与技术指标监控报告（流式写出，按 output_file 后缀支持 .md/.csv/.json）"""
+        if self.delta and self.run_results.output_unchanged('indicators', self.output_file, self.fund_codes):
+            logger.info("所有基金的指标结果均与上次相同，沿用已有报告 %s", self.output_file)
+            return
         logger.info("正在生成市场监控报告...")
-        report_df_list = []
-        for fund_code in self.fund_codes:
-            data = self.fund_data.get(fund_code)
-            if data is not None:
-                latest_net_value_str = f"{data['latest_net_value']:.4f}" if isinstance(data['latest_net_value'], (float, int)) else str(data['latest_net_value'])
-                rsi_str = f"{data['rsi']:.2f}" if isinstance(data['rsi'], (float, int)) and not np.isnan(data['rsi']) else "N/A"
-                ma_ratio_str = f"{data['ma_ratio']:.2f}" if isinstance(data['ma_ratio'], (float, int)) and not np.isnan(data['ma_ratio']) else "N/A"
-                
-                macd_signal = "N/A"
-                if isinstance(data['macd_diff'], (float, int)) and not np.isnan(data['macd_diff']):
-                    macd_signal = "金叉" if data['macd_diff'] > 0 else "死叉"
-                
-                bollinger_pos = "中轨"
-                if isinstance(data['latest_net_value'], (float, int)):
-                    if isinstance(data['bb_upper'], (float, int)) and not np.isnan(data['bb_upper']) and data['latest_net_value'] > data['bb_upper']:
-                        bollinger_pos = "上轨上方"
-                    elif isinstance(data['bb_lower'], (float, int)) and not np.isnan(data['bb_lower']) and data['latest_net_value'] < data['bb_lower']:
-                        bollinger_pos = "下轨下方"
-                else:
-                    bollinger_pos = "N/A"
-                
-                report_df_list.append({
-                    "基金代码": fund_code,
-                    "最新净值": latest_net_value_str,
-                    "RSI": rsi_str,
-                    "净值/MA50": ma_ratio_str,
-                    "MACD信号": macd_signal,
-                    "布林带位置": bollinger_pos,
-                    "投资建议": data['advice'],
-                    "行动信号": data['action_signal']
-                })
-            else:
-                report_df_list.append({
-                    "基金代码": fund_code,
-                    "最新净值": "数据获取失败",
-                    "RSI": "N/A",
-                    "净值/MA50": "N/A",
-                    "MACD信号": "N/A",
-                    "布林带位置": "N/A",
-                    "投资建议": "观察",
-                    "行动信号": "N/A"
-                })
-
-        report_df = pd.DataFrame(report_df_list)
-
-        order_map_action = {
-            "强买入": 1,
-            "弱买入": 2,
-            "持有/观察": 3,
-            "弱卖出/规避": 4,
-            "强卖出/规避": 5,
-            "N/A": 6
-        }
-        order_map_advice = {
-            "可分批买入": 1,
-            "观察": 2,
-            "等待回调": 3,
-            "N/A": 4
-        }
-        
-        report_df['sort_order_action'] = report_df['行动信号'].map(order_map_action)
-        report_df['sort_order_advice'] = report_df['投资建议'].map(order_map_advice)
-        
-        report_df['最新净值'] = pd.to_numeric(report_df['最新净值'], errors='coerce')
-        report_df['RSI'] = pd.to_numeric(report_df['RSI'], errors='coerce')
-        report_df['净值/MA50'] = pd.to_numeric(report_df['净值/MA50'], errors='coerce')
-
-        report_df = report_df.sort_values(
-            by=['sort_order_action', 'sort_order_advice', 'RSI'],
-            ascending=[True, True, True]
-        ).drop(columns=['sort_order_action', 'sort_order_advice'])
-
-        report_df['最新净值'] = report_df['最新净值'].apply(lambda x: f"{x:.4f}" if not pd.isna(x) else "N/A")
-        report_df['RSI'] = report_df['RSI'].apply(lambda x: f"{x:.2f}" if not pd.isna(x) else "N/A")
-        report_df['净值/MA50'] = report_df['净值/MA50'].apply(lambda x: f"{x:.2f}" if not pd.isna(x) else "N/A")
-
-        markdown_table = report_df.to_markdown(index=False)
-        
-        with open(self.output_file, 'w', encoding='utf-8') as f:
-            f.write(f"# 市场情绪与技术指标监控报告\n\n")
-            f.write(f"生成日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"## 推荐基金技术指标 (处理基金数: {len(self.fund_codes)})\n")
-            f.write("此表格已按**行动信号优先级**排序，'强买入'基金将排在最前面。\n")
-            f.write("**注意：** 当'行动信号'和'投资建议'冲突时，请以**行动信号**为准，其条件更严格，更适合机械化决策。\n\n")
-            f.write(markdown_table)
-        
+        preamble = (
+            f"# 市场情绪与技术指标监控报告\n\n"
+            f"生成日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            f"## 推荐基金技术指标 (处理基金数: {len(self.fund_codes)})\n"
+            "此表格已按**行动信号优先级**排序，'强买入'基金将排在最前面。\n"
+            "**注意：** 当'行动信号'和'投资建议'冲突时，请以**行动信号**为准，其条件更严格，更适合机械化决策。\n\n"
+        )
+        write_report(self.output_file, iter(self.fund_codes), [self._report_table()], preamble=preamble)
+        self.run_results.record_output(self.output_file, self.fund_codes)
         logger.info("报告生成完成: %s", self.output_file)
 
-    def perform_backtest(self):
-        """对所有基金进行历史回测，并输出结果"""
+    def perform_backtest(self, workers=None, chunk_size=None):
+        """对所有基金进行历史回测，并输出结果
+
+        基金按块分发到多个进程并行回测，结果按 self.fund_codes 的顺序写出，与进程数无关。
+        增量运行时净值历史与上次回测时相同的基金直接沿用上次的结果。
+        """
+        available = [fund_code for fund_code in self.fund_codes if self._ensure_in_store(fund_code)]
+        coverage = self.store.coverage(available)
+        computed = {}
+        if self.delta:
+            for fund_code in available:
+                found, result = self.run_results.backtest(fund_code, coverage.get(fund_code))
+                if found:
+                    computed[fund_code] = result
+            if computed:
+                logger.info("%d 个基金的净值历史自上次回测以来没有变化，沿用上次的回测结果", len(computed))
+            if len(computed) == len(available) and \
+                    self.run_results.output_unchanged('backtest', BACKTEST_RESULTS_FILE, self.fund_codes):
+                logger.info("所有基金的回测结果均与上次相同，沿用已有的 %s", BACKTEST_RESULTS_FILE)
+                return
+            available = [fund_code for fund_code in available if fund_code not in computed]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(available)))
+        chunk_size = chunk_size or max(1, -(-len(available) // (workers * 4)))
+        chunks = [available[i:i + chunk_size] for i in range(0, len(available), chunk_size)]
+        task = functools.partial(_backtest_chunk, self.store.root, self.thresholds)
+
+        logger.info("开始回测 %d 个基金（%d 个进程，每块 %d 个）...", len(available), workers, chunk_size)
+        if workers == 1:
+            chunk_results = map(task, chunks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            chunk_results = executor.map(task, chunks)
+        try:
+            with self.metrics.timer('backtest', workers=workers):
+                done = 0
+                for results in chunk_results:
+                    for fund_code, result in results:
+                        computed[fund_code] = result
+                        self.run_results.set_backtest(fund_code, coverage.get(fund_code), result)
+                    done += len(results)
+                    logger.info("回测进度: %d/%d", done, len(available))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.metrics.inc('backtest_funds', len(available))
+
         backtest_results = {}
         for fund_code in self.fund_codes:
-            df = self._read_local_data(fund_code)
-            if not df.empty:
-                backtest_results[fund_code] = self._backtest_strategy(fund_code, df)
+            result = computed.get(fund_code)
+            if result is None:
+                if fund_code in computed:
+                    logger.warning("基金 %s 数据不足，无法回测", fund_code)
+                else:
+                    logger.warning("基金 %s 无历史数据，无法回测", fund_code)
+                result = {"cum_return": np.nan, "max_drawdown": np.nan, "sharpe_ratio": np.nan, "win_rate": np.nan}
             else:
-                logger.warning("基金 %s 无历史数据，无法回测", fund_code)
-                backtest_results[fund_code] = {"cum_return": np.nan, "max_drawdown": np.nan, "sharpe_ratio": np.nan, "win_rate": np.nan}
-        
+                self._log_backtest_result(fund_code, result)
+            backtest_results[fund_code] = result
+
         backtest_df = pd.DataFrame.from_dict(backtest_results, orient='index')
-        backtest_df.to_csv('backtest_results.csv', encoding='utf-8')
-        logger.info("回测结果已保存到 backtest_results.csv")
+        backtest_df.to_csv(BACKTEST_RESULTS_FILE, encoding='utf-8')
+        self.run_results.record_output(BACKTEST_RESULTS_FILE, self.fund_codes)
+        logger.info("回测结果已保存到 %s", BACKTEST_RESULTS_FILE)
 
 if __name__ == "__main__":
     try:
         logger.info("脚本启动")
         monitor = MarketMonitor()
-        monitor.get_fund_data()
-        monitor.generate_report()
-        monitor.perform_backtest()
+        with monitor.metrics.timer('stage', stage='fetch_and_indicators'):
+            monitor.get_fund_data()
+        with monitor.metrics.timer('stage', stage='report'):
+            monitor.generate_report()
+        with monitor.metrics.timer('stage', stage='backtest'):
+            monitor.perform_backtest()
+        monitor.save_run_results()
+        monitor.metrics.dump()
         logger.info("脚本执行完成")
     except Exception as e:
         logger.error("脚本运行失败: %s", e)
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 设置该环境变量后启用运行指标，运行结束时写入 {目录}/{job}.prom，供 Prometheus node_exporter 的 textfile collector 读取
+METRICS_DIR_ENV = 'FUND_METRICS_DIR'
+
+
+class _NullTimer:
+    """未启用指标时共享的空计时器"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics._observe(self.name, self.labels, time.perf_counter() - self.start)
+        return False
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+class Metrics:
+    """
+    进程内的轻量运行指标：按名称和标签累计的计数器与计时器。
+
+    未启用时 inc/observe 直接返回，timer 返回共享的空上下文管理器，几乎没有额外开销；
+    启用后由 dump() 在运行结束时输出汇总日志，并写出 Prometheus textfile 格式的文件。
+    计数器和计时器可在多个线程中同时使用。
+    """
+    def __init__(self, job, enabled=False, textfile=None):
+        self.job = job
+        self.enabled = enabled
+        self.textfile = textfile
+        self._counters = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, job):
+        """根据环境变量 FUND_METRICS_DIR 决定是否启用"""
+        metrics_dir = os.getenv(METRICS_DIR_ENV)
+        if not metrics_dir:
+            return cls(job)
+        return cls(job, enabled=True, textfile=os.path.join(metrics_dir, f"{job}.prom"))
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def timer(self, name, **labels):
+        """返回计时上下文管理器，退出时把耗时累计到 name 上"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, tuple(sorted(labels.items())))
+
+    def observe(self, name, seconds, **labels):
+        """直接记录一次耗时"""
+        if not self.enabled:
+            return
+        self._observe(name, tuple(sorted(labels.items())), seconds)
+
+    def _observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self._lock:
+            count, total, maximum = self._timers.get(key, (0, 0.0, 0.0))
+            self._timers[key] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def to_prometheus(self):
+        """按 Prometheus 文本格式输出全部指标"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted(self._timers.items())
+
+        lines = []
+        declared = set()
+
+        def declare(metric, metric_type):
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} {metric_type}")
+
+        for (name, labels), value in counters:
+            metric = f"{self.job}_{name}_total"
+            declare(metric, 'counter')
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        # 同一指标族的各行必须连续输出，因此先按名称分组，再分别输出 summary 和最大值 gauge
+        timer_names = sorted({name for (name, _), _ in timers})
+        for timer_name in timer_names:
+            rows = [(labels, value) for (name, labels), value in timers if name == timer_name]
+            metric = f"{self.job}_{timer_name}_seconds"
+            declare(metric, 'summary')
+            for labels, (count, total, _) in rows:
+                lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+            declare(f"{metric}_max", 'gauge')
+            for labels, (_, _, maximum) in rows:
+                lines.append(f"{metric}_max{_format_labels(labels)} {maximum:.6f}")
+        metric = f"{self.job}_last_run_timestamp_seconds"
+        declare(metric, 'gauge')
+        lines.append(f"{metric} {time.time():.0f}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self):
+        """输出本次运行的指标汇总，并写出 textfile（通过临时文件原子替换）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted(self._timers.items())
+        logger.info("--- 运行指标汇总 (%s) ---", self.job)
+        for (name, labels), (count, total, maximum) in timers:
+            logger.info("耗时 %s%s: %d 次, 共 %.3f 秒, 最长 %.3f 秒", name, _format_labels(labels), count, total, maximum)
+        for (name, labels), value in counters:
+            logger.info("计数 %s%s: %s", name, _format_labels(labels), value)
+
+        if self.textfile:
+            try:
+                os.makedirs(os.path.dirname(self.textfile) or '.', exist_ok=True)
+                tmp_path = f"{self.textfile}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.to_prometheus())
+                os.replace(tmp_path, self.textfile)
+                logger.info("运行指标已写入 %s", self.textfile)
+            except OSError as e:
+                logger.warning("写入运行指标文件 %s 失败: %s", self.textfile, e)
@@ -0,0 +1,346 @@
+import os
+import sys
+import sqlite3
+import threading
+import time
+import zlib
+import logging
+from collections import OrderedDict
+from datetime import date
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 每条记录: 日期(自 1970-01-01 起的天数, int32) + 单位净值(float64)，小端定长 12 字节
+RECORD_DTYPE = np.dtype([('date', '<i4'), ('net_value', '<f8')])
+FILE_SUFFIX = '.nav'
+# 各基金覆盖范围的清单，与分区文件放在同一目录
+MANIFEST_FILE = 'manifest.sqlite'
+
+
+class NavStore:
+    """
+    基金净值历史的本地列式存储。
+
+    每个基金一个分区文件 {root}/{code}.nav，内容为按日期升序排列的定长二进制记录，
+    新数据只追加到文件末尾，不再重写历史；读取时通过内存映射 + 二分查找只取所需日期区间。
+
+    另在 manifest.sqlite 中记录每个基金的首末日期、行数、文件校验和 (CRC32) 及最近一次抓取时间，
+    每次写入分区文件后逐条提交更新，判断哪些基金需要更新时只需扫描这一个文件。
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        # 清单连接按需打开，只读取净值的回测子进程不会打开数据库
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+
+    def _path(self, fund_code):
+        return os.path.join(self.root, f"{fund_code}{FILE_SUFFIX}")
+
+    def exists(self, fund_code):
+        """基金是否已有存储数据"""
+        path = self._path(fund_code)
+        return os.path.exists(path) and os.path.getsize(path) >= RECORD_DTYPE.itemsize
+
+    def _manifest_conn(self):
+        """调用方需持有 _manifest_lock"""
+        if self._manifest is None:
+            conn = sqlite3.connect(os.path.join(self.root, MANIFEST_FILE), check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "fund_code TEXT PRIMARY KEY, first_date TEXT, last_date TEXT, rows INTEGER NOT NULL DEFAULT 0, "
+                "checksum INTEGER NOT NULL DEFAULT 0, last_fetch_at REAL, last_fetch_ok INTEGER)"
+            )
+            conn.commit()
+            self._manifest = conn
+        return self._manifest
+
+    @staticmethod
+    def _day_text(day):
+        return str(np.datetime64(int(day), 'D'))
+
+    def _file_checksum(self, fund_code):
+        """按整条记录计算分区文件内容的 CRC32"""
+        path = self._path(fund_code)
+        if not os.path.exists(path):
+            return 0
+        size = os.path.getsize(path) // RECORD_DTYPE.itemsize * RECORD_DTYPE.itemsize
+        with open(path, 'rb') as f:
+            return zlib.crc32(f.read(size))
+
+    def _set_coverage(self, fund_code, rows, first_day, last_day, checksum):
+        with self._manifest_lock:
+            conn = self._manifest_conn()
+            conn.execute(
+                "INSERT INTO coverage (fund_code, first_date, last_date, rows, checksum) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(fund_code) DO UPDATE SET first_date = excluded.first_date, last_date = excluded.last_date, "
+                "rows = excluded.rows, checksum = excluded.checksum",
+                (fund_code, self._day_text(first_day) if rows else None, self._day_text(last_day) if rows else None,
+                 rows, checksum)
+            )
+            conn.commit()
+
+    def refresh_coverage(self, fund_code):
+        """根据分区文件重新计算单个基金的清单记录"""
+        records = self._records(fund_code)
+        if len(records):
+            first_day, last_day = records['date'][0], records['date'][-1]
+        else:
+            first_day = last_day = None
+        rows = len(records)
+        del records
+        self._set_coverage(fund_code, rows, first_day, last_day, self._file_checksum(fund_code))
+
+    def _query_coverage(self, fund_code=None):
+        sql = "SELECT fund_code, first_date, last_date, rows, checksum, last_fetch_at, last_fetch_ok FROM coverage"
+        with self._manifest_lock:
+            conn = self._manifest_conn()
+            if fund_code is None:
+                rows = conn.execute(sql).fetchall()
+            else:
+                rows = conn.execute(sql + " WHERE fund_code = ?", (fund_code,)).fetchall()
+        return {
+            row[0]: {
+                'first_date': date.fromisoformat(row[1]) if row[1] else None,
+                'last_date': date.fromisoformat(row[2]) if row[2] else None,
+                'rows': row[3],
+                'checksum': row[4],
+                'last_fetch_at': row[5],
+                'last_fetch_ok': None if row[6] is None else bool(row[6]),
+            }
+            for row in rows
+        }
+
+    def coverage(self, fund_codes=None):
+        """读取清单，返回 {fund_code: {first_date, last_date, rows, checksum, last_fetch_at, last_fetch_ok}}
+
+        指定 fund_codes 时只返回这些基金；清单中缺失但已有分区文件的基金（如清单出现前写入的数据）会先补登记。
+        """
+        result = self._query_coverage()
+        if fund_codes is None:
+            return result
+        for fund_code in fund_codes:
+            if fund_code not in result and self.exists(fund_code):
+                self.refresh_coverage(fund_code)
+                result.update(self._query_coverage(fund_code))
+        return {fund_code: result[fund_code] for fund_code in fund_codes if fund_code in result}
+
+    def record_fetch(self, fund_code, ok):
+        """记录最近一次从网络抓取该基金的时间和结果"""
+        with self._manifest_lock:
+            conn = self._manifest_conn()
+            conn.execute(
+                "INSERT INTO coverage (fund_code, last_fetch_at, last_fetch_ok) VALUES (?, ?, ?) "
+                "ON CONFLICT(fund_code) DO UPDATE SET last_fetch_at = excluded.last_fetch_at, "
+                "last_fetch_ok = excluded.last_fetch_ok",
+                (fund_code, time.time(), int(bool(ok)))
+            )
+            conn.commit()
+
+    def verify(self, fund_code):
+        """校验分区文件内容与清单中的行数和校验和是否一致"""
+        entry = self._query_coverage(fund_code).get(fund_code)
+        if entry is None:
+            return False
+        records = self._records(fund_code)
+        rows = len(records)
+        del records
+        return entry['rows'] == rows and entry['checksum'] == self._file_checksum(fund_code)
+
+    def close(self):
+        with self._manifest_lock:
+            if self._manifest is not None:
+                self._manifest.close()
+                self._manifest = None
+
+    def codes(self):
+        """返回已存储的全部基金代码"""
+        return sorted(name[:-len(FILE_SUFFIX)] for name in os.listdir(self.root) if name.endswith(FILE_SUFFIX))
+
+    def _records(self, fund_code):
+        """以只读内存映射方式打开分区文件，忽略异常中断时残留的不完整记录"""
+        path = self._path(fund_code)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=RECORD_DTYPE)
+        count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    @staticmethod
+    def _to_days(dates):
+        return pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[D]').astype('<i4')
+
+    @staticmethod
+    def _to_frame(records, copy=True):
+        # copy=False 时 net_value 列直接引用内存映射（只读），日期列总需要从天数转换
+        return pd.DataFrame({
+            'date': records['date'].astype('datetime64[D]').astype('datetime64[ns]'),
+            'net_value': records['net_value'].astype(float) if copy else records['net_value'],
+        }, copy=False)
+
+    def _to_records(self, df):
+        """将 DataFrame 转成按日期升序、去重后的记录数组"""
+        df = df[['date', 'net_value']].dropna()
+        records = np.empty(len(df), dtype=RECORD_DTYPE)
+        records['date'] = self._to_days(df['date'])
+        records['net_value'] = df['net_value'].to_numpy(dtype=float)
+        records = records[np.argsort(records['date'], kind='stable')]
+        # 同一日期保留最后一条，与 drop_duplicates(keep='last') 一致
+        keep = np.append(records['date'][1:] != records['date'][:-1], True) if len(records) else np.empty(0, dtype=bool)
+        return records[keep]
+
+    def view(self, fund_code, start=None, end=None):
+        """按日期升序返回记录数组 (date 为天数, net_value)，可选只取 [start, end] 日期区间
+
+        结果是内存映射上的只读切片，不复制数据：多个进程读取同一基金时共享操作系统的页缓存，
+        只有实际访问到的页面才会被读入。
+        """
+        records = self._records(fund_code)
+        if len(records) and (start is not None or end is not None):
+            dates = records['date']
+            lo = np.searchsorted(dates, self._to_days([start])[0], side='left') if start is not None else 0
+            hi = np.searchsorted(dates, self._to_days([end])[0], side='right') if end is not None else len(records)
+            records = records[lo:hi]
+        return records
+
+    def read(self, fund_code, start=None, end=None, copy=True):
+        """读取基金净值，可选只读取 [start, end] 日期区间，返回 date/net_value 两列的 DataFrame
+
+        copy=False 时 net_value 列为内存映射上的只读视图，调用方不能原地修改；
+        视图存在期间映射及其文件描述符保持打开，只适合短期持有（不要放入 FrameCache 等长期缓存）。
+        """
+        return self._to_frame(self.view(fund_code, start, end), copy=copy)
+
+    def net_values(self, fund_code):
+        """按日期升序返回全部净值，为内存映射上的只读视图，不复制数据"""
+        return self._records(fund_code)['net_value']
+
+    def arrays(self, fund_code, tail=None):
+        """返回 (日期 datetime64[D], 净值 float64) 两个数组的副本，可选只取最后 tail 行，不构造 DataFrame"""
+        records = self._records(fund_code)
+        if tail is not None:
+            records = records[-tail:] if tail else records[:0]
+        return records['date'].astype('datetime64[D]'), np.array(records['net_value'], dtype=float)
+
+    def read_many(self, fund_codes, start=None, end=None):
+        """一次性加载多个基金，返回 {fund_code: DataFrame}，无数据的基金不包含在结果中"""
+        frames = {}
+        for fund_code in fund_codes:
+            if self.exists(fund_code):
+                frames[fund_code] = self.read(fund_code, start, end)
+        return frames
+
+    def append(self, fund_code, df):
+        """追加新数据，只写入晚于已存储最新日期的行，返回追加的行数"""
+        records = self._to_records(df)
+        stored = self._records(fund_code)
+        stored_rows = len(stored)
+        first_day = stored['date'][0] if stored_rows else None
+        if stored_rows:
+            records = records[records['date'] > stored['date'][-1]]
+        del stored
+        if not len(records):
+            return 0
+        payload = records.tobytes()
+        with open(self._path(fund_code), 'ab') as f:
+            # 先截掉异常中断留下的不完整记录，保证文件始终是整数条记录
+            f.truncate(stored_rows * RECORD_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(payload)
+
+        # 清单记录与追加前的文件一致时增量更新校验和，否则按文件重新计算
+        entry = self._query_coverage(fund_code).get(fund_code) if stored_rows else None
+        if not stored_rows or (entry is not None and entry['rows'] == stored_rows):
+            checksum = zlib.crc32(payload, entry['checksum'] if stored_rows else 0)
+            self._set_coverage(fund_code, stored_rows + len(records),
+                               first_day if stored_rows else records['date'][0], records['date'][-1], checksum)
+        else:
+            self.refresh_coverage(fund_code)
+        return len(records)
+
+    def write(self, fund_code, df):
+        """整体重写基金历史（仅用于导入或历史数据被修订的情况），通过临时文件原子替换"""
+        records = self._to_records(df)
+        path = self._path(fund_code)
+        tmp_path = f"{path}.tmp"
+        payload = records.tobytes()
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._set_coverage(fund_code, len(records), records['date'][0] if len(records) else None,
+                           records['date'][-1] if len(records) else None, zlib.crc32(payload))
+        return len(records)
+
+    def import_csv(self, csv_path, fund_code=None):
+        """导入单个旧格式 CSV 文件 (date,net_value)"""
+        fund_code = fund_code or os.path.splitext(os.path.basename(csv_path))[0]
+        df = pd.read_csv(csv_path, parse_dates=['date'])
+        return self.write(fund_code, df)
+
+    def import_csv_dir(self, csv_dir, overwrite=False):
+        """一次性导入目录下所有旧格式的 {code}.csv 文件，返回导入的基金数"""
+        imported = 0
+        for name in sorted(os.listdir(csv_dir)):
+            if not name.endswith('.csv'):
+                continue
+            fund_code = name[:-len('.csv')]
+            if not overwrite and self.exists(fund_code):
+                continue
+            try:
+                rows = self.import_csv(os.path.join(csv_dir, name), fund_code)
+                imported += 1
+                logger.info("已导入基金 %s 的 %d 行历史数据", fund_code, rows)
+            except Exception as e:
+                logger.warning("导入 %s 失败: %s", name, e)
+        return imported
+
+
+class FrameCache:
+    """
+    单次运行内共享的净值 DataFrame 缓存，按占用内存设上限，超出时淘汰最久未使用的基金。
+
+    缓存的 DataFrame 与调用方共享，调用方不应原地修改。
+    """
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._frames = OrderedDict()
+
+    def get(self, fund_code):
+        entry = self._frames.get(fund_code)
+        if entry is None:
+            return None
+        self._frames.move_to_end(fund_code)
+        return entry[0]
+
+    def put(self, fund_code, df):
+        self.invalidate(fund_code)
+        size = int(df.memory_usage(index=True, deep=False).sum())
+        if size > self.max_bytes:
+            return
+        self._frames[fund_code] = (df, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._frames.popitem(last=False)
+            self.bytes -= evicted_size
+
+    def invalidate(self, fund_code):
+        entry = self._frames.pop(fund_code, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def __len__(self):
+        return len(self._frames)
+
+
+if __name__ == '__main__':
+    # 一次性迁移: python nav_store.py [csv目录] [存储目录]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    csv_dir = sys.argv[1] if len(sys.argv) > 1 else 'fund_data'
+    store_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(csv_dir, 'store')
+    count = NavStore(store_dir).import_csv_dir(csv_dir)
+    logger.info("导入完成，共导入 %d 个基金到 %s", count, store_dir)
@@ -0,0 +1,201 @@
+"""
+MarketMonitor 行动信号阈值的参数扫描回测。
+
+用法: python param_sweep.py [--samples N] [--seed S] [--workers N] [--sort 指标] [--output 文件]
+对 fund_data/ 中的全部基金，按网格（或从网格中随机抽样）逐组替换 DEFAULT_THRESHOLDS 做回测，
+输出按指标排序的结果表。指标序列对每个基金只计算一次，各参数组只重新生成信号和模拟交易。
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from market_monitor import (
+    DATA_DIR, DEFAULT_THRESHOLDS, MarketMonitor, _backtest_indicator_series, _backtest_signal_conditions
+)
+
+logger = logging.getLogger(__name__)
+
+# 每个阈值的候选取值，未列出的阈值保持默认
+DEFAULT_GRID = {
+    'rsi_strong_buy': [30, 35, 40],
+    'rsi_weak_buy': [40, 45, 50],
+    'rsi_weak_sell': [60, 65, 70],
+    'rsi_strong_sell': [70, 75, 80],
+    'ma_strong_buy': [0.85, 0.9, 0.95],
+    'ma_avoid': [0.9, 0.95],
+    'ma_weak_buy': [0.98, 1.0, 1.02],
+    'ma_weak_sell': [1.1, 1.2],
+    'macd_buy': [0.0, 0.001],
+}
+METRICS = ['funds_traded', 'trades', 'mean_cum_return', 'median_cum_return', 'mean_sharpe_ratio', 'mean_win_rate']
+MIN_BACKTEST_ROWS = 100
+
+_UNIVERSE = None
+
+
+def load_frames():
+    """读取 DATA_DIR 下全部基金的历史净值（含尚未导入存储的旧 CSV），返回 {fund_code: DataFrame}"""
+    monitor = MarketMonitor()
+    codes = set(monitor.store.codes())
+    codes.update(name[:-len('.csv')] for name in os.listdir(DATA_DIR) if name.endswith('.csv'))
+    frames = {}
+    for fund_code in sorted(codes):
+        df = monitor._read_local_data(fund_code)
+        if not df.empty:
+            frames[fund_code] = df
+    return frames
+
+
+def prepare_universe(frames, min_rows=MIN_BACKTEST_ROWS):
+    """预先计算每个基金的指标序列，并首尾相接成一组连续数组，starts 为各基金的起始行号"""
+    codes, starts, parts = [], [], []
+    offset = 0
+    for fund_code, df in frames.items():
+        if df is None or len(df) < min_rows:
+            continue
+        net_value = df.sort_values(by='date', ascending=True)['net_value'].astype(float).reset_index(drop=True)
+        ind = _backtest_indicator_series(net_value)
+        valid = ind.notna().all(axis=1).to_numpy(copy=True)
+        valid[:26] = False
+        parts.append((net_value.to_numpy(), ind['rsi'].to_numpy(), ind['ma_ratio'].to_numpy(),
+                      ind['macd_diff'].to_numpy(), valid))
+        codes.append(fund_code)
+        starts.append(offset)
+        offset += len(net_value)
+
+    columns = ['net_value', 'rsi', 'ma_ratio', 'macd_diff', 'valid']
+    universe = {
+        name: np.concatenate([part[i] for part in parts]) if parts else np.empty(0)
+        for i, name in enumerate(columns)
+    }
+    universe['codes'] = codes
+    universe['starts'] = np.array(starts, dtype=np.int64)
+    return universe
+
+
+def evaluate(universe, thresholds):
+    """用一组阈值回测全部基金，返回汇总指标；单基金指标口径与 MarketMonitor._backtest_strategy 一致"""
+    net_value = universe['net_value']
+    starts = universe['starts']
+    n_funds = len(starts)
+    n_rows = len(net_value)
+    if not n_funds:
+        return dict.fromkeys(METRICS, np.nan)
+
+    conditions = _backtest_signal_conditions(
+        universe['rsi'], universe['ma_ratio'], universe['macd_diff'], universe['valid'], thresholds
+    )
+    is_buy = conditions[0] | conditions[1]
+    is_sell = ~is_buy & (conditions[2] | conditions[3] | conditions[4])
+
+    # 与 _simulate_trades 相同的状态机；每个基金首行强制为空仓，持仓状态不跨基金延续
+    last_event = np.select([is_buy, is_sell], [1.0, -1.0], default=np.nan)
+    last_event[starts] = -1.0
+    rows = np.arange(n_rows)
+    filled = np.maximum.accumulate(np.where(np.isnan(last_event), 0, rows))
+    holding = last_event[filled] == 1
+
+    prev_holding = np.concatenate(([False], holding[:-1]))
+    prev_holding[starts] = False
+    is_entry = holding & ~prev_holding
+    exits = np.flatnonzero(~holding & prev_holding)
+    last_entry = np.maximum.accumulate(np.where(is_entry, rows, 0))
+
+    buy_prices = net_value[last_entry[exits]]
+    returns = (net_value[exits] - buy_prices) / buy_prices
+
+    fund_of_row = np.searchsorted(starts, rows, side='right') - 1
+    exit_fund = fund_of_row[exits]
+    has_entries = np.bincount(fund_of_row[is_entry], minlength=n_funds) > 0
+    n_trades = np.bincount(exit_fund, minlength=n_funds)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(exit_fund, weights=returns, minlength=n_funds) / n_trades
+        std = np.sqrt(np.bincount(exit_fund, weights=(returns - mean[exit_fund]) ** 2, minlength=n_funds) / n_trades)
+        cum_return = np.where(n_trades > 0, np.expm1(np.bincount(exit_fund, weights=np.log1p(returns), minlength=n_funds)), 0.0)
+        win_rate = np.where(n_trades > 0, np.bincount(exit_fund, weights=(returns > 0).astype(float), minlength=n_funds) / n_trades, 0.0)
+        sharpe_ratio = np.where((n_trades > 0) & (std != 0), mean / std * np.sqrt(252), np.nan)
+
+    if not has_entries.any():
+        return {**dict.fromkeys(METRICS, np.nan), 'funds_traded': 0, 'trades': 0}
+    traded = has_entries
+    sharpe_traded = sharpe_ratio[traded]
+    return {
+        'funds_traded': int(traded.sum()),
+        'trades': int(n_trades.sum()),
+        'mean_cum_return': float(np.mean(cum_return[traded])),
+        'median_cum_return': float(np.median(cum_return[traded])),
+        'mean_sharpe_ratio': float(np.nanmean(sharpe_traded)) if np.isfinite(sharpe_traded).any() else np.nan,
+        'mean_win_rate': float(np.mean(win_rate[traded])),
+    }
+
+
+def parameter_sets(grid=None, samples=None, seed=0):
+    """展开参数网格；指定 samples 时从网格中不放回地随机抽取 samples 组"""
+    grid = grid or DEFAULT_GRID
+    names = list(grid)
+    combos = list(itertools.product(*(grid[name] for name in names)))
+    if samples is not None and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    return [{**DEFAULT_THRESHOLDS, **dict(zip(names, values))} for values in combos]
+
+
+def _init_worker(universe):
+    global _UNIVERSE
+    _UNIVERSE = universe
+
+
+def _evaluate_chunk(param_chunk):
+    return [{**params, **evaluate(_UNIVERSE, params)} for params in param_chunk]
+
+
+def run_sweep(universe, param_list, workers=None, chunk_size=None):
+    """在进程池中评估全部参数组；指标数组通过 initializer 每个进程只传递一次"""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(param_list) <= 1:
+        return [{**params, **evaluate(universe, params)} for params in param_list]
+    chunk_size = chunk_size or max(1, len(param_list) // (workers * 4))
+    chunks = [param_list[i:i + chunk_size] for i in range(0, len(param_list), chunk_size)]
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(universe,)) as executor:
+        for chunk_rows in executor.map(_evaluate_chunk, chunks):
+            rows.extend(chunk_rows)
+            logger.info("参数扫描进度: %d/%d 组", len(rows), len(param_list))
+    return rows
+
+
+def rank_results(rows, sort_by='mean_sharpe_ratio'):
+    """按指标降序排名，指标为 NaN 的参数组排在最后"""
+    df = pd.DataFrame(rows)
+    df = df.sort_values(by=[sort_by, 'mean_cum_return'], ascending=False, na_position='last', kind='stable')
+    df.insert(0, 'rank', range(1, len(df) + 1))
+    return df.reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MarketMonitor 行动信号阈值参数扫描")
+    parser.add_argument('--samples', type=int, default=None, help="从网格中随机抽取的参数组数，缺省为完整网格")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sort', default='mean_sharpe_ratio', choices=METRICS)
+    parser.add_argument('--output', default='sweep_results.csv')
+    args = parser.parse_args(argv)
+
+    frames = load_frames()
+    universe = prepare_universe(frames)
+    param_list = parameter_sets(samples=args.samples, seed=args.seed)
+    logger.info("参数扫描: %d 个基金, %d 组参数", len(universe['codes']), len(param_list))
+
+    ranked = rank_results(run_sweep(universe, param_list, workers=args.workers), args.sort)
+    ranked.to_csv(args.output, index=False, encoding='utf-8')
+    logger.info("参数扫描结果已保存到 %s，最优参数: %s", args.output, ranked.iloc[0].to_dict() if len(ranked) else None)
+    return ranked
+
+
+if __name__ == '__main__':
+    main()
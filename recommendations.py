@@ -0,0 +1,45 @@
+"""
+FundAnalyzer 与 MarketMonitor 之间的推荐清单。
+
+JSON Lines 格式，每行一个基金: {"code": "000001", "decision": "推荐", "score": 45}。
+写入和读取都逐行进行，不需要把整个文件载入内存，对基金数量没有上限。
+"""
+import json
+import math
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_MANIFEST = 'recommendations.jsonl'
+
+
+def write_manifest(path, items):
+    """把 (code, decision, score) 逐行写入清单（通过临时文件原子替换），返回写入的行数"""
+    tmp_path = f"{path}.tmp"
+    written = 0
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for code, decision, score in items:
+            if isinstance(score, float) and math.isnan(score):
+                score = None
+            f.write(json.dumps({'code': code, 'decision': decision, 'score': score}, ensure_ascii=False) + '\n')
+            written += 1
+    os.replace(tmp_path, path)
+    return written
+
+
+def read_manifest(path, decisions=None):
+    """逐行读取清单，产出 (code, decision, score)；decisions 非空时只产出这些决策的基金，无法解析的行跳过"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                code, decision, score = str(entry['code']).zfill(6), entry['decision'], entry.get('score')
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("推荐清单 %s 第 %d 行无法解析，已跳过: %s", path, line_no, e)
+                continue
+            if decisions and decision not in decisions:
+                continue
+            yield code, decision, score
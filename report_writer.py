@@ -0,0 +1,211 @@
+"""
+有界内存的流式报告写出。
+
+结果逐条从迭代器读入：各汇总表的行交给外部排序（超过内存上限的部分排好序后写入临时文件，
+最后多路归并），每个基金的详细段落先顺序写入临时文件，结束时按 前言 -> 汇总表 -> 详细段落 拼接输出。
+Markdown 表格不做列宽对齐，逐行输出；CSV / JSON Lines 输出各汇总表的行（不含详细段落）。
+"""
+import csv
+import heapq
+import json
+import math
+import os
+import pickle
+import shutil
+import tempfile
+from itertools import chain, count
+
+# 外部排序在内存中保留的最大行数
+DEFAULT_MAX_IN_MEMORY = 100000
+REPORT_FORMATS = {'.md': 'markdown', '.csv': 'csv', '.json': 'json', '.jsonl': 'json'}
+
+
+class ExternalSorter:
+    """
+    按 key 稳定排序的有界内存排序器。
+
+    add 的条目在内存中累积到 max_in_memory 条后排序并写入一个临时文件（一段），
+    迭代时对各段和内存中剩余的条目做多路归并；key 相同的条目保持加入顺序。
+    """
+    def __init__(self, key, max_in_memory=DEFAULT_MAX_IN_MEMORY):
+        self.key = key
+        self.max_in_memory = max_in_memory
+        self._buffer = []
+        self._runs = []
+        self._seq = count()
+
+    def add(self, item):
+        self._buffer.append((self.key(item), next(self._seq), item))
+        if len(self._buffer) >= self.max_in_memory:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=lambda entry: entry[:2])
+        run = tempfile.TemporaryFile()
+        for entry in self._buffer:
+            pickle.dump(entry, run, pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        self._runs.append(run)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(run):
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
+
+    def __iter__(self):
+        self._buffer.sort(key=lambda entry: entry[:2])
+        runs = [self._read_run(run) for run in self._runs] + [iter(self._buffer)]
+        for _, _, item in heapq.merge(*runs, key=lambda entry: entry[:2]):
+            yield item
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = []
+
+
+class ReportTable:
+    """
+    报告中的一张汇总表。
+
+    row(result) 返回该结果在本表中的一行（原始值列表），不属于本表时返回 None；
+    sort_key(row) 为排序键；formats 为各列的格式说明（如 '.2f'），这些列在 Markdown 中右对齐，NaN 显示为 N/A。
+    """
+    def __init__(self, title, columns, row, sort_key=None, formats=None, note='', empty_text=None):
+        self.title = title
+        self.columns = columns
+        self.row = row
+        self.sort_key = sort_key
+        self.formats = formats or {}
+        self.note = note
+        self.empty_text = empty_text
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def format_cell(value, spec=None):
+    """按格式说明把单元格转为文本，缺失值为 N/A，非数值原样输出"""
+    if _is_missing(value):
+        return 'N/A'
+    if spec and isinstance(value, (int, float)):
+        return format(value, spec)
+    return str(value)
+
+
+def _markdown_row(cells):
+    return '| ' + ' | '.join(cell.replace('|', '\\|') for cell in cells) + ' |\n'
+
+
+def _json_value(value):
+    if _is_missing(value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def report_format(path, fmt=None):
+    """由 fmt 或文件后缀确定输出格式，默认为 markdown"""
+    if fmt:
+        return fmt
+    return REPORT_FORMATS.get(os.path.splitext(path)[1].lower(), 'markdown')
+
+
+def write_report(path, results, tables, preamble='', section=None, sections_title='', fmt=None,
+                 max_in_memory=DEFAULT_MAX_IN_MEMORY):
+    """
+    从结果迭代器流式写出报告（通过临时文件原子替换），返回处理的结果条数。
+
+    preamble 为报告开头的文本；section(result) 返回每个结果的详细段落，按输入顺序写在 sections_title 之后。
+    二者都只用于 Markdown。
+    """
+    fmt = report_format(path, fmt)
+    sorters = [ExternalSorter(table.sort_key or (lambda row: 0), max_in_memory) for table in tables]
+    sections = tempfile.TemporaryFile('w+', encoding='utf-8') if fmt == 'markdown' and section else None
+    tmp_path = f"{path}.tmp"
+    processed = 0
+    try:
+        for result in results:
+            processed += 1
+            for table, sorter in zip(tables, sorters):
+                row = table.row(result)
+                if row is not None:
+                    sorter.add(row)
+            if sections is not None:
+                sections.write(section(result))
+
+        with open(tmp_path, 'w', encoding='utf-8', newline='' if fmt == 'csv' else None) as f:
+            if fmt == 'markdown':
+                _write_markdown(f, tables, sorters, preamble, sections_title, sections)
+            elif fmt == 'csv':
+                _write_csv(f, tables, sorters)
+            elif fmt == 'json':
+                _write_json_lines(f, tables, sorters)
+            else:
+                raise ValueError(f"未知的报告格式 {fmt}，可选: {sorted(set(REPORT_FORMATS.values()))}")
+        os.replace(tmp_path, path)
+    finally:
+        for sorter in sorters:
+            sorter.close()
+        if sections is not None:
+            sections.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return processed
+
+
+def _write_markdown(f, tables, sorters, preamble, sections_title, sections):
+    f.write(preamble)
+    for table, sorter in zip(tables, sorters):
+        if table.title:
+            f.write(table.title)
+        if table.note:
+            f.write(table.note)
+        rows = iter(sorter)
+        first = next(rows, None)
+        if first is None and table.empty_text is not None:
+            f.write(table.empty_text)
+            continue
+        f.write(_markdown_row(table.columns))
+        # 带数值格式的列右对齐，其余左对齐
+        f.write('|' + '|'.join('---:' if column in table.formats else ':---' for column in table.columns) + '|\n')
+        if first is not None:
+            for row in chain([first], rows):
+                f.write(_markdown_row(
+                    [format_cell(value, table.formats.get(column)) for column, value in zip(table.columns, row)]
+                ))
+        f.write('\n')
+    if sections is not None:
+        f.write(sections_title)
+        sections.seek(0)
+        shutil.copyfileobj(sections, f)
+
+
+def _write_csv(f, tables, sorters):
+    # 多张表写入同一个文件时增加“表”列区分
+    with_table = len(tables) > 1
+    columns = list(dict.fromkeys(column for table in tables for column in table.columns))
+    writer = csv.writer(f)
+    writer.writerow((['表'] if with_table else []) + columns)
+    for table, sorter in zip(tables, sorters):
+        for row in sorter:
+            values = dict(zip(table.columns, row))
+            cells = ['' if _is_missing(values.get(column)) else values.get(column) for column in columns]
+            writer.writerow(([table.title.strip().lstrip('#').strip()] if with_table else []) + cells)
+
+
+def _write_json_lines(f, tables, sorters):
+    with_table = len(tables) > 1
+    for table, sorter in zip(tables, sorters):
+        for row in sorter:
+            record = {column: _json_value(value) for column, value in zip(table.columns, row)}
+            if with_table:
+                record = {'表': table.title.strip().lstrip('#').strip(), **record}
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -0,0 +1,171 @@
+"""
+多基金向量化风险指标引擎。
+
+把多个基金的净值序列按日期对齐为 日期×基金 的矩阵（缺失处为 NaN），批量计算全部基金的
+年化收益、年化波动率、夏普比率、索提诺比率、最大回撤、卡玛比率、滚动波动率和相对基准的贝塔。
+收益率只在相邻两个有效净值之间计算，与对单个基金 dropna 后 pct_change 的口径一致。
+基金按固定列数分块计算，各块共用全部基金的日期轴，结果与不分块时相同，内存只与块大小成正比。
+"""
+import numpy as np
+
+TRADING_DAYS = 252
+ROLLING_WINDOW = 20
+# 每块基金数：5000 个交易日时每块矩阵约 10 MB
+CHUNK_FUNDS = 256
+RISK_FIELDS = ('latest_nav', 'observations', 'annual_return', 'annual_volatility', 'sharpe_ratio', 'sortino_ratio',
+               'max_drawdown', 'calmar_ratio', 'rolling_volatility', 'beta')
+
+
+def _fund_dates(s):
+    return np.asarray(s.index.values).astype('datetime64[D]')
+
+
+def date_axis(series, chunk_size=CHUNK_FUNDS):
+    """全部基金日期的并集（升序），按块合并，不一次拼接所有基金的日期"""
+    dates = np.empty(0, dtype='datetime64[D]')
+    values = list(series.values())
+    for start in range(0, len(values), chunk_size):
+        chunk = [_fund_dates(s) for s in values[start:start + chunk_size]]
+        dates = np.union1d(dates, np.concatenate(chunk))
+    return dates
+
+
+def align_navs(series, dates=None):
+    """把 {fund_code: 以日期为索引的净值 Series} 对齐到共同的日期轴，返回 (dates, codes, 日期×基金矩阵)
+
+    dates 缺省时取这些基金日期的并集；传入时必须包含全部基金的日期。
+    """
+    codes = list(series)
+    date_arrays = [_fund_dates(s) for s in series.values()]
+    if dates is None:
+        dates = np.unique(np.concatenate(date_arrays)) if date_arrays else np.empty(0, dtype='datetime64[D]')
+    matrix = np.full((len(dates), len(codes)), np.nan)
+    for j, (fund_dates, s) in enumerate(zip(date_arrays, series.values())):
+        matrix[np.searchsorted(dates, fund_dates), j] = np.asarray(s, dtype=float)
+    return dates, codes, matrix
+
+
+def align_benchmark(dates, benchmark):
+    """把以日期为索引的基准点位 Series 对齐到 dates，基准没有数据的日期为 NaN"""
+    aligned = np.full(len(dates), np.nan)
+    bench_dates = np.asarray(benchmark.index.values).astype('datetime64[D]')
+    positions = np.searchsorted(dates, bench_dates)
+    inside = positions < len(dates)
+    inside[inside] = dates[positions[inside]] == bench_dates[inside]
+    aligned[positions[inside]] = np.asarray(benchmark, dtype=float)[inside]
+    return aligned
+
+
+def _ffill(matrix):
+    """沿日期方向用上一个有效值填充 NaN，首个有效值之前保持 NaN"""
+    rows = np.arange(len(matrix)).reshape(-1, *([1] * (matrix.ndim - 1)))
+    last_valid = np.maximum.accumulate(np.where(np.isnan(matrix), 0, rows), axis=0)
+    return np.take_along_axis(matrix, last_valid, axis=0)
+
+
+def nav_returns(matrix):
+    """逐列计算相邻两个有效净值之间的收益率，非交易日（净值缺失）为 NaN"""
+    previous = np.empty_like(matrix)
+    previous[:1] = np.nan
+    previous[1:] = _ffill(matrix)[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return matrix / previous - 1
+
+
+def _masked_mean(values, mask, count):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mask, values, 0.0).sum(axis=0) / count
+
+
+def rolling_volatility(returns, window=ROLLING_WINDOW, periods=TRADING_DAYS):
+    """最近 window 个日期内的年化波动率矩阵（样本标准差），窗口内有效收益少于 2 个时为 NaN"""
+    valid = ~np.isnan(returns)
+    filled = np.where(valid, returns, 0.0)
+    zeros = np.zeros((1,) + returns.shape[1:])
+    sums = [np.concatenate([zeros, np.cumsum(a, axis=0)]) for a in (valid.astype(float), filled, filled ** 2)]
+    # 前 window-1 行的窗口从第 0 行开始
+    count, total, squares = (
+        np.concatenate([s[1:window] - s[:1], s[window:] - s[:-window]]) for s in sums
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - total ** 2 / count) / (count - 1)
+    return np.where(count >= 2, np.sqrt(np.maximum(variance, 0.0)) * np.sqrt(periods), np.nan)
+
+
+def compute_risk_metrics(matrix, risk_free_rate=0.0, benchmark=None, window=ROLLING_WINDOW, periods=TRADING_DAYS):
+    """
+    对 日期×基金 净值矩阵一次计算全部风险指标，返回 {指标名: 每个基金一个值的数组}。
+
+    benchmark 为已对齐到同一日期轴的基准点位数组（见 align_benchmark），缺省时 beta 为 NaN。
+    年化波动率为零时夏普比率记为 0；下行波动率或最大回撤为零时对应比率为 NaN。
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    n_funds = matrix.shape[1]
+    returns = nav_returns(matrix)
+    valid = ~np.isnan(returns)
+    count = valid.sum(axis=0)
+
+    mean = _masked_mean(returns, valid, count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(valid, (returns - mean) ** 2, 0.0).sum(axis=0) / (count - 1)
+        annual_return = mean * periods
+        annual_volatility = np.where(count >= 2, np.sqrt(variance) * np.sqrt(periods), np.nan)
+        sharpe_ratio = np.where(annual_volatility != 0, (annual_return - risk_free_rate) / annual_volatility, 0.0)
+        sharpe_ratio = np.where(count >= 2, sharpe_ratio, np.nan)
+
+        downside = np.sqrt(_masked_mean(np.minimum(returns, 0.0) ** 2, valid, count)) * np.sqrt(periods)
+        sortino_ratio = np.where(downside > 0, (annual_return - risk_free_rate) / downside, np.nan)
+
+        running_max = np.fmax.accumulate(matrix, axis=0)
+        drawdown = (matrix - running_max) / running_max
+        has_nav = ~np.isnan(matrix)
+        max_drawdown = np.where(has_nav.any(axis=0), 0.0 - np.where(has_nav, drawdown, np.inf).min(axis=0), np.nan)
+        calmar_ratio = np.where(max_drawdown > 0, annual_return / max_drawdown, np.nan)
+
+    latest = _ffill(matrix)[-1] if len(matrix) else np.full(n_funds, np.nan)
+    # 最新的滚动波动率只依赖最后 window 行
+    rolling = rolling_volatility(returns[-window:], window, periods)[-1] if len(matrix) else np.full(n_funds, np.nan)
+
+    beta = np.full(n_funds, np.nan)
+    if benchmark is not None and len(matrix):
+        bench_returns = nav_returns(np.asarray(benchmark, dtype=float)[:, None])
+        paired = valid & ~np.isnan(bench_returns)
+        pair_count = paired.sum(axis=0)
+        fund_mean = _masked_mean(returns, paired, pair_count)
+        bench_mean = _masked_mean(np.broadcast_to(bench_returns, returns.shape), paired, pair_count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = np.where(paired, (returns - fund_mean) * (bench_returns - bench_mean), 0.0).sum(axis=0)
+            bench_variance = np.where(paired, (bench_returns - bench_mean) ** 2, 0.0).sum(axis=0)
+            beta = np.where((pair_count >= 2) & (bench_variance > 0), covariance / bench_variance, np.nan)
+
+    return {
+        'latest_nav': latest,
+        'observations': has_nav.sum(axis=0) if len(matrix) else np.zeros(n_funds, dtype=int),
+        'annual_return': annual_return,
+        'annual_volatility': annual_volatility,
+        'sharpe_ratio': sharpe_ratio,
+        'sortino_ratio': sortino_ratio,
+        'max_drawdown': max_drawdown,
+        'calmar_ratio': calmar_ratio,
+        'rolling_volatility': rolling,
+        'beta': beta,
+    }
+
+
+def fund_risk_metrics(series, risk_free_rate=0.0, benchmark=None, window=ROLLING_WINDOW, periods=TRADING_DAYS,
+                      chunk_size=CHUNK_FUNDS):
+    """对齐 {fund_code: 净值 Series} 并按每块 chunk_size 个基金批量计算，返回 {fund_code: {指标名: float}}"""
+    if not series:
+        return {}
+    dates = date_axis(series, chunk_size)
+    aligned_benchmark = align_benchmark(dates, benchmark) if benchmark is not None else None
+    codes = list(series)
+    metrics = {}
+    for start in range(0, len(codes), chunk_size):
+        chunk = {code: series[code] for code in codes[start:start + chunk_size]}
+        _, chunk_codes, matrix = align_navs(chunk, dates)
+        results = compute_risk_metrics(matrix, risk_free_rate, aligned_benchmark, window, periods)
+        del matrix
+        columns = [results[field].tolist() for field in RISK_FIELDS]
+        metrics.update((code, dict(zip(RISK_FIELDS, values))) for code, values in zip(chunk_codes, zip(*columns)))
+    return metrics
@@ -0,0 +1,94 @@
+import json
+import os
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(entry):
+    """净值历史的指纹：覆盖范围清单中的行数、最新日期和校验和，历史有任何变化都会改变"""
+    if not entry:
+        return None
+    last_date = entry['last_date']
+    return [entry['rows'], last_date.isoformat() if last_date else None, entry['checksum']]
+
+
+def _codes_digest(fund_codes):
+    return zlib.crc32('\n'.join(fund_codes).encode('utf-8'))
+
+
+class RunResults:
+    """
+    上一次监控运行中各基金的指标结果和回测结果。
+
+    每条结果都记录计算时净值历史的指纹，指纹不变的基金可以直接沿用上次的结果；
+    阈值变化后全部结果作废。另外记录上次写出各输出文件时的基金列表，
+    用于判断在没有任何基金变化时能否跳过重写。
+    """
+    def __init__(self, path, thresholds, funds=None, outputs=None):
+        self.path = path
+        self.thresholds = thresholds
+        self.funds = funds or {}
+        self.outputs = outputs or {}
+        self.changed = set()
+
+    @classmethod
+    def load(cls, path, thresholds):
+        """读取上次的结果，文件不存在、损坏或阈值不同时返回空结果"""
+        if not os.path.exists(path):
+            return cls(path, thresholds)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning("读取上次运行结果 %s 失败，将全部重新计算: %s", path, e)
+            return cls(path, thresholds)
+        if data.get('thresholds') != thresholds:
+            logger.info("信号阈值已变化，上次运行结果作废")
+            return cls(path, thresholds)
+        return cls(path, thresholds, data.get('funds'), data.get('outputs'))
+
+    def _get(self, fund_code, kind, entry):
+        record = self.funds.get(fund_code, {}).get(kind)
+        if record is not None and entry is not None and record['fingerprint'] == fingerprint(entry):
+            return True, record['result']
+        return False, None
+
+    def _set(self, fund_code, kind, entry, result):
+        self.funds.setdefault(fund_code, {})[kind] = {'fingerprint': fingerprint(entry), 'result': result}
+        self.changed.add(kind)
+
+    def mark_changed(self, kind):
+        """本次有未能沿用、也不保存的结果（如抓取失败），对应的输出文件需要重写"""
+        self.changed.add(kind)
+
+    def indicators(self, fund_code, entry):
+        """净值历史未变时返回上次的指标结果，否则返回 None"""
+        return self._get(fund_code, 'indicators', entry)[1]
+
+    def set_indicators(self, fund_code, entry, result):
+        self._set(fund_code, 'indicators', entry, result)
+
+    def backtest(self, fund_code, entry):
+        """返回 (是否可沿用, 上次的回测结果)，数据不足的基金上次结果为 None"""
+        return self._get(fund_code, 'backtest', entry)
+
+    def set_backtest(self, fund_code, entry, result):
+        self._set(fund_code, 'backtest', entry, result)
+
+    def output_unchanged(self, kind, path, fund_codes):
+        """本次运行 kind 类结果没有变化，且 path 是上次用同一基金列表写出的，可以跳过重写"""
+        previous = self.outputs.get(path)
+        return (kind not in self.changed and os.path.exists(path) and previous is not None
+                and previous == _codes_digest(fund_codes))
+
+    def record_output(self, path, fund_codes):
+        self.outputs[path] = _codes_digest(fund_codes)
+
+    def save(self):
+        """通过临时文件原子写入"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'thresholds': self.thresholds, 'funds': self.funds, 'outputs': self.outputs}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
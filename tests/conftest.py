@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+class LsjzServer:
+    """模拟 F10DataApi lsjz 接口：按日期倒序分页返回 content:"..." / pages:N 内容
+
+    slow_pages 中的页延迟 delay 秒返回，fail_pages 中的页返回 404。
+    """
+    def __init__(self, rows, slow_pages=(), fail_pages=(), delay=2.0):
+        self.history = pd.DataFrame({
+            'date': pd.bdate_range(end='2025-09-30', periods=rows)[::-1],
+            'net_value': np.round(1 + np.arange(rows)[::-1] * 0.001, 4),
+        })
+        self.slow_pages = set(slow_pages)
+        self.fail_pages = set(fail_pages)
+        self.delay = delay
+        self.requested = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                page, per = int(query['page'][0]), int(query['per'][0])
+                with server._lock:
+                    server.requested.append(page)
+                if page in server.slow_pages:
+                    time.sleep(server.delay)
+                if page in server.fail_pages:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.payload(page, per).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/F10DataApi.aspx"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def payload(self, page, per):
+        pages = -(-len(self.history) // per)
+        chunk = self.history.iloc[(page - 1) * per:page * per]
+        if chunk.empty:
+            content = "暂无数据"
+        else:
+            rows = ''.join(
+                f"<tr><td>{d:%Y-%m-%d}</td><td class='tor bold'>{v:.4f}</td><td class='tor bold'>{v:.4f}</td></tr>"
+                for d, v in zip(chunk['date'], chunk['net_value'])
+            )
+            content = f"<table class='w782 comm lsjz'><thead><tr><th>净值日期</th><th>单位净值</th></tr></thead><tbody>{rows}</tbody></table>"
+        return f'var apidata={{ content:"{content}",records:{len(self.history)},pages:{pages},curpage:{page}}};'
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def lsjz_server():
+    servers = []
+
+    def start(*args, **kwargs):
+        server = LsjzServer(*args, **kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pandas as pd
+import pytest
+import requests
+
+from async_fetcher import AsyncNavFetcher
+from http_client import HttpClient
+
+
+def _fetcher(server, **options):
+    client = HttpClient(rate=200.0, max_rate=500.0, retry_base_delay=0.01)
+    return AsyncNavFetcher(base_url=server.url, client=client, **options)
+
+
+def _run(coro):
+    """运行协程，并返回结束时仍未完成的其他任务数"""
+    async def main():
+        result = await coro
+        await asyncio.sleep(0)
+        leftover = [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+        return result, len(leftover)
+    return asyncio.run(main())
+
+
+def test_fetch_new_rows_paginates_until_total_pages(lsjz_server):
+    server = lsjz_server(rows=50)
+    fetcher = _fetcher(server)
+    frames, leftover = _run(fetcher.fetch_new_rows('000001', None, max_pages=10, per=20))
+    assert [len(frame) for frame in frames] == [20, 20, 10]
+    # pages:3 之后不再请求第 4 页
+    assert sorted(server.requested) == [1, 2, 3]
+    combined = pd.concat(frames)
+    assert combined['date'].tolist() == server.history['date'].tolist()
+    assert leftover == 0
+
+
+def test_fetch_new_rows_stops_at_local_data(lsjz_server):
+    server = lsjz_server(rows=200)
+    latest_local_date = server.history['date'].iloc[30].date()
+    fetcher = _fetcher(server, prefetch=1)
+    frames, _ = _run(fetcher.fetch_new_rows('000001', latest_local_date, max_pages=10, per=20))
+    # 第 2 页部分为新数据（len(new_df) < len(df)），在此停止
+    assert [len(frame) for frame in frames] == [20, 10]
+    assert pd.concat(frames)['date'].min().date() > latest_local_date
+    assert sorted(server.requested) == [1, 2]
+
+
+def test_fetch_new_rows_stops_on_page_without_new_rows(lsjz_server):
+    server = lsjz_server(rows=200)
+    fetcher = _fetcher(server, prefetch=1)
+    frames, _ = _run(fetcher.fetch_new_rows('000001', server.history['date'].iloc[0].date(), per=20))
+    assert frames == []
+    assert server.requested == [1]
+
+
+def test_fetch_new_rows_cancels_prefetched_pages(lsjz_server):
+    server = lsjz_server(rows=200, slow_pages={3, 4})
+    latest_local_date = server.history['date'].iloc[30].date()
+    fetcher = _fetcher(server, prefetch=3)
+    started = time.monotonic()
+    frames, leftover = _run(fetcher.fetch_new_rows('000001', latest_local_date, max_pages=10, per=20))
+    # 第 2 页已衔接本地数据，预取的第 3、4 页被取消，不等待其返回
+    assert [len(frame) for frame in frames] == [20, 10]
+    assert time.monotonic() - started < server.delay
+    assert leftover == 0
+
+
+def test_fetch_all_rows_fetches_every_page(lsjz_server):
+    server = lsjz_server(rows=130)
+    fetcher = _fetcher(server)
+    frames, leftover = _run(fetcher.fetch_all_rows('000001', per=20))
+    combined = pd.concat(frames)
+    assert len(frames) == 7
+    assert combined['date'].tolist() == server.history['date'].tolist()
+    assert sorted(server.requested) == list(range(1, 8))
+    assert leftover == 0
+
+
+def test_fetch_all_rows_raises_and_cancels_siblings(lsjz_server):
+    server = lsjz_server(rows=200, slow_pages={4, 5, 6}, fail_pages={3})
+    fetcher = _fetcher(server)
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.HTTPError):
+        _run(fetcher.fetch_all_rows('000001', per=20))
+    assert time.monotonic() - started < server.delay
+
+
+def test_fetch_all_rows_leaves_no_pending_tasks_on_failure(lsjz_server):
+    server = lsjz_server(rows=200, slow_pages={4, 5, 6}, fail_pages={3})
+    fetcher = _fetcher(server)
+
+    async def main():
+        with pytest.raises(requests.exceptions.HTTPError):
+            await fetcher.fetch_all_rows('000001', per=20)
+        await asyncio.sleep(0)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+
+    assert asyncio.run(main()) == []
@@ -0,0 +1,154 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR
+import market_monitor
+
+FUND_CSVS = sorted(glob.glob(os.path.join(REPO_DIR, 'fund_data', '*.csv')))
+BUY_SIGNALS = ["强买入", "弱买入"]
+SELL_SIGNALS = ["强卖出/规避", "弱卖出/规避"]
+
+
+def _prefix_indicators(net_value):
+    """原 _backtest_strategy 循环体中对前缀 net_value 计算的指标，取最后一行"""
+    exp12 = net_value.ewm(span=12, adjust=False).mean()
+    exp26 = net_value.ewm(span=26, adjust=False).mean()
+    macd = exp12 - exp26
+    signal = macd.ewm(span=9, adjust=False).mean()
+    macd_diff = macd - signal
+
+    delta = net_value.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=14, min_periods=1).mean()
+    avg_loss = loss.rolling(window=14, min_periods=1).mean()
+    rs = avg_gain / avg_loss.replace(0, np.nan)
+    rsi = 100 - (100 / (1 + rs))
+    ma50 = net_value.rolling(window=min(50, len(net_value)), min_periods=1).mean()
+    return rsi, net_value / ma50, macd_diff
+
+
+def _reference_signals(net_value):
+    """原实现的逐行 if/elif 信号链
+
+    原循环在第 i 行对 iloc[:i+1] 重算全部指标；这些指标都是因果的，
+    因此这里在整段序列上算一次再逐行取值（等价性由 test_prefix_indicators_are_causal 保证），
+    避免参考实现本身 O(n²) 拖慢测试。
+    """
+    rsi, ma_ratio, macd_diff = _prefix_indicators(net_value)
+    signals = ["持有/观察"] * len(net_value)
+    for i in range(26, len(net_value)):
+        r, m, d = rsi.iloc[i], ma_ratio.iloc[i], macd_diff.iloc[i]
+        if not np.isnan(r) and not np.isnan(m) and not np.isnan(d):
+            if r < 35 and m < 0.9 and d > 0:
+                signals[i] = "强买入"
+            elif r < 45 or m < 1:
+                signals[i] = "弱买入"
+            elif m < 0.95:
+                signals[i] = "强卖出/规避"
+            elif r > 70 and m > 1.2 and d < 0:
+                signals[i] = "强卖出/规避"
+            elif r > 65 or m > 1.2:
+                signals[i] = "弱卖出/规避"
+    return signals
+
+
+def _reference_backtest(df):
+    """原 MarketMonitor._backtest_strategy 的逐行持仓状态机与汇总指标"""
+    if df is None or df.empty or len(df) < 100:
+        return [], {"cum_return": np.nan, "max_drawdown": np.nan, "sharpe_ratio": np.nan, "win_rate": np.nan}
+
+    df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
+    df['return'] = df['net_value'].pct_change()
+    signals = _reference_signals(df['net_value'])
+
+    position = 0
+    buy_price = 0
+    trades = []
+    for i in range(1, len(df)):
+        signal = signals[i]
+        if signal in BUY_SIGNALS and position == 0:
+            position = 1
+            buy_price = df.loc[i, 'net_value']
+            trades.append({'buy_index': i, 'buy_price': buy_price})
+        elif signal in SELL_SIGNALS and position == 1:
+            sell_price = df.loc[i, 'net_value']
+            trades[-1]['sell_index'] = i
+            trades[-1]['return'] = (sell_price - buy_price) / buy_price
+            position = 0
+
+    if trades:
+        returns = [trade['return'] for trade in trades if 'return' in trade]
+        cum_return = np.prod([1 + r for r in returns]) - 1 if returns else 0
+        win_rate = len([r for r in returns if r > 0]) / len(returns) if returns else 0
+        equity = pd.Series(np.cumprod([1 + r for r in df['return'].fillna(0)]))
+        max_drawdown = (equity / equity.cummax() - 1).min()
+        sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if returns and np.std(returns) != 0 else np.nan
+    else:
+        cum_return = max_drawdown = sharpe_ratio = win_rate = np.nan
+
+    return trades, {"cum_return": cum_return, "max_drawdown": max_drawdown,
+                    "sharpe_ratio": sharpe_ratio, "win_rate": win_rate}
+
+
+def _load(path, tail):
+    df = pd.read_csv(path, parse_dates=['date']).sort_values('date').reset_index(drop=True)
+    return df.tail(tail).reset_index(drop=True) if tail else df
+
+
+@pytest.mark.parametrize('tail', [None, 150], ids=['full', 'tail150'])
+@pytest.mark.parametrize('path', FUND_CSVS, ids=[os.path.basename(p)[:-4] for p in FUND_CSVS])
+def test_vectorized_backtest_matches_original_loop(path, tail):
+    df = _load(path, tail)
+    trades, expected = _reference_backtest(df)
+
+    monitor = market_monitor.MarketMonitor.__new__(market_monitor.MarketMonitor)
+    monitor.thresholds = dict(market_monitor.DEFAULT_THRESHOLDS)
+    actual = monitor._backtest_strategy(os.path.basename(path)[:-4], df)
+    for key, value in expected.items():
+        np.testing.assert_allclose(actual[key], value, rtol=1e-12, equal_nan=True, err_msg=key)
+
+    if len(df) < 100:
+        return
+    net_value = df['net_value'].astype(float)
+    signals = market_monitor._backtest_signal_series(net_value, market_monitor.DEFAULT_THRESHOLDS)
+    assert signals.tolist() == _reference_signals(net_value)
+
+    entries, exits, returns = market_monitor._simulate_trades(net_value.to_numpy(), signals.to_numpy())
+    assert entries.tolist() == [t['buy_index'] for t in trades]
+    assert exits.tolist() == [t['sell_index'] for t in trades if 'sell_index' in t]
+    np.testing.assert_allclose(returns, [t['return'] for t in trades if 'return' in t], rtol=1e-12)
+
+
+@pytest.mark.parametrize('path', FUND_CSVS[::50], ids=[os.path.basename(p)[:-4] for p in FUND_CSVS[::50]])
+def test_prefix_indicators_are_causal(path):
+    """原循环对每个前缀重算指标；整段一次性计算后第 i 行必须与之一致"""
+    net_value = _load(path, 150)['net_value'].astype(float)
+    full = _prefix_indicators(net_value)
+    for i in range(26, len(net_value)):
+        prefix = _prefix_indicators(net_value.iloc[:i + 1])
+        for whole, part in zip(full, prefix):
+            np.testing.assert_allclose(whole.iloc[i], part.iloc[-1], rtol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize('workers', [2, 4])
+def test_parallel_backtest_output_matches_single_process(tmp_path, monkeypatch, workers):
+    monkeypatch.chdir(tmp_path)
+    monitor = market_monitor.MarketMonitor(delta=False)
+    csvs = FUND_CSVS[:30]
+    for path in csvs:
+        monitor.store.import_csv(path, os.path.basename(path)[:-4])
+    # 包含数据不足的基金和无数据的基金，打乱顺序以确认结果按 fund_codes 顺序写出
+    monitor.fund_codes = [os.path.basename(path)[:-4] for path in csvs[::-1]] + ['999999']
+
+    outputs = []
+    for n in (1, workers):
+        monitor.perform_backtest(workers=n, chunk_size=3)
+        with open(market_monitor.BACKTEST_RESULTS_FILE, 'rb') as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count(b'\n') == len(monitor.fund_codes) + 1
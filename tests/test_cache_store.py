@@ -0,0 +1,44 @@
+import json
+import sqlite3
+
+from cache_store import KeyedCache
+
+
+def _count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_eviction_keeps_running_count(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = KeyedCache(path, max_entries=10)
+    for i in range(25):
+        cache.set('fund', f"{i:06d}", {'i': i})
+        # 覆盖已有条目不增加条目数
+        cache.set('fund', f"{i:06d}", {'i': i, 'again': True})
+    assert _count(path) == 10
+    assert cache._count == 10
+    # 淘汰的是最早写入的条目
+    assert sorted(cache.keys('fund')) == [f"{i:06d}" for i in range(15, 25)]
+
+    cache.delete('fund', '000024')
+    cache.delete('fund', 'missing')
+    assert cache._count == 9
+    cache.close()
+
+    reopened = KeyedCache(path, max_entries=10)
+    assert reopened._count == 9
+    reopened.set('fund', 'new', 1)
+    reopened.set('fund', 'newer', 2)
+    assert _count(path) == 10
+    reopened.close()
+
+
+def test_legacy_import_is_bounded(tmp_path):
+    legacy = tmp_path / 'fund_cache.json'
+    legacy.write_text(json.dumps({'fund': {str(i): i for i in range(30)}}), encoding='utf-8')
+    path = str(tmp_path / 'cache.sqlite')
+    cache = KeyedCache(path, legacy_json=str(legacy), max_entries=20)
+    assert _count(path) == 20
+    assert cache._count == 20
+    cache.close()
@@ -0,0 +1,131 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_monitor
+from compact_navs import FAILED_NET_VALUE, CompactNavs, IndicatorResults
+from conftest import REPO_DIR
+from nav_store import NavStore
+
+
+def _history(rows, seed, end='2025-09-30'):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'date': pd.bdate_range(end=end, periods=rows),
+        'net_value': np.round(1 + np.cumsum(rng.normal(0, 0.01, rows)), 4),
+    })
+
+
+@pytest.fixture
+def frames():
+    # 行数、结束日期各不相同，其中一个基金没有数据
+    return {
+        '000001': _history(5, 1),
+        '000002': _history(3, 2, end='2025-09-26'),
+        '000003': _history(0, 3),
+        '000004': _history(8, 4, end='2025-09-29'),
+    }
+
+
+def test_layout_and_accessors(frames):
+    navs = CompactNavs.from_frames(frames)
+    assert len(navs) == 4 and list(navs) == list(frames)
+    assert '000003' in navs and '000005' not in navs
+    assert navs.offsets.tolist() == [0, 5, 8, 8, 16]
+    assert [navs.rows(code) for code in navs] == [5, 3, 0, 8]
+
+    all_dates = np.unique(np.concatenate([df['date'].to_numpy('datetime64[D]') for df in frames.values()]))
+    np.testing.assert_array_equal(navs.dates, all_dates)
+    assert navs.date_pos.dtype == np.uint8
+    for fund_code, df in frames.items():
+        np.testing.assert_array_equal(navs.fund_dates(fund_code), df['date'].to_numpy('datetime64[D]'))
+        np.testing.assert_array_equal(navs.net_values(fund_code), df['net_value'].to_numpy(np.float32))
+        pd.testing.assert_frame_equal(
+            navs.frame(fund_code),
+            df.assign(date=df['date'].astype('datetime64[ns]'), net_value=df['net_value'].astype(np.float32).astype(float)),
+        )
+    with pytest.raises(ValueError):
+        navs.net_values('000001')[0] = 2.0
+
+
+def test_bottom_aligned_pads_short_histories(frames):
+    navs = CompactNavs.from_frames(frames, dtype=float)
+    codes = ['000001', '000002', '000004']
+    matrix, lengths = navs.bottom_aligned(codes)
+    assert matrix.shape == (8, 3) and lengths.tolist() == [5, 3, 8]
+    for j, fund_code in enumerate(codes):
+        values = frames[fund_code]['net_value'].to_numpy()
+        assert np.isnan(matrix[:8 - len(values), j]).all()
+        np.testing.assert_array_equal(matrix[8 - len(values):, j], values)
+
+    matrix, lengths = navs.bottom_aligned(codes, tail=4)
+    assert matrix.shape == (4, 3) and lengths.tolist() == [4, 3, 4]
+    np.testing.assert_array_equal(matrix[:, 0], frames['000001']['net_value'].to_numpy()[-4:])
+    assert np.isnan(matrix[0, 1])
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('tail', [None, 4])
+def test_from_store_round_trip(tmp_path, frames, dtype, tail):
+    store = NavStore(str(tmp_path / 'store'))
+    codes = [fund_code for fund_code, df in frames.items() if len(df)]
+    for fund_code in codes:
+        store.write(fund_code, frames[fund_code])
+
+    navs = CompactNavs.from_store(store, codes, tail=tail, dtype=dtype)
+    assert navs.values.dtype == dtype
+    for fund_code in codes:
+        df = store.read(fund_code)
+        if tail is not None:
+            df = df.tail(tail)
+        np.testing.assert_array_equal(navs.fund_dates(fund_code), df['date'].to_numpy('datetime64[D]'))
+        np.testing.assert_array_equal(navs.net_values(fund_code), df['net_value'].to_numpy(dtype))
+
+
+def test_indicator_results_behaves_like_dict():
+    results = IndicatorResults(capacity=1)
+    expected = {}
+    for i in range(5):
+        fund_code = f"{i:06d}"
+        expected[fund_code] = market_monitor._indicator_result(
+            fund_code, 1.0 + i, 30.0 + i, 0.9, -0.01 * i, 1.2, 0.8, "观察", "持有/观察"
+        )
+    expected['000002'] = market_monitor.MarketMonitor._failed_indicator_result('000002')
+    results.update(expected)
+    # 覆盖已有基金时不新增条目
+    results['000004'] = expected['000004'] = {**expected['000004'], 'rsi': np.nan, 'advice': "可分批买入"}
+
+    assert len(results) == 5 and list(results) == results.keys() == list(expected)
+    assert '000004' in results and '000009' not in results
+    assert results.get('000009') is None and results.get('000009', 'x') == 'x'
+    assert results['000002']['latest_net_value'] == FAILED_NET_VALUE
+    for fund_code, result in results.items():
+        assert result.keys() == expected[fund_code].keys()
+        for key, value in expected[fund_code].items():
+            if isinstance(value, float) and np.isnan(value):
+                assert np.isnan(result[key]), (fund_code, key)
+            else:
+                assert result[key] == value, (fund_code, key)
+    assert len(results.table()) == 5
+
+
+def test_indicators_from_compact_navs_match_frames(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monitor = market_monitor.MarketMonitor(delta=False)
+    frames = {
+        os.path.basename(path)[:-4]: pd.read_csv(path, parse_dates=['date']).sort_values('date').tail(100)
+        for path in sorted(glob.glob(os.path.join(REPO_DIR, 'fund_data', '*.csv')))
+    }
+    expected = monitor._calculate_indicators_batch(frames)
+    # get_fund_data 的紧凑容器保留 float64 净值，指标与按 DataFrame 计算完全一致
+    actual = monitor._calculate_indicators_batch(CompactNavs.from_frames(frames, dtype=float))
+    assert actual.keys() == expected.keys()
+    for fund_code, result in expected.items():
+        for key, value in result.items():
+            if isinstance(value, float) and np.isnan(value):
+                assert np.isnan(actual[fund_code][key]), (fund_code, key)
+            else:
+                assert actual[fund_code][key] == value, (fund_code, key)
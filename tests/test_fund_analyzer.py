@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+import requests
+
+import fund_analyzer
+from fund_analyzer import FundAnalyzer
+from http_client import HttpClient
+
+
+class FlakyAkshare:
+    """akshare 替身：每个接口第一次调用抛出连接错误，之后返回固定数据"""
+    def __init__(self):
+        self.calls = {}
+
+    def _flaky(self, name, result):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.calls[name] == 1:
+            raise requests.exceptions.ConnectionError(f"{name} connection reset")
+        return result
+
+    def fund_manager_em(self, symbol):
+        return self._flaky('manager', pd.DataFrame({
+            '姓名': ['张三', '李四'], '上任日期': ['2020-01-01', '2023-06-01'],
+            '任职天数': [2000, 730], '任职回报': ['35.5%', '12.0%'],
+        }))
+
+    def fund_portfolio_hold_em(self, symbol):
+        return self._flaky('holdings', pd.DataFrame({'股票代码': ['600519'], '股票名称': ['贵州茅台'], '占净值比例': [9.5]}))
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    fake = FlakyAkshare()
+    monkeypatch.setattr(fund_analyzer, 'ak', fake)
+    client = HttpClient(rate=50.0, max_rate=200.0, retry_base_delay=0.01)
+    analyzer = FundAnalyzer(cache_data=False, fetch_mode='akshare', client=client)
+    yield analyzer, fake
+    client.close()
+
+
+def test_manager_and_holdings_are_retried(analyzer):
+    analyzer, fake = analyzer
+    assert analyzer.get_fund_manager_data('000001')
+    assert analyzer.manager_data['000001']['name'] == '李四'
+    assert analyzer.manager_data['000001']['tenure_years'] == pytest.approx(2.0)
+
+    assert analyzer.get_fund_holdings_data('000001')
+    assert analyzer.holdings_data['000001'] == [{'股票代码': '600519', '股票名称': '贵州茅台', '占净值比例': 9.5}]
+    assert fake.calls == {'manager': 2, 'holdings': 2}
+
+
+GRACE = {'fund': timedelta(hours=12), 'manager': timedelta(days=30), 'holdings': timedelta(days=30)}
+
+
+@pytest.fixture
+def cached_analyzer(tmp_path):
+    analyzer = FundAnalyzer(cache_file=str(tmp_path / 'cache.sqlite'), legacy_cache_file=None, stale_grace=GRACE)
+    yield analyzer
+    analyzer._wait_for_revalidation()
+    analyzer.cache.close()
+
+
+def _store(analyzer, namespace, fund_code, value, updated_at):
+    analyzer.cache.set(namespace, fund_code, value)
+    with analyzer.cache._lock:
+        analyzer.cache._conn.execute(
+            "UPDATE cache SET updated_at = ? WHERE namespace = ? AND key = ?",
+            (updated_at.timestamp(), namespace, fund_code)
+        )
+        analyzer.cache._conn.commit()
+
+
+@pytest.mark.parametrize('namespace', ['fund', 'manager', 'holdings'])
+def test_cache_freshness_per_namespace(cached_analyzer, namespace):
+    analyzer = cached_analyzer
+    cutoff = analyzer._cache_cutoff(namespace)
+    _store(analyzer, namespace, 'fresh', 'cached', datetime.now())
+    _store(analyzer, namespace, 'stale', 'cached', cutoff - GRACE[namespace] / 2)
+    _store(analyzer, namespace, 'expired', 'cached', cutoff - GRACE[namespace] - timedelta(days=1))
+    fetched = []
+
+    def fetch(fund_code):
+        fetched.append(fund_code)
+        return 'fetched'
+
+    target = {}
+    for fund_code in ('fresh', 'stale', 'expired'):
+        assert analyzer._get_with_cache(namespace, fund_code, target, fetch, 'fallback')
+    analyzer._wait_for_revalidation()
+
+    # 新鲜条目直接使用；宽限期内先用旧值、后台刷新缓存；过期条目同步重新获取
+    assert target == {'fresh': 'cached', 'stale': 'cached', 'expired': 'fetched'}
+    assert sorted(fetched) == ['expired', 'stale']
+    assert analyzer.cache.get(namespace, 'fresh') == 'cached'
+    assert analyzer.cache.get(namespace, 'stale') == 'fetched'
+    assert analyzer.cache.get(namespace, 'expired') == 'fetched'
+
+
+def test_revalidation_uses_source_sized_pool(tmp_path):
+    analyzer = FundAnalyzer(cache_file=str(tmp_path / 'cache.sqlite'), legacy_cache_file=None,
+                            max_workers={'holdings': 4})
+    # 四个刷新必须同时运行才能通过屏障，线程池小于 4 时会超时
+    barrier = threading.Barrier(4, timeout=5)
+    refreshed = []
+
+    def fetch(fund_code):
+        barrier.wait()
+        refreshed.append(fund_code)
+        return [fund_code]
+
+    for i in range(8):
+        analyzer._schedule_revalidation('holdings', f"{i:06d}", fetch)
+    analyzer._wait_for_revalidation()
+    assert sorted(refreshed) == [f"{i:06d}" for i in range(8)]
+    assert analyzer.cache.get('holdings', '000007') == ['000007']
+    analyzer.cache.close()
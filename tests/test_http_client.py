@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import CircuitBreaker, CircuitOpenError, HttpClient
+from metrics import Metrics
+
+
+class FaultServer:
+    """本地桩服务器：按脚本依次返回状态码，脚本用完后返回 default"""
+    def __init__(self, default=200):
+        self.default = default
+        self.script = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    status = server.script.pop(0) if server.script else server.default
+                body = b'ok' if status == 200 else b'fault'
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/lsjz"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = FaultServer()
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+def _client(**options):
+    params = {'rate': 50.0, 'max_rate': 200.0, 'retry_base_delay': 0.01, 'timeout': 5,
+              'breaker': {'window': 4, 'min_calls': 2, 'failure_ratio': 0.5, 'open_seconds': 0.3}}
+    params.update(options)
+    return HttpClient(**params)
+
+
+def test_throttle_status_slows_down_and_retries(server):
+    client = _client(breaker={})
+    server.script = [429]
+    response = client.get(server.url, endpoint='lsjz')
+    assert response.text == 'ok'
+    assert server.requests == 2
+    endpoint = client.endpoint('lsjz')
+    # 429 后速率减半，随后的成功再线性增加
+    assert endpoint.rate.rate == pytest.approx(25.0 + 1 / 25.0)
+    assert endpoint.breaker.state == CircuitBreaker.CLOSED
+    client.close()
+
+
+def test_rate_recovers_after_successes(server):
+    client = _client(breaker={'window': 20, 'min_calls': 20})
+    server.script = [503]
+    client.get(server.url, endpoint='lsjz')
+    slowed = client.endpoint('lsjz').rate.rate
+    for _ in range(10):
+        client.get(server.url, endpoint='lsjz')
+    assert client.endpoint('lsjz').rate.rate > slowed
+    client.close()
+
+
+def test_plain_client_errors_are_not_retried_or_congestion(server):
+    client = _client()
+    server.script = [404]
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(server.url, endpoint='lsjz')
+    assert server.requests == 1
+    assert client.endpoint('lsjz').rate.rate == pytest.approx(50.0 + 1 / 50.0)
+    client.close()
+
+
+def test_non_request_errors_raise_immediately():
+    client = _client(metrics=Metrics('test', enabled=True))
+    calls = []
+
+    def parse():
+        calls.append(1)
+        raise KeyError('data')
+
+    for _ in range(5):
+        with pytest.raises(KeyError):
+            client.call('akshare', parse)
+    endpoint = client.endpoint('akshare')
+    assert len(calls) == 5
+    assert endpoint.rate.rate == 50.0
+    assert endpoint.breaker.state == CircuitBreaker.CLOSED
+    assert not any(name == 'fetch_retries' for name, _ in client.metrics._counters)
+    client.close()
+
+
+def test_breaker_opens_half_opens_and_closes(server):
+    client = _client(max_attempts=2, circuit_wait=0)
+    server.default = 503
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(server.url, endpoint='lsjz')
+    breaker = client.endpoint('lsjz').breaker
+    assert breaker.state == CircuitBreaker.OPEN
+    assert server.requests == 2
+
+    # 打开期间请求在本地被拒绝，不到达服务器
+    with pytest.raises(CircuitOpenError):
+        client.get(server.url, endpoint='lsjz')
+    assert server.requests == 2
+
+    # 半开状态的探测失败：再次打开，打开时长加倍
+    time.sleep(0.35)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(server.url, endpoint='lsjz', attempts=1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker._open_for == pytest.approx(0.6)
+    assert server.requests == 3
+
+    # 探测成功后关闭
+    server.default = 200
+    time.sleep(0.65)
+    assert client.get(server.url, endpoint='lsjz').text == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker._open_for == pytest.approx(0.3)
+    client.close()
+
+
+def test_half_open_admits_a_single_probe():
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.05)
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.before_call() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.before_call() is not None
+    # 探测被取消时归还名额
+    breaker.release()
+    assert breaker.before_call() is None
+
+
+def test_circuit_wait_is_capped(server):
+    client = _client(circuit_wait=0.5, breaker={'min_calls': 1, 'open_seconds': 30})
+    server.script = [503]
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get(server.url, endpoint='lsjz', attempts=1)
+    started = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        client.get(server.url, endpoint='lsjz')
+    assert time.monotonic() - started < 0.5
+    client.close()
+
+
+def test_async_waits_out_short_open_circuit(server):
+    client = _client(circuit_wait=2.0)
+    server.script = [503, 503, 503]
+
+    async def run():
+        return await client.get_async(server.url, endpoint='lsjz', attempts=5)
+
+    response = asyncio.run(run())
+    assert response.text == 'ok'
+    assert client.endpoint('lsjz').breaker.state == CircuitBreaker.CLOSED
+    client.close()
@@ -0,0 +1,123 @@
+import glob
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_monitor
+from conftest import REPO_DIR
+from indicator_state import IndicatorState, load_states, save_states
+
+
+def _state(navs):
+    state = IndicatorState()
+    for date, nav in zip(pd.bdate_range('2025-01-01', periods=len(navs)), navs):
+        state.update(date, nav)
+    return state
+
+
+def _updated_at(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT key, updated_at FROM cache WHERE namespace = 'indicator'"))
+
+
+def test_save_states_writes_only_given_funds(tmp_path):
+    path = str(tmp_path / 'indicator_state.sqlite')
+    states = {f"{i:06d}": _state([1.0 + i, 1.1 + i, 1.05 + i]) for i in range(5)}
+    save_states(path, states, states)
+    before = _updated_at(path)
+
+    states['000001'].update('2025-02-03', 2.5)
+    del states['000003']
+    save_states(path, states, ['000001', '000003'])
+    after = _updated_at(path)
+
+    assert set(after) == {'000000', '000001', '000002', '000004'}
+    assert after['000001'] > before['000001']
+    assert all(after[code] == before[code] for code in ('000000', '000002', '000004'))
+
+    loaded = load_states(path)
+    assert loaded['000001'].to_dict() == states['000001'].to_dict()
+    assert loaded['000001'].last_nav == 2.5
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / 'indicator_state.json'
+    states = {'000001': _state([1.0, 1.02, 0.99])}
+    legacy.write_text(json.dumps({code: state.to_dict() for code, state in states.items()}), encoding='utf-8')
+    path = str(tmp_path / 'indicator_state.sqlite')
+
+    loaded = load_states(path, legacy_json=str(legacy))
+    assert loaded['000001'].to_dict() == states['000001'].to_dict()
+
+    # 之后以 SQLite 为准，不再读取旧文件
+    legacy.write_text('{}', encoding='utf-8')
+    assert set(load_states(path, legacy_json=str(legacy))) == {'000001'}
+
+
+FUND_CSVS = sorted(glob.glob(os.path.join(REPO_DIR, 'fund_data', '*.csv')))
+# 批量路径的 EWM 从最后 100 行的第一行起算，增量状态的 EWM 起点更早。两者之差按 (1 - 2/27) 的幂衰减
+# （EWM26 衰减最慢），100 行后剩余的起点差不超过净值的历史波动幅度，MACD 差值（MACD 减信号线）的偏差因此不超过：
+MACD_DRIFT_FACTOR = 2 * (1 - 2 / 27) ** 99
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return market_monitor.MarketMonitor(delta=False)
+
+
+def _arrays(df):
+    return df['date'].to_numpy('datetime64[D]'), df['net_value'].to_numpy(dtype=float)
+
+
+@pytest.mark.parametrize('new_rows', [1, 5, 30])
+def test_incremental_update_matches_batch(monitor, new_rows):
+    checked = 0
+    for path in FUND_CSVS:
+        df = pd.read_csv(path, parse_dates=['date']).sort_values('date').reset_index(drop=True)
+        if len(df) < 100 + new_rows:
+            continue
+        fund_code = os.path.basename(path)[:-4]
+        monitor.indicator_states = {}
+        monitor._calculate_indicators_batch({fund_code: df.iloc[:-new_rows].tail(100)}, states=monitor.indicator_states)
+        incremental = dict(monitor._update_indicators_incrementally(fund_code, *_arrays(df)))
+        batch = dict(monitor._calculate_indicators_batch({fund_code: df.tail(100)})[fund_code])
+
+        for key in ('latest_net_value', 'rsi', 'ma_ratio', 'bb_upper', 'bb_lower'):
+            np.testing.assert_allclose(incremental[key], batch[key], rtol=1e-12, atol=1e-12, equal_nan=True,
+                                       err_msg=f"{fund_code} {key}")
+        nav_range = df['net_value'].max() - df['net_value'].min()
+        assert abs(incremental['macd_diff'] - batch['macd_diff']) <= MACD_DRIFT_FACTOR * nav_range, fund_code
+        assert (incremental['advice'], incremental['action_signal']) == (batch['advice'], batch['action_signal'])
+        checked += 1
+    assert checked > 100
+
+
+def test_rewritten_history_falls_back_to_batch(monitor):
+    df = pd.read_csv(os.path.join(REPO_DIR, 'fund_data', '005551.csv'), parse_dates=['date']).sort_values('date').reset_index(drop=True)
+    fund_code = '000001'
+    monitor._calculate_indicators_batch({fund_code: df.iloc[:-3].tail(100)}, states=monitor.indicator_states)
+    state = monitor.indicator_states[fund_code]
+
+    # 状态记录的最新净值被修订
+    dates, net_values = _arrays(df)
+    revised = net_values.copy()
+    revised[len(df) - 4] += 0.01
+    assert monitor._update_indicators_incrementally(fund_code, dates, revised) is None
+    assert fund_code not in monitor.indicator_states
+
+    # 状态记录的最新日期不在当前历史中
+    monitor.indicator_states[fund_code] = state
+    keep = dates != np.datetime64(state.last_date, 'D')
+    assert monitor._update_indicators_incrementally(fund_code, dates[keep], net_values[keep]) is None
+    assert fund_code not in monitor.indicator_states
+
+    # 仅 float32 以下的差异不视为修订
+    monitor.indicator_states[fund_code] = state
+    assert monitor._update_indicators_incrementally(
+        fund_code, dates, net_values.astype(np.float32).astype(float)
+    ) is not None
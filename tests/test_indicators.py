@@ -0,0 +1,117 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR
+import market_monitor
+
+FUND_CSVS = sorted(glob.glob(os.path.join(REPO_DIR, 'fund_data', '*.csv')))
+# 数值字段，批量结果须与原实现逐位一致
+VALUE_FIELDS = ['latest_net_value', 'rsi', 'ma_ratio', 'macd_diff', 'bb_upper', 'bb_lower']
+
+
+def _reference_indicators(fund_code, df):
+    """原 MarketMonitor._calculate_indicators：逐个基金在 DataFrame 上计算指标，逐条 if/elif 判断信号"""
+    if df is None or df.empty or len(df) < 26:
+        return {
+            'fund_code': fund_code, 'latest_net_value': "数据获取失败", 'rsi': np.nan, 'ma_ratio': np.nan,
+            'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
+        }
+    df = df.sort_values(by='date', ascending=True)
+
+    exp12 = df['net_value'].ewm(span=12, adjust=False).mean()
+    exp26 = df['net_value'].ewm(span=26, adjust=False).mean()
+    macd = exp12 - exp26
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    window = 20
+    bb_mid = df['net_value'].rolling(window=window, min_periods=1).mean()
+    bb_std = df['net_value'].rolling(window=window, min_periods=1).std()
+    bb_upper = bb_mid + (bb_std * 2)
+    bb_lower = bb_mid - (bb_std * 2)
+
+    delta = df['net_value'].diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=14, min_periods=1).mean()
+    avg_loss = loss.rolling(window=14, min_periods=1).mean()
+    rs = avg_gain / avg_loss.replace(0, np.nan)
+    rsi = 100 - (100 / (1 + rs))
+
+    ma50 = df['net_value'].rolling(window=min(50, len(df)), min_periods=1).mean()
+
+    latest_net_value = df['net_value'].iloc[-1]
+    latest_rsi = rsi.iloc[-1]
+    latest_ma50 = ma50.iloc[-1]
+    latest_ma50_ratio = latest_net_value / latest_ma50 if not pd.isna(latest_ma50) and latest_ma50 != 0 else np.nan
+    latest_macd_diff = macd.iloc[-1] - signal.iloc[-1]
+    latest_bb_upper = bb_upper.iloc[-1]
+    latest_bb_lower = bb_lower.iloc[-1]
+
+    def below(value, bound):
+        return not np.isnan(value) and value < bound
+
+    def above(value, bound):
+        return not np.isnan(value) and value > bound
+
+    advice = "观察"
+    if above(latest_rsi, 70) or below(latest_bb_upper, latest_net_value) or above(latest_ma50_ratio, 1.2):
+        advice = "等待回调"
+    elif below(latest_rsi, 30) or above(latest_bb_lower, latest_net_value) or below(latest_ma50_ratio, 0.8):
+        advice = "可分批买入"
+    elif above(latest_ma50_ratio, 1) and above(latest_macd_diff, 0):
+        advice = "可分批买入"
+    elif below(latest_ma50_ratio, 1) and below(latest_macd_diff, 0):
+        advice = "等待回调"
+
+    action_signal = "持有/观察"
+    if below(latest_ma50_ratio, 0.95):
+        action_signal = "强卖出/规避"
+    elif above(latest_rsi, 70) and above(latest_ma50_ratio, 1.2) and below(latest_macd_diff, 0):
+        action_signal = "强卖出/规避"
+    elif above(latest_rsi, 65) or below(latest_bb_upper, latest_net_value) or above(latest_ma50_ratio, 1.2):
+        action_signal = "弱卖出/规避"
+    elif below(latest_rsi, 35) and below(latest_ma50_ratio, 0.9) and above(latest_macd_diff, 0):
+        action_signal = "强买入"
+    elif below(latest_rsi, 45) or above(latest_bb_lower, latest_net_value) or below(latest_ma50_ratio, 1):
+        action_signal = "弱买入"
+
+    return {
+        'fund_code': fund_code, 'latest_net_value': latest_net_value, 'rsi': latest_rsi,
+        'ma_ratio': latest_ma50_ratio, 'macd_diff': latest_macd_diff, 'bb_upper': latest_bb_upper,
+        'bb_lower': latest_bb_lower, 'advice': advice, 'action_signal': action_signal,
+    }
+
+
+def _frames(tail_lengths):
+    """各基金按 tail_lengths 轮流截取最后若干行，同一批次中混合不同长度的历史"""
+    frames = {}
+    for i, path in enumerate(FUND_CSVS):
+        df = pd.read_csv(path, parse_dates=['date']).sort_values('date').reset_index(drop=True)
+        frames[os.path.basename(path)[:-4]] = df.tail(tail_lengths[i % len(tail_lengths)]).reset_index(drop=True)
+    return frames
+
+
+@pytest.mark.parametrize('tail_lengths', [(100,), (100, 60, 30, 26, 25)], ids=['tail100', 'mixed'])
+def test_batch_indicators_match_original(tmp_path, monkeypatch, tail_lengths):
+    monkeypatch.chdir(tmp_path)
+    monitor = market_monitor.MarketMonitor(delta=False)
+    frames = _frames(tail_lengths)
+    # 较短的历史在批量矩阵中按尾部对齐、顶部补 NaN
+    assert len({len(df) for df in frames.values()}) > 1
+
+    batch = monitor._calculate_indicators_batch(frames)
+    assert batch.keys() == frames.keys()
+    for fund_code, df in frames.items():
+        expected = _reference_indicators(fund_code, df.copy())
+        actual = batch[fund_code]
+        assert (actual['advice'], actual['action_signal']) == (expected['advice'], expected['action_signal']), fund_code
+        if isinstance(expected['latest_net_value'], str):
+            assert actual['latest_net_value'] == expected['latest_net_value']
+            continue
+        np.testing.assert_array_equal(
+            [actual[field] for field in VALUE_FIELDS], [expected[field] for field in VALUE_FIELDS], err_msg=fund_code
+        )
@@ -0,0 +1,182 @@
+import json
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import market_monitor
+from http_client import HttpClient
+from run_results import RunResults
+
+
+def _write_manifest(codes):
+    with open(market_monitor.RECOMMENDATION_MANIFEST, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(json.dumps({'code': code, 'decision': '推荐', 'score': 40}) for code in codes))
+
+
+@pytest.fixture
+def http():
+    client = HttpClient(rate=200.0, max_rate=500.0, retry_base_delay=0.01)
+    yield client
+    client.close()
+
+
+def _monitor(server, http, **options):
+    monitor = market_monitor.MarketMonitor(http_client=http, **options)
+    monitor.api_url = server.url
+    return monitor
+
+
+def test_short_history_bootstraps_once_per_day(tmp_path, monkeypatch, lsjz_server, http):
+    monkeypatch.chdir(tmp_path)
+    # 新成立的基金：接口上只有 60 行，少于回测所需的 100 行，且按日期总是"过时"
+    server = lsjz_server(rows=60)
+    _write_manifest(['000001'])
+    monitor = _monitor(server, http)
+    monitor.store.write('000001', server.history.iloc[20:].sort_values('date'))
+
+    monitor.get_fund_data()
+    # 第一次运行抓取完整历史（per=49，共 2 页）
+    assert sorted(server.requested) == [1, 2]
+    assert monitor.store.coverage(['000001'])['000001']['rows'] == 60
+
+    server.requested.clear()
+    _monitor(server, http).get_fund_data()
+    # 今天已成功抓取过完整历史，之后的运行只检查新增日期
+    assert server.requested == [1]
+
+    # 到了第二天重新尝试抓取完整历史
+    server.requested.clear()
+    store = monitor.store
+    with store._manifest_lock:
+        conn = store._manifest_conn()
+        conn.execute("UPDATE coverage SET last_fetch_at = ?", (time.time() - 86400,))
+        conn.commit()
+    _monitor(server, http).get_fund_data()
+    assert sorted(server.requested) == [1, 2]
+
+
+FUND_CODES = [f"{i:06d}" for i in range(6)]
+
+
+@pytest.fixture
+def recomputed(monkeypatch):
+    """记录本次运行重新计算（而非沿用上次结果）的基金"""
+    calls = {'indicators': [], 'backtest': []}
+    for kind in calls:
+        original = getattr(RunResults, f"set_{kind}")
+
+        def record(self, fund_code, entry, result, kind=kind, original=original):
+            calls[kind].append(fund_code)
+            original(self, fund_code, entry, result)
+        monkeypatch.setattr(RunResults, f"set_{kind}", record)
+    return calls
+
+
+def _run(server, http, **options):
+    monitor = _monitor(server, http, **options)
+    monitor.get_fund_data()
+    monitor.generate_report()
+    monitor.perform_backtest(workers=1)
+    monitor.save_run_results()
+    return monitor
+
+
+def _output_mtimes():
+    return [os.stat(path).st_mtime_ns for path in ('market_monitor_report.md', market_monitor.BACKTEST_RESULTS_FILE)]
+
+
+def _revise(store, fund_code, factor=0.97):
+    df = store.read(fund_code)
+    df.loc[df.index[-5], 'net_value'] *= factor
+    store.write(fund_code, df)
+
+
+def _drop_oldest(store, fund_code):
+    store.write(fund_code, store.read(fund_code).iloc[1:])
+
+
+@pytest.fixture
+def first_run(tmp_path, monkeypatch, lsjz_server, http, recomputed):
+    monkeypatch.chdir(tmp_path)
+    server = lsjz_server(rows=150)
+    _write_manifest(FUND_CODES)
+    monitor = _run(server, http)
+    assert sorted(recomputed['indicators']) == sorted(recomputed['backtest']) == FUND_CODES
+    for calls in recomputed.values():
+        calls.clear()
+    return server, monitor
+
+
+def test_unchanged_history_reuses_results(first_run, http, recomputed):
+    server, _ = first_run
+    before = _output_mtimes()
+    _run(server, http)
+    assert recomputed == {'indicators': [], 'backtest': []}
+    # 没有任何变化时不重写报告和回测结果
+    assert _output_mtimes() == before
+
+
+@pytest.mark.parametrize('change', [_revise, _drop_oldest])
+def test_changed_history_recomputes_only_that_fund(first_run, http, recomputed, change):
+    server, monitor = first_run
+    before = _output_mtimes()
+    # _revise 只改变校验和，_drop_oldest 同时改变行数
+    change(monitor.store, '000003')
+    _run(server, http)
+    assert recomputed == {'indicators': ['000003'], 'backtest': ['000003']}
+    assert all(after != mtime for after, mtime in zip(_output_mtimes(), before))
+
+
+def test_changed_thresholds_invalidate_all_results(first_run, http, recomputed):
+    server, _ = first_run
+    _run(server, http, thresholds={'rsi_weak_buy': 50})
+    assert sorted(recomputed['indicators']) == sorted(recomputed['backtest']) == FUND_CODES
+
+
+def test_changed_fund_list_rewrites_outputs(first_run, http, recomputed):
+    server, _ = first_run
+    before = _output_mtimes()
+    _write_manifest(FUND_CODES[:4])
+    _run(server, http)
+    # 各基金结果都可沿用，但输出文件必须按新的基金列表重写
+    assert recomputed == {'indicators': [], 'backtest': []}
+    assert all(after != mtime for after, mtime in zip(_output_mtimes(), before))
+    backtest = pd.read_csv(market_monitor.BACKTEST_RESULTS_FILE, index_col=0, dtype={0: str})
+    assert backtest.index.tolist() == FUND_CODES[:4]
+    with open('market_monitor_report.md', encoding='utf-8') as f:
+        report = f.read()
+    assert '000003' in report and '000004' not in report
+
+
+def _outputs():
+    with open('market_monitor_report.md', encoding='utf-8') as f:
+        # 去掉报告中的生成时间
+        report = [line for line in f if not line.startswith('生成日期')]
+    with open(market_monitor.BACKTEST_RESULTS_FILE, 'rb') as f:
+        return report, f.read()
+
+
+@pytest.mark.parametrize('full_run', [{'delta': False}, {'env': '1'}])
+def test_full_run_matches_delta_run(tmp_path, monkeypatch, lsjz_server, http, full_run):
+    server = lsjz_server(rows=150)
+    outputs = []
+    for delta in (True, False):
+        workdir = tmp_path / ('delta' if delta else 'full')
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        _write_manifest(FUND_CODES)
+        monitor = _run(server, http)
+        _revise(monitor.store, '000001')
+        _revise(monitor.store, '000004', 1.05)
+        if delta:
+            _run(server, http)
+        elif 'env' in full_run:
+            monkeypatch.setenv('MONITOR_FULL_RUN', full_run['env'])
+            assert not _run(server, http).delta
+            monkeypatch.delenv('MONITOR_FULL_RUN')
+        else:
+            _run(server, http, delta=False)
+        outputs.append(_outputs())
+    assert outputs[0] == outputs[1]
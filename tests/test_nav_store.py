@@ -0,0 +1,57 @@
+import resource
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_monitor
+
+
+def _history(rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'date': pd.bdate_range(end='2025-09-30', periods=rows),
+        'net_value': np.round(1 + np.cumsum(rng.normal(0, 0.01, rows)), 4),
+    })
+
+
+@pytest.fixture
+def low_fd_limit():
+    """把进程可打开的文件数临时降到 256"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    limit = 256
+    resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+    try:
+        yield limit
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+def test_frame_cache_does_not_hold_file_descriptors(tmp_path, monkeypatch, low_fd_limit):
+    monkeypatch.chdir(tmp_path)
+    monitor = market_monitor.MarketMonitor(delta=False)
+    n_funds = low_fd_limit + 100
+    codes = [f"{i:06d}" for i in range(n_funds)]
+    for i, fund_code in enumerate(codes):
+        monitor.store.write(fund_code, _history(120, i))
+
+    # 帧缓存长期持有全部基金；若缓存的是内存映射视图，会在超出文件数上限后读取失败并返回空表
+    frames = [monitor._read_local_data(fund_code) for fund_code in codes]
+    assert len(monitor.frame_cache) == n_funds
+    assert all(len(df) == 120 for df in frames)
+    expected = _history(120, n_funds - 1)
+    np.testing.assert_array_equal(frames[-1]['net_value'], expected['net_value'])
+    np.testing.assert_array_equal(frames[-1]['date'].to_numpy('datetime64[D]'), expected['date'].to_numpy('datetime64[D]'))
+
+
+def test_backtest_chunk_releases_mappings(tmp_path, low_fd_limit):
+    store_root = str(tmp_path / 'store')
+    monitor_store = market_monitor.NavStore(store_root)
+    codes = [f"{i:06d}" for i in range(low_fd_limit + 100)]
+    for i, fund_code in enumerate(codes):
+        monitor_store.write(fund_code, _history(120, i))
+    monitor_store.close()
+
+    results = market_monitor._backtest_chunk(store_root, market_monitor.DEFAULT_THRESHOLDS, codes)
+    assert [fund_code for fund_code, _ in results] == codes
+    assert all(result is not None for _, result in results)
@@ -0,0 +1,83 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR
+from market_monitor import DEFAULT_THRESHOLDS, _backtest_metrics, _backtest_signal_series, _simulate_trades
+from param_sweep import MIN_BACKTEST_ROWS, evaluate, parameter_sets, prepare_universe
+
+FUND_CSVS = sorted(glob.glob(os.path.join(REPO_DIR, 'fund_data', '*.csv')))
+
+
+@pytest.fixture(scope='module')
+def frames():
+    return {os.path.basename(path)[:-4]: pd.read_csv(path, parse_dates=['date']) for path in FUND_CSVS}
+
+
+def _net_value(df):
+    return df.sort_values(by='date', ascending=True)['net_value'].astype(float).reset_index(drop=True)
+
+
+def _trades(net_value, thresholds=None):
+    return _simulate_trades(net_value.to_numpy(), _backtest_signal_series(net_value, thresholds).to_numpy())
+
+
+def _reference_summary(frames, thresholds):
+    """逐基金调用 _backtest_metrics 后按 evaluate 的口径汇总；trades 为各基金已平仓的交易数"""
+    trades, metrics = [], []
+    for df in frames.values():
+        net_value = _net_value(df)
+        if len(net_value) < MIN_BACKTEST_ROWS:
+            continue
+        entries, exits, _ = _trades(net_value, thresholds)
+        if len(entries):
+            trades.append(len(exits))
+            metrics.append(_backtest_metrics(net_value, thresholds))
+    cum_return = np.array([m['cum_return'] for m in metrics])
+    sharpe_ratio = np.array([m['sharpe_ratio'] for m in metrics])
+    return {
+        'funds_traded': len(metrics),
+        'trades': sum(trades),
+        'mean_cum_return': np.mean(cum_return),
+        'median_cum_return': np.median(cum_return),
+        'mean_sharpe_ratio': np.nanmean(sharpe_ratio),
+        'mean_win_rate': np.mean([m['win_rate'] for m in metrics]),
+    }
+
+
+@pytest.mark.parametrize('thresholds', [DEFAULT_THRESHOLDS] + parameter_sets(samples=3, seed=5))
+def test_evaluate_matches_per_fund_backtest(frames, thresholds):
+    summary = evaluate(prepare_universe(frames), thresholds)
+    expected = _reference_summary(frames, thresholds)
+    assert summary['funds_traded'] == expected['funds_traded']
+    assert summary['trades'] == expected['trades']
+    for metric in ('mean_cum_return', 'median_cum_return', 'mean_sharpe_ratio', 'mean_win_rate'):
+        assert summary[metric] == pytest.approx(expected[metric], rel=1e-9), metric
+
+
+def test_positions_do_not_carry_over_fund_boundaries(frames):
+    # 期末仍持仓（买入多于卖出）的基金
+    holding_at_end = None
+    for fund_code, df in frames.items():
+        net_value = _net_value(df)
+        if len(net_value) >= MIN_BACKTEST_ROWS:
+            entries, exits, _ = _trades(net_value)
+            if len(entries) > len(exits):
+                holding_at_end = fund_code
+                break
+    assert holding_at_end is not None
+    # 后接一个只有卖出信号的基金：净值持续上涨、偶有小幅回落，RSI 始终偏高
+    steps = np.where(np.arange(150) % 5 == 4, -0.002, 0.01)
+    steps[0] = 0
+    rising = pd.DataFrame({'date': pd.bdate_range('2024-01-01', periods=150), 'net_value': 1 + np.cumsum(steps)})
+    assert (_backtest_signal_series(_net_value(rising)) == "弱卖出/规避").any()
+
+    summary = evaluate(prepare_universe({holding_at_end: frames[holding_at_end], 'rising': rising}), DEFAULT_THRESHOLDS)
+    alone = evaluate(prepare_universe({holding_at_end: frames[holding_at_end]}), DEFAULT_THRESHOLDS)
+    # 前一个基金的持仓若延续下去，会在后者的首个卖出信号处以另一只基金的净值平仓
+    assert summary['funds_traded'] == 1
+    assert summary['trades'] == alone['trades']
+    assert summary['mean_cum_return'] == alone['mean_cum_return']
@@ -0,0 +1,91 @@
+import csv
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_monitor
+from report_writer import ExternalSorter, write_report
+
+
+@pytest.mark.parametrize('max_in_memory', [1, 7, 1000])
+def test_external_sorter_is_stable_across_runs(max_in_memory):
+    rng = np.random.default_rng(3)
+    # 键的取值很少，大量条目键相同，必须保持加入顺序
+    items = [(int(key), i) for i, key in enumerate(rng.integers(0, 5, 200))]
+    sorter = ExternalSorter(key=lambda item: item[0], max_in_memory=max_in_memory)
+    for item in items:
+        sorter.add(item)
+    assert len(sorter._runs) == len(items) // max_in_memory
+    try:
+        assert list(sorter) == sorted(items, key=lambda item: item[0])
+    finally:
+        sorter.close()
+
+
+def _reference_markdown(fund_codes, fund_data):
+    """原 generate_report 的排序与格式化：DataFrame.sort_values 后 to_markdown"""
+    rows = []
+    for fund_code in fund_codes:
+        row = market_monitor._report_row(fund_code, fund_data.get(fund_code))
+        rows.append(dict(zip(market_monitor.REPORT_COLUMNS, row)))
+    df = pd.DataFrame(rows)
+    df['RSI'] = pd.to_numeric(df['RSI'].apply(lambda x: f"{x:.2f}" if not pd.isna(x) else "N/A"), errors='coerce')
+    df['sort_order_action'] = df['行动信号'].map(market_monitor.REPORT_ACTION_ORDER)
+    df['sort_order_advice'] = df['投资建议'].map(market_monitor.REPORT_ADVICE_ORDER)
+    df = df.sort_values(by=['sort_order_action', 'sort_order_advice', 'RSI'], ascending=[True, True, True]) \
+        .drop(columns=['sort_order_action', 'sort_order_advice'])
+    df['最新净值'] = df['最新净值'].apply(lambda x: f"{x:.4f}" if not pd.isna(x) else "N/A")
+    df['RSI'] = df['RSI'].apply(lambda x: f"{x:.2f}" if not pd.isna(x) else "N/A")
+    df['净值/MA50'] = df['净值/MA50'].apply(lambda x: f"{x:.2f}" if not pd.isna(x) else "N/A")
+    return df.to_markdown(index=False)
+
+
+def _markdown_rows(text):
+    lines = [line for line in text.splitlines() if line.startswith('|')]
+    return [[cell.strip() for cell in line.strip('|').split('|')] for line in lines[2:]]
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monitor = market_monitor.MarketMonitor(delta=False)
+    rng = np.random.default_rng(11)
+    monitor.fund_codes = [f"{i:06d}" for i in range(60)]
+    actions = ["强买入", "弱买入", "持有/观察", "弱卖出/规避", "强卖出/规避"]
+    advices = ["可分批买入", "观察", "等待回调"]
+    for i, fund_code in enumerate(monitor.fund_codes):
+        if i % 17 == 0:
+            # 无结果的基金
+            continue
+        if i % 13 == 0:
+            monitor.fund_data[fund_code] = monitor._failed_indicator_result(fund_code)
+            continue
+        nav = 1 + rng.random()
+        # RSI 取少量两位小数值，制造大量并列；部分缺失
+        rsi = np.nan if i % 11 == 0 else float(rng.choice([30.004, 30.001, 45.5, 60.0]))
+        monitor.fund_data[fund_code] = market_monitor._indicator_result(
+            fund_code, nav, rsi, 0.8 + rng.random() * 0.5, rng.normal(0, 0.01), nav * 1.05, nav * 0.95,
+            rng.choice(advices), rng.choice(actions),
+        )
+    return monitor
+
+
+def test_report_outputs_keep_original_row_order(monitor):
+    expected = _markdown_rows(_reference_markdown(monitor.fund_codes, monitor.fund_data))
+    table = monitor._report_table()
+    for path in ('report.md', 'report.csv', 'report.jsonl'):
+        write_report(path, iter(monitor.fund_codes), [table], max_in_memory=4)
+
+    with open('report.md', encoding='utf-8') as f:
+        assert _markdown_rows(f.read()) == expected
+    codes = [row[0] for row in expected]
+    with open('report.csv', encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == market_monitor.REPORT_COLUMNS
+    assert [row[0] for row in rows[1:]] == codes
+    with open('report.jsonl', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['基金代码'] for record in records] == codes
+    assert [record['行动信号'] for record in records] == [row[7] for row in expected]
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from risk_metrics import RISK_FIELDS, fund_risk_metrics
+
+
+def test_chunked_metrics_match_single_matrix():
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range(end='2025-09-30', periods=600)
+    series = {}
+    for i in range(23):
+        # 各基金起止日期不同，且有零散缺失，分块后的日期轴必须仍与整体一致
+        start = rng.integers(0, 400)
+        fund_dates = dates[start:][rng.random(len(dates) - start) > 0.05]
+        series[f"{i:06d}"] = pd.Series(np.cumprod(1 + rng.normal(0, 0.01, len(fund_dates))), index=fund_dates)
+    benchmark = pd.Series(np.cumprod(1 + rng.normal(0, 0.01, 590)), index=dates[5:595])
+
+    whole = fund_risk_metrics(series, 0.01, benchmark, chunk_size=len(series))
+    chunked = fund_risk_metrics(series, 0.01, benchmark, chunk_size=5)
+    assert list(chunked) == list(series)
+    for code in series:
+        np.testing.assert_array_equal(
+            [chunked[code][field] for field in RISK_FIELDS], [whole[code][field] for field in RISK_FIELDS]
+        )